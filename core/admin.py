@@ -1,6 +1,7 @@
 from django.contrib import admin
 
-from .models import Item, OrderItem, Order, Payment, Coupon, Refund, Address, UserProfile
+from .exports import export_csv
+from .models import Item, OrderItem, Order, Payment, Coupon, Refund, Address, UserProfile, StripeEvent
 
 
 def make_refund_accepted(modeladmin, request, queryset):
@@ -10,6 +11,10 @@ def make_refund_accepted(modeladmin, request, queryset):
 make_refund_accepted.short_description = 'Update orders to refund granted'
 
 
+class ItemAdmin(admin.ModelAdmin):
+    actions = [export_csv('items')]
+
+
 class OrderAdmin(admin.ModelAdmin):
     list_display = ['user',
                     'ordered',
@@ -38,7 +43,7 @@ class OrderAdmin(admin.ModelAdmin):
         'user__username',
         'ref_code'
     ]
-    actions = [make_refund_accepted]
+    actions = [make_refund_accepted, export_csv('orders')]
 
 
 class AddressAdmin(admin.ModelAdmin):
@@ -55,11 +60,26 @@ class AddressAdmin(admin.ModelAdmin):
     search_fields = ['user', 'street_address', 'apartment_address', 'zip']
 
 
-admin.site.register(Item)
+class PaymentAdmin(admin.ModelAdmin):
+    list_display = ['stripe_charge_id', 'user', 'amount', 'status',
+                    'timestamp']
+    list_filter = ['status']
+    actions = [export_csv('payments')]
+
+
+class StripeEventAdmin(admin.ModelAdmin):
+    list_display = ['event_id', 'type', 'received_at', 'processed_at',
+                    'attempts']
+    list_filter = ['type']
+    search_fields = ['event_id']
+
+
+admin.site.register(Item, ItemAdmin)
 admin.site.register(OrderItem)
 admin.site.register(Order, OrderAdmin)
-admin.site.register(Payment)
+admin.site.register(Payment, PaymentAdmin)
 admin.site.register(Coupon)
 admin.site.register(Refund)
 admin.site.register(Address, AddressAdmin)
 admin.site.register(UserProfile)
+admin.site.register(StripeEvent, StripeEventAdmin)
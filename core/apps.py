@@ -3,3 +3,9 @@ from django.apps import AppConfig
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        from . import autocomplete, facets, product_cache, search  # noqa: F401
+        from . import tasks  # noqa: F401
+        from .stripe_client import configure_stripe
+        configure_stripe()
@@ -0,0 +1,267 @@
+import mmap
+import os
+import struct
+from array import array
+from bisect import bisect_left
+
+from django.db import transaction
+from django.db.models import Sum
+from django.db.models.signals import post_delete, post_save
+
+from . import snapshots
+from .models import Item, OrderItem
+from .search import TOKEN_RE
+from .snapshots import (
+    JournaledIndex, get_index, get_index_directory, rebuild_snapshot
+)
+
+INDEX_FILENAME = 'titles.idx'
+JOURNAL_FILENAME = 'titles.journal'
+
+MAX_KEY_LENGTH = 64
+# Prefixes matching at least this many keys get their best suggestions
+# precomputed; any other prefix is answered by scanning its (short) range.
+HEAVY_PREFIX = 32
+TOP_SUGGESTIONS = 16
+
+# Snapshot layout: header, items ranked by popularity, keys (every word
+# suffix of a title) sorted so a prefix is a contiguous range, the heavy
+# prefixes sorted by bytes with a slice of the top list each, the top list
+# of item ranks, then the string blob the other sections point into.
+MAGIC = b'CACX'
+VERSION = 1
+HEADER = struct.Struct('<4sIIIII')
+ITEM = struct.Struct('<IIIHH')
+KEY = struct.Struct('<IHI')
+PREFIX = struct.Struct('<IHIH')
+
+
+def normalize(text):
+    return ' '.join(TOKEN_RE.findall(text.lower()))
+
+
+def title_keys(title):
+    normalized = normalize(title)
+    starts = [0] + [i + 1 for i, char in enumerate(normalized) if char == ' ']
+    return normalized, starts
+
+
+def matches(title, prefix):
+    return (' ' + normalize(title)).find(' ' + prefix) != -1
+
+
+def _heavy_prefixes(keys, ranks):
+    heavy = []
+    stack = [(0, len(keys), 0)]
+    while stack:
+        lo, hi, depth = stack.pop()
+        i = lo
+        while i < hi:
+            if len(keys[i]) <= depth:
+                i += 1
+                continue
+            prefix = keys[i][:depth + 1]
+            j = bisect_left(keys, prefix + b'\xff', i, hi)
+            if j - i >= HEAVY_PREFIX:
+                top = sorted(set(ranks[i:j]))[:TOP_SUGGESTIONS]
+                heavy.append((prefix, top))
+                stack.append((i, j, depth + 1))
+            i = j
+    heavy.sort()
+    return heavy
+
+
+def write_index(path, items):
+    # Items are ranked once, so a smaller rank is always a better match.
+    items = sorted(items, key=lambda item: (-item[3], normalize(item[1]),
+                                            item[0]))
+    blob = bytearray()
+    item_records = []
+    keys = []
+    for rank, (pk, title, slug, popularity) in enumerate(items):
+        normalized, starts = title_keys(title)
+        title_bytes, slug_bytes = title.encode(), slug.encode()
+        item_records.append(ITEM.pack(
+            pk, popularity, len(blob), len(title_bytes), len(slug_bytes)))
+        blob += title_bytes + slug_bytes
+        offset = len(blob)
+        blob += normalized.encode()
+        for start in starts:
+            key = normalized[start:start + MAX_KEY_LENGTH].encode()
+            keys.append((key, offset + start, rank))
+    keys.sort()
+
+    sorted_keys = [key for key, offset, rank in keys]
+    ranks = array('I', (rank for key, offset, rank in keys))
+    heavy = _heavy_prefixes(sorted_keys, ranks)
+
+    prefix_records = []
+    top = array('I')
+    for prefix, ranked in heavy:
+        prefix_records.append(PREFIX.pack(
+            len(blob), len(prefix), len(top), len(ranked)))
+        blob += prefix
+        top.extend(ranked)
+
+    items_start = HEADER.size
+    keys_start = items_start + len(item_records) * ITEM.size
+    prefixes_start = keys_start + len(keys) * KEY.size
+    top_start = prefixes_start + len(prefix_records) * PREFIX.size
+    blob_start = top_start + len(top) * top.itemsize
+
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(item_records), len(keys),
+                            len(prefix_records), blob_start))
+        f.write(b''.join(item_records))
+        f.write(b''.join(KEY.pack(offset, len(key), rank)
+                         for key, offset, rank in keys))
+        f.write(b''.join(prefix_records))
+        f.write(top.tobytes())
+        f.write(blob)
+    os.replace(tmp_path, path)
+    return len(item_records)
+
+
+class TitleReader:
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, self.n_items, self.n_keys, self.n_prefixes,
+         self._blob_start) = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not an autocomplete snapshot")
+        self._keys_start = HEADER.size + self.n_items * ITEM.size
+        self._prefixes_start = self._keys_start + self.n_keys * KEY.size
+        self._top_start = self._prefixes_start + self.n_prefixes * PREFIX.size
+
+    def _string(self, offset, length):
+        start = self._blob_start + offset
+        return self._mmap[start:start + length]
+
+    def _key(self, index):
+        offset, length, rank = KEY.unpack_from(
+            self._mmap, self._keys_start + index * KEY.size)
+        return self._string(offset, length), rank
+
+    def _lower_bound(self, key):
+        lo, hi = 0, self.n_keys
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key(mid)[0] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _heavy_top(self, prefix):
+        lo, hi = 0, self.n_prefixes
+        while lo < hi:
+            mid = (lo + hi) // 2
+            offset, length, start, count = PREFIX.unpack_from(
+                self._mmap, self._prefixes_start + mid * PREFIX.size)
+            candidate = self._string(offset, length)
+            if candidate < prefix:
+                lo = mid + 1
+            elif candidate > prefix:
+                hi = mid
+            else:
+                return struct.unpack_from(
+                    f'<{count}I', self._mmap, self._top_start + 4 * start)
+        return None
+
+    def item(self, rank):
+        pk, popularity, offset, title_length, slug_length = ITEM.unpack_from(
+            self._mmap, HEADER.size + rank * ITEM.size)
+        title = self._string(offset, title_length).decode()
+        slug = self._string(offset + title_length, slug_length).decode()
+        return pk, title, slug, popularity
+
+    def ranks(self, prefix, limit):
+        prefix = prefix[:MAX_KEY_LENGTH]
+        top = self._heavy_top(prefix)
+        if top is not None and (limit <= len(top)
+                                or len(top) < TOP_SUGGESTIONS):
+            return top[:limit]
+        start = self._lower_bound(prefix)
+        end = self._lower_bound(prefix + b'\xff')
+        return sorted({self._key(i)[1] for i in range(start, end)})[:limit]
+
+
+class AutocompleteIndex(JournaledIndex):
+    index_filename = INDEX_FILENAME
+    journal_filename = JOURNAL_FILENAME
+    reader_class = TitleReader
+
+    def suggest(self, query, limit=8):
+        prefix = normalize(query)
+        if not prefix:
+            return []
+        reader, overlay = self.open()
+
+        suggestions = []
+        if reader is not None:
+            wanted = limit
+            while True:
+                ranks = reader.ranks(prefix.encode(), wanted)
+                items = [reader.item(rank) for rank in ranks]
+                suggestions = [item for item in items
+                               if item[0] not in overlay]
+                # Items edited since the snapshot are answered from the
+                # journal, so ask for more when they were in the way.
+                if len(suggestions) >= limit or len(ranks) < wanted:
+                    break
+                wanted += limit - len(suggestions)
+
+        for pk, data in overlay.items():
+            if data and matches(data['title'], prefix):
+                suggestions.append(
+                    (pk, data['title'], data['slug'], data['popularity']))
+        suggestions.sort(key=lambda item: (-item[3], normalize(item[1]),
+                                           item[0]))
+        return [{'title': title, 'slug': slug}
+                for pk, title, slug, popularity in suggestions[:limit]]
+
+
+def get_autocomplete_index():
+    return get_index(AutocompleteIndex)
+
+
+def get_popularity(**filters):
+    return dict(
+        OrderItem.objects.filter(ordered=True, **filters)
+        .values_list('item_id').annotate(sold=Sum('quantity')).order_by())
+
+
+def rebuild_index(directory, batch_size=2000):
+    popularity = get_popularity()
+    rows = Item.objects.order_by().values_list(
+        'pk', 'title', 'slug').iterator(chunk_size=batch_size)
+    items = ((pk, title, slug, popularity.get(pk, 0))
+             for pk, title, slug in rows)
+    return rebuild_snapshot(AutocompleteIndex, directory,
+                            lambda path: write_index(path, items))
+
+
+# Written once the transaction commits, like the search journal.
+def item_post_save_receiver(sender, instance, *args, **kwargs):
+    if get_index_directory() is None:
+        return
+    pk, data = instance.pk, {
+        'title': instance.title,
+        'slug': instance.slug,
+        'popularity': get_popularity(item=instance).get(instance.pk, 0),
+    }
+    transaction.on_commit(
+        lambda: snapshots.append_to_journal(AutocompleteIndex, pk, data))
+
+
+def item_post_delete_receiver(sender, instance, *args, **kwargs):
+    pk = instance.pk
+    transaction.on_commit(
+        lambda: snapshots.append_to_journal(AutocompleteIndex, pk, None))
+
+
+post_save.connect(item_post_save_receiver, sender=Item)
+post_delete.connect(item_post_delete_receiver, sender=Item)
@@ -0,0 +1,155 @@
+import time
+
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+
+from .models import Item, Order, OrderItem
+
+CART_VERSION_KEY = 'cart:version:{user_id}'
+CART_COUNT_KEY = 'cart:count:{user_id}:{version}'
+CART_COUNT_TIMEOUT = 60 * 60 * 24
+
+
+def get_cart_version(user):
+    key = CART_VERSION_KEY.format(user_id=user.pk)
+    version = cache.get(key)
+    if version is None:
+        # Seed from the clock so an evicted version never reuses a number
+        # whose count entry may still be cached.
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def _incr_cart_version(user_id):
+    key = CART_VERSION_KEY.format(user_id=user_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), None)
+
+
+def bump_cart_version(user):
+    if hasattr(user, '_cart_item_count'):
+        del user._cart_item_count
+    # Only once the change is committed: a concurrent reader could
+    # otherwise cache the old count under the new version, and a rolled
+    # back change would still invalidate the count.
+    user_id = user.pk
+    transaction.on_commit(lambda: _incr_cart_version(user_id))
+
+
+def get_cart_item_count(user):
+    if hasattr(user, '_cart_item_count'):
+        return user._cart_item_count
+    key = CART_COUNT_KEY.format(
+        user_id=user.pk, version=get_cart_version(user))
+    count = cache.get(key)
+    if count is None:
+        count = OrderItem.objects.filter(
+            order__user=user, order__ordered=False).count()
+        cache.set(key, count, CART_COUNT_TIMEOUT)
+    user._cart_item_count = count
+    return count
+
+
+def _lock_open_order(user):
+    return Order.objects.select_for_update().filter(
+        user=user, ordered=False).first()
+
+
+def _open_order(user):
+    try:
+        with transaction.atomic():
+            return Order.objects.create(
+                user=user, ordered_date=timezone.now())
+    except IntegrityError:
+        # A concurrent request opened the cart first.
+        return _lock_open_order(user)
+
+
+@transaction.atomic
+def add_item(user, slug):
+    order = _lock_open_order(user)
+    if order is not None:
+        updated = OrderItem.objects.filter(
+            order=order, item__slug=slug).update(quantity=F('quantity') + 1)
+        if updated:
+            bump_cart_version(user)
+            return False
+
+    item = get_object_or_404(Item, slug=slug)
+    if order is None:
+        order = _open_order(user)
+    order_item, created = OrderItem.objects.get_or_create(
+        user=user, item=item, ordered=False)
+    order.items.add(order_item)
+    bump_cart_version(user)
+    return True
+
+
+@transaction.atomic
+def add_items(user, quantities):
+    # quantities: {item id: quantity}. Adds them all to the open cart with
+    # the same handful of queries however many there are.
+    if not quantities:
+        return 0
+    order = _lock_open_order(user) or _open_order(user)
+    existing = list(OrderItem.objects.filter(
+        user=user, ordered=False, item_id__in=quantities))
+    for order_item in existing:
+        order_item.quantity += quantities[order_item.item_id]
+    if existing:
+        OrderItem.objects.bulk_update(existing, ['quantity'])
+
+    found = {order_item.item_id for order_item in existing}
+    new = [OrderItem(user=user, item_id=item_id, quantity=quantity)
+           for item_id, quantity in quantities.items()
+           if item_id not in found]
+    if new:
+        OrderItem.objects.bulk_create(new)
+        if new[0].pk is None:
+            # SQLite does not return ids from a bulk insert
+            new = list(OrderItem.objects.filter(
+                user=user, ordered=False,
+                item_id__in=[order_item.item_id for order_item in new]))
+
+    # existing open items may not be linked to this order yet
+    through = Order.items.through
+    through.objects.bulk_create([
+        through(order_id=order.pk, orderitem_id=order_item.pk)
+        for order_item in existing + new
+    ], ignore_conflicts=True)
+    bump_cart_version(user)
+    return len(quantities)
+
+
+@transaction.atomic
+def remove_item(user, slug):
+    item = get_object_or_404(Item, slug=slug)
+    order = _lock_open_order(user)
+    if order is None:
+        raise Order.DoesNotExist("You do not have an active order")
+    deleted, _ = OrderItem.objects.filter(order=order, item=item).delete()
+    if deleted:
+        bump_cart_version(user)
+    return bool(deleted)
+
+
+@transaction.atomic
+def remove_single_item(user, slug):
+    item = get_object_or_404(Item, slug=slug)
+    order = _lock_open_order(user)
+    if order is None:
+        raise Order.DoesNotExist("You do not have an active order")
+    order_items = OrderItem.objects.filter(order=order, item=item)
+    updated = order_items.filter(quantity__gt=1).update(
+        quantity=F('quantity') - 1)
+    if not updated:
+        updated, _ = order_items.delete()
+    if updated:
+        bump_cart_version(user)
+    return bool(updated)
@@ -0,0 +1,190 @@
+import csv
+import json
+import os
+from decimal import InvalidOperation
+
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_slug
+from django.db import transaction
+from django.utils import timezone
+
+from .models import CATEGORY_CHOICES, LABEL_CHOICES, Item
+from .patterns.factory import ProductFactory
+from .product_cache import invalidate_products
+
+# Columns that go straight to Item; the rest are passed to the product
+# class for its type, which rejects missing or unknown ones.
+ITEM_COLUMNS = ('discount_price', 'category', 'label', 'image')
+COMPARE_FIELDS = ('title', 'price', 'discount_price', 'description',
+                  'category', 'label', 'image')
+CATEGORIES = dict(CATEGORY_CHOICES)
+LABELS = dict(LABEL_CHOICES)
+# stays under SQLite's limit of 999 query parameters
+LOOKUP_CHUNK = 500
+
+
+class RowError(Exception):
+    pass
+
+
+def read_rows(path, file_format=None):
+    # Streams dict rows from a CSV or JSON Lines file, one line at a time.
+    # A line that is not valid JSON comes out as a RowError in its place,
+    # so it is reported with its row number and the rest still imports.
+    if file_format is None:
+        file_format = 'jsonl' if path.endswith(('.jsonl', '.ndjson')) \
+            else 'csv'
+    with open(path, newline='', encoding='utf-8') as f:
+        if file_format == 'jsonl':
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError as e:
+                    row = RowError(f"Invalid JSON: {e}")
+                yield row
+        else:
+            yield from csv.DictReader(f)
+
+
+def row_to_item(row):
+    if isinstance(row, RowError):
+        raise row
+    if not isinstance(row, dict):
+        raise RowError(f"Expected an object, got {type(row).__name__}")
+    # CSV has no nulls; an empty cell means the column is not set.
+    row = {key: value for key, value in row.items()
+           if value is not None and value != ''}
+    product_type = row.pop('type', None)
+    fields = {name: row.pop(name) for name in ITEM_COLUMNS if name in row}
+    try:
+        product = ProductFactory.create_product(product_type, **row)
+        discount_price = fields.get('discount_price')
+        if discount_price is not None:
+            discount_price = float(discount_price)
+        validate_slug(product.slug)
+    except (AttributeError, TypeError, ValueError, InvalidOperation) as e:
+        raise RowError(str(e))
+    except ValidationError as e:
+        raise RowError(f"Invalid slug {product.slug!r}: {e.messages[0]}")
+
+    category, label = fields.get('category'), fields.get('label')
+    if category not in CATEGORIES:
+        raise RowError(f"Unknown category: {category}")
+    if label not in LABELS:
+        raise RowError(f"Unknown label: {label}")
+    if len(product.title) > 100 or len(product.slug) > 50:
+        raise RowError(f"Title or slug too long: {product.slug}")
+
+    return Item(
+        title=product.title,
+        slug=product.slug,
+        price=float(product.price),
+        discount_price=discount_price,
+        description=product.description,
+        category=category,
+        label=label,
+        image=fields.get('image', '')
+    )
+
+
+class CatalogImporter:
+
+    def __init__(self, batch_size=1000):
+        self.batch_size = batch_size
+        self.stats = {'rows': 0, 'created': 0, 'updated': 0,
+                      'unchanged': 0, 'errors': 0}
+        # (row number, message); the count in stats is complete
+        self.errors = []
+
+    def run(self, rows, skip=0, on_batch=None):
+        # on_batch(rows_read) is called after each batch is committed.
+        batch = []
+        number = skip
+        for number, row in enumerate(rows, 1):
+            if number <= skip:
+                continue
+            self.stats['rows'] += 1
+            try:
+                batch.append(row_to_item(row))
+            except RowError as e:
+                self.stats['errors'] += 1
+                if len(self.errors) < 100:
+                    self.errors.append((number, str(e)))
+            if len(batch) >= self.batch_size:
+                self.write(batch)
+                batch = []
+                if on_batch is not None:
+                    on_batch(number)
+        if batch:
+            self.write(batch)
+        if on_batch is not None:
+            on_batch(number)
+        return self.stats
+
+    @transaction.atomic
+    def write(self, items):
+        # Upsert on slug; a later row for the same slug wins.
+        by_slug = {item.slug: item for item in items}
+        slugs = list(by_slug)
+        existing = {}
+        for start in range(0, len(slugs), LOOKUP_CHUNK):
+            for row in Item.objects.filter(
+                    slug__in=slugs[start:start + LOOKUP_CHUNK]
+            ).values_list('slug', 'pk', *COMPARE_FIELDS):
+                existing[row[0]] = row[1:]
+
+        new, changed = [], []
+        now = timezone.now()
+        for slug, item in by_slug.items():
+            if slug not in existing:
+                item.effective_price = item.get_effective_price()
+                new.append(item)
+                continue
+            pk, *current = existing[slug]
+            values = {name: getattr(item, name) for name in COMPARE_FIELDS}
+            values['image'] = item.image.name or ''
+            if list(values.values()) == current:
+                continue
+            # One UPDATE per changed row; bulk_update() builds a CASE per
+            # field and row and measured several times slower. updated_at
+            # is set by hand, the product page cache is versioned by it.
+            # The plain base manager skips ItemQuerySet's facet count
+            # upkeep; import_catalog rebuilds the counts once at the end.
+            Item._base_manager.filter(pk=pk).update(
+                effective_price=item.get_effective_price(), updated_at=now,
+                **values)
+            changed.append(slug)
+        if new:
+            Item._base_manager.bulk_create(new)
+        if changed:
+            invalidate_products(changed)
+        self.stats['created'] += len(new)
+        self.stats['updated'] += len(changed)
+        self.stats['unchanged'] += len(by_slug) - len(new) - len(changed)
+
+
+def file_signature(path):
+    stat = os.stat(path)
+    return {'path': os.path.abspath(path), 'size': stat.st_size,
+            'mtime': stat.st_mtime}
+
+
+def load_checkpoint(checkpoint_path, path):
+    # Rows already imported, if the checkpoint belongs to this very file.
+    try:
+        with open(checkpoint_path) as f:
+            checkpoint = json.load(f)
+    except (OSError, ValueError):
+        return 0
+    if checkpoint.get('file') != file_signature(path):
+        return 0
+    return checkpoint.get('rows', 0)
+
+
+def save_checkpoint(checkpoint_path, path, rows):
+    tmp_path = checkpoint_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump({'file': file_signature(path), 'rows': rows}, f)
+    os.replace(tmp_path, checkpoint_path)
@@ -0,0 +1,131 @@
+import random
+import string
+
+from django.db import connection, transaction
+
+from .models import Address, Order, Payment
+
+
+class CheckoutError(Exception):
+    pass
+
+
+def create_ref_code():
+    return ''.join(random.choices(string.ascii_lowercase + string.digits, k=20))
+
+
+def is_valid_form(values):
+    valid = True
+    for field in values:
+        if field == '':
+            valid = False
+    return valid
+
+
+def get_default_addresses(user):
+    addresses = Address.objects.filter(
+        user=user, default=True, address_type__in=['S', 'B']).order_by('pk')
+    return {address.address_type: address for address in addresses}
+
+
+def _new_address(user, data, prefix, address_type):
+    street_address = data.get(f'{prefix}_address')
+    country = data.get(f'{prefix}_country')
+    zip_code = data.get(f'{prefix}_zip')
+    if not is_valid_form([street_address, country, zip_code]):
+        raise CheckoutError(
+            f"Please fill in the required {prefix} address fields")
+    return Address(
+        user=user,
+        street_address=street_address,
+        apartment_address=data.get(f'{prefix}_address2'),
+        country=country,
+        zip=zip_code,
+        address_type=address_type,
+        default=bool(data.get(f'set_default_{prefix}'))
+    )
+
+
+def _insert_addresses(addresses):
+    if connection.features.can_return_rows_from_bulk_insert:
+        Address.objects.bulk_create(addresses)
+    else:
+        # bulk_create cannot set primary keys on this backend, and the
+        # order needs them.
+        for address in addresses:
+            address.save()
+
+
+@transaction.atomic
+def save_checkout_addresses(user, order, data):
+    use_default_shipping = data.get('use_default_shipping')
+    use_default_billing = data.get('use_default_billing')
+    same_billing_address = data.get('same_billing_address')
+
+    defaults = {}
+    if use_default_shipping or (use_default_billing and not same_billing_address):
+        defaults = get_default_addresses(user)
+
+    new_addresses = []
+    if use_default_shipping:
+        shipping_address = defaults.get('S')
+        if shipping_address is None:
+            raise CheckoutError("No default shipping address available")
+    else:
+        shipping_address = _new_address(user, data, 'shipping', 'S')
+        new_addresses.append(shipping_address)
+
+    if same_billing_address:
+        billing_address = Address(
+            user=user,
+            street_address=shipping_address.street_address,
+            apartment_address=shipping_address.apartment_address,
+            country=shipping_address.country,
+            zip=shipping_address.zip,
+            address_type='B',
+            default=shipping_address.default and not use_default_shipping
+        )
+        new_addresses.append(billing_address)
+    elif use_default_billing:
+        billing_address = defaults.get('B')
+        if billing_address is None:
+            raise CheckoutError("No default billing address available")
+    else:
+        billing_address = _new_address(user, data, 'billing', 'B')
+        new_addresses.append(billing_address)
+
+    new_default_types = [a.address_type for a in new_addresses if a.default]
+    if new_default_types:
+        Address.objects.filter(
+            user=user, default=True, address_type__in=new_default_types
+        ).update(default=False)
+    if new_addresses:
+        _insert_addresses(new_addresses)
+
+    order.shipping_address = shipping_address
+    order.billing_address = billing_address
+    order.save(update_fields=['shipping_address', 'billing_address'])
+
+
+@transaction.atomic
+def finalize_order(order, charge, amount=None):
+    if amount is None:
+        amount = order.get_total()
+    payment = Payment.objects.create(
+        stripe_charge_id=charge['id'],
+        user_id=order.user_id,
+        amount=amount
+    )
+    ref_code = create_ref_code()
+    # The webhook worker reconciles the same charges, so the order is only
+    # claimed if nobody has marked it ordered in the meantime.
+    claimed = Order.objects.filter(pk=order.pk, ordered=False).update(
+        ordered=True, payment=payment, ref_code=ref_code)
+    if not claimed:
+        transaction.set_rollback(True)
+        return None
+    order.items.update(ordered=True)
+    order.ordered = True
+    order.payment = payment
+    order.ref_code = ref_code
+    return payment
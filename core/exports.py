@@ -0,0 +1,216 @@
+import csv
+import io
+import json
+import zlib
+from collections import deque
+from datetime import timedelta
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.http import StreamingHttpResponse
+
+from .models import ExportWatermark, Item, Order, Payment
+
+# rows are encoded and handed out this many at a time
+FLUSH_ROWS = 1000
+# Transactions commit out of order: a row can show up after the export
+# that moved the watermark past its value. Incremental exports read again
+# this far below the watermark and skip the rows they already wrote.
+TIME_LAG = timedelta(minutes=5)
+ID_LAG = 1000
+# At most this many of those rows are remembered. When a bulk change fills
+# the list, the next export starts at the oldest row remembered instead, so
+# only late commits within that span of the lag are picked up.
+OVERLAP_ROWS = 10000
+
+
+class Dataset:
+    # columns: (header, lookup) pairs read with values_list(). Incremental
+    # exports pick up rows whose watermark field is above the last value
+    # exported, less lag.
+
+    def __init__(self, model, columns, watermark, lag, filters=None,
+                 annotate=None):
+        self.model = model
+        self.headers = [header for header, _ in columns]
+        self.lookups = [lookup for _, lookup in columns]
+        self.watermark = watermark
+        self.lag = lag
+        self.filters = filters or {}
+        self.annotate = annotate
+
+    def queryset(self):
+        return self.model.objects.filter(**self.filters)
+
+    def rows(self, queryset=None, since=None, after=None, chunk_size=2000):
+        # after: a (pk, watermark) row to seek from, in export order
+        if queryset is None:
+            queryset = self.queryset()
+        field = self.model._meta.get_field(self.watermark)
+        if since is not None:
+            queryset = queryset.filter(**{
+                f'{self.watermark}__gt': field.to_python(since) - self.lag})
+        if after is not None:
+            pk, value = after
+            mark = field.to_python(value)
+            queryset = queryset.filter(
+                Q(**{f'{self.watermark}__gt': mark})
+                | Q(**{self.watermark: mark, 'pk__gte': pk}))
+        if self.annotate is not None:
+            queryset = self.annotate(queryset)
+        # a plain tuple per row; nothing is cached on the queryset
+        return queryset.order_by(self.watermark, 'pk').values_list(
+            *self.lookups, 'pk', self.watermark).iterator(
+            chunk_size=chunk_size)
+
+
+DATASETS = {
+    'items': Dataset(Item, [
+        ('id', 'id'),
+        ('slug', 'slug'),
+        ('title', 'title'),
+        ('category', 'category'),
+        ('label', 'label'),
+        ('price', 'price'),
+        ('discount_price', 'discount_price'),
+        ('effective_price', 'effective_price'),
+        ('updated_at', 'updated_at'),
+    ], watermark='updated_at', lag=TIME_LAG),
+    # Carts become orders long after they are created, so new orders are
+    # found by their payment, which is created at checkout.
+    'orders': Dataset(Order, [
+        ('id', 'id'),
+        ('ref_code', 'ref_code'),
+        ('username', 'user__username'),
+        ('email', 'user__email'),
+        ('ordered_date', 'ordered_date'),
+        ('total', 'total'),
+        ('coupon', 'coupon__code'),
+        ('charge_id', 'payment__stripe_charge_id'),
+        ('country', 'shipping_address__country'),
+        ('being_delivered', 'being_delivered'),
+        ('received', 'received'),
+        ('refund_requested', 'refund_requested'),
+        ('refund_granted', 'refund_granted'),
+    ], watermark='payment_id', lag=ID_LAG, filters={'ordered': True},
+        annotate=lambda queryset: queryset.with_totals()),
+    'payments': Dataset(Payment, [
+        ('id', 'id'),
+        ('charge_id', 'stripe_charge_id'),
+        ('username', 'user__username'),
+        ('amount', 'amount'),
+        ('status', 'status'),
+        ('timestamp', 'timestamp'),
+    ], watermark='id', lag=ID_LAG),
+}
+
+
+def watermark_string(value):
+    return value.isoformat() if hasattr(value, 'isoformat') else str(value)
+
+
+class Export:
+    # Iterating yields the encoded file in pieces, so it can be written to
+    # disk or passed to a StreamingHttpResponse as is. Afterwards count,
+    # last (the watermark string of the final row) and overlap (up to
+    # OVERLAP_ROWS rows within the lag below it, for the next export to
+    # skip) are set.
+
+    def __init__(self, dataset, queryset=None, since=None, overlap=(),
+                 file_format='csv', compress=False, chunk_size=2000):
+        self.dataset = DATASETS[dataset] if isinstance(dataset, str) \
+            else dataset
+        self.queryset = queryset
+        self.since = since
+        self.overlap = [list(entry) for entry in overlap]
+        self.file_format = file_format
+        self.compress = compress
+        self.chunk_size = chunk_size
+        self.count = 0
+        self.last = None
+
+    def __iter__(self):
+        # gzip framing (wbits=31) so the output is a regular .gz file
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31) \
+            if self.compress else None
+        for text in self.encode():
+            data = text.encode('utf-8')
+            if compressor is not None:
+                data = compressor.compress(data)
+            if data:
+                yield data
+        if compressor is not None:
+            yield compressor.flush()
+
+    def encode(self):
+        buffer = io.StringIO()
+        headers = self.dataset.headers
+        if self.file_format == 'csv':
+            writer = csv.writer(buffer)
+            writer.writerow(headers)
+            write = writer.writerow
+        else:
+            encoder = DjangoJSONEncoder()
+
+            def write(row):
+                buffer.write(encoder.encode(dict(zip(headers, row))))
+                buffer.write('\n')
+
+        exported = {(pk, value) for pk, value in self.overlap}
+        after = self.overlap[0] if self.since is not None \
+            and len(self.overlap) >= OVERLAP_ROWS else None
+        lag = self.dataset.lag
+        # (pk, watermark string, watermark) of the last rows within lag
+        window = deque(maxlen=OVERLAP_ROWS)
+        last = None
+        for row in self.dataset.rows(self.queryset, self.since, after,
+                                     self.chunk_size):
+            # pk and the watermark are selected after the columns
+            pk, mark = row[-2:]
+            value = watermark_string(mark)
+            if (pk, value) not in exported:
+                write(row[:-2])
+                self.count += 1
+                if self.count % FLUSH_ROWS == 0:
+                    yield buffer.getvalue()
+                    buffer.seek(0)
+                    buffer.truncate()
+            if mark is not None:
+                last = mark
+                window.append((pk, value, mark))
+                while window[0][2] <= mark - lag:
+                    window.popleft()
+        yield buffer.getvalue()
+        if last is not None:
+            self.last = watermark_string(last)
+            self.overlap = [[pk, value] for pk, value, _ in window]
+
+
+def get_watermark(dataset):
+    # (value, overlap), or (None, []) before the first incremental export
+    row = ExportWatermark.objects.filter(dataset=dataset).values_list(
+        'value', 'overlap').first()
+    if row is None:
+        return None, []
+    return row[0], json.loads(row[1])
+
+
+def set_watermark(dataset, value, overlap=()):
+    ExportWatermark.objects.update_or_create(
+        dataset=dataset, defaults={
+            'value': value,
+            'overlap': json.dumps(list(overlap), separators=(',', ':')),
+        })
+
+
+def export_csv(dataset):
+    # Admin action for the selected rows of a dataset's model
+    def export_as_csv(modeladmin, request, queryset):
+        response = StreamingHttpResponse(
+            Export(dataset, queryset=queryset), content_type='text/csv')
+        response['Content-Disposition'] = \
+            f'attachment; filename="{dataset}.csv"'
+        return response
+
+    export_as_csv.short_description = 'Export selected to CSV'
+    return export_as_csv
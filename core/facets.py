@@ -0,0 +1,254 @@
+from collections import Counter
+from urllib.parse import urlencode
+
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.db.models.signals import post_delete, post_save, pre_save
+
+from .models import CATEGORY_CHOICES, LABEL_CHOICES, Item, ItemFacetCount
+
+FACETS_KEY = 'catalog:facets'
+FACETS_TIMEOUT = 60 * 60
+
+PRICE_BUCKETS = (
+    (None, 25, 'Under $25'),
+    (25, 50, '$25 to $50'),
+    (50, 100, '$50 to $100'),
+    (100, None, '$100 & above'),
+)
+
+FACET_FIELDS = ('category', 'label', 'price_bucket', 'on_discount')
+# Item fields the facet values are derived from
+FACET_SOURCE_FIELDS = ('category', 'label', 'price', 'discount_price')
+# ids per IN (...) when rows are read back after a bulk update
+ID_CHUNK = 900
+FACET_PARAMS = {
+    'category': 'category',
+    'label': 'label',
+    'price_bucket': 'price',
+    'on_discount': 'discount',
+}
+FACET_VALUES = {
+    'category': CATEGORY_CHOICES,
+    'label': LABEL_CHOICES,
+    'price_bucket': [(bucket, name) for bucket, (low, high, name)
+                     in enumerate(PRICE_BUCKETS)],
+    'on_discount': [(True, 'On sale')],
+}
+
+
+def price_bucket(price):
+    for bucket, (low, high, name) in enumerate(PRICE_BUCKETS):
+        if high is None or price < high:
+            return bucket
+
+
+def facet_key(category, label, price, discount_price):
+    on_discount = bool(discount_price)
+    effective_price = discount_price if on_discount else price
+    return (category, label, price_bucket(effective_price), on_discount)
+
+
+def item_facet_key(item):
+    return facet_key(item.category, item.label, item.price,
+                     item.discount_price)
+
+
+# Every combination of facet values with its item count. There are at
+# most a few dozen cells, so counts under any filter are summed in Python
+# instead of grouping the item table on each request.
+def get_facet_cells():
+    def load():
+        return list(ItemFacetCount.objects.filter(count__gt=0).values_list(
+            *FACET_FIELDS, 'count'))
+    return cache.get_or_set(FACETS_KEY, load, FACETS_TIMEOUT)
+
+
+def _invalidate():
+    transaction.on_commit(lambda: cache.delete(FACETS_KEY))
+
+
+def _adjust(key, delta):
+    cell = dict(zip(FACET_FIELDS, key))
+    if ItemFacetCount.objects.filter(**cell).update(count=F('count') + delta):
+        return
+    try:
+        with transaction.atomic():
+            ItemFacetCount.objects.create(count=delta, **cell)
+    except IntegrityError:
+        # A concurrent save created the cell first.
+        ItemFacetCount.objects.filter(**cell).update(
+            count=F('count') + delta)
+
+
+def adjust_facet_counts(before, after):
+    # before and after: Counters of the facet keys of the changed rows
+    changed = False
+    for key in before.keys() | after.keys():
+        delta = after[key] - before[key]
+        if delta:
+            _adjust(key, delta)
+            changed = True
+    if changed:
+        _invalidate()
+
+
+# QuerySet.update(), bulk_update() and bulk_create() send no signals;
+# ItemQuerySet routes them through these instead.
+def update_facet_counts(queryset, update):
+    with transaction.atomic(using=queryset.db):
+        rows = list(queryset.order_by().values_list(
+            'pk', *FACET_SOURCE_FIELDS).iterator())
+        result = update()
+        pks = [row[0] for row in rows]
+        after = Counter()
+        for start in range(0, len(pks), ID_CHUNK):
+            after.update(facet_key(*row) for row in Item.objects.filter(
+                pk__in=pks[start:start + ID_CHUNK]).values_list(
+                *FACET_SOURCE_FIELDS))
+        adjust_facet_counts(Counter(facet_key(*row[1:]) for row in rows),
+                            after)
+    return result
+
+
+def add_facet_counts(items):
+    adjust_facet_counts(Counter(), Counter(map(item_facet_key, items)))
+
+
+@transaction.atomic
+def rebuild_facet_counts():
+    counts = Counter(
+        facet_key(*row) for row in Item.objects.order_by().values_list(
+            *FACET_SOURCE_FIELDS).iterator())
+    ItemFacetCount.objects.all().delete()
+    ItemFacetCount.objects.bulk_create(
+        ItemFacetCount(count=count, **dict(zip(FACET_FIELDS, key)))
+        for key, count in counts.items())
+    _invalidate()
+    return sum(counts.values())
+
+
+def filter_items(queryset, filters):
+    if 'category' in filters:
+        queryset = queryset.filter(category=filters['category'])
+    if 'label' in filters:
+        queryset = queryset.filter(label=filters['label'])
+    if 'price_bucket' in filters:
+        low, high, name = PRICE_BUCKETS[filters['price_bucket']]
+        if low is not None:
+            queryset = queryset.filter(effective_price__gte=low)
+        if high is not None:
+            queryset = queryset.filter(effective_price__lt=high)
+    if 'on_discount' in filters:
+        queryset = queryset.exclude(
+            Q(discount_price__isnull=True) | Q(discount_price=0))
+    return queryset
+
+
+def parse_filters(params):
+    filters = {}
+    if params.get('category') in dict(CATEGORY_CHOICES):
+        filters['category'] = params['category']
+    if params.get('label') in dict(LABEL_CHOICES):
+        filters['label'] = params['label']
+    price = params.get('price', '')
+    if price.isdigit() and int(price) < len(PRICE_BUCKETS):
+        filters['price_bucket'] = int(price)
+    if params.get('discount') == '1':
+        filters['on_discount'] = True
+    return filters
+
+
+def filter_query(filters, extra=()):
+    params = []
+    for field in FACET_FIELDS:
+        if field in filters:
+            value = '1' if filters[field] is True else filters[field]
+            params.append((FACET_PARAMS[field], value))
+    return urlencode(params + list(extra))
+
+
+def count_items(cells, filters):
+    return sum(
+        cell[-1] for cell in cells
+        if all(cell[FACET_FIELDS.index(field)] == value
+               for field, value in filters.items()))
+
+
+def facet_counts(cells, filters):
+    # Each facet is counted under every filter except its own, so its
+    # values show how many items picking them would list.
+    counts = {}
+    for position, field in enumerate(FACET_FIELDS):
+        others = {name: value for name, value in filters.items()
+                  if name != field}
+        field_counts = Counter()
+        for cell in cells:
+            if all(cell[FACET_FIELDS.index(name)] == value
+                   for name, value in others.items()):
+                field_counts[cell[position]] += cell[-1]
+        counts[field] = field_counts
+    return counts
+
+
+def facet_links(cells, filters, extra=()):
+    counts = facet_counts(cells, filters)
+    facets = {}
+    for field in FACET_FIELDS:
+        others = {name: value for name, value in filters.items()
+                  if name != field}
+        links = []
+        for value, name in FACET_VALUES[field]:
+            active = filters.get(field) == value
+            if not active and not counts[field][value]:
+                continue
+            links.append({
+                'name': name,
+                'count': counts[field][value],
+                'active': active,
+                'query': filter_query(
+                    others if active else dict(others, **{field: value}),
+                    extra),
+            })
+        facets[field] = {
+            'links': links,
+            'active': field in filters,
+            'clear_query': filter_query(others, extra),
+        }
+    return facets
+
+
+# Fixtures (loaddata, raw=True) are left alone: the rows they write may
+# not be in the counts table yet; run rebuild_facet_counts afterwards.
+def item_pre_save_receiver(sender, instance, raw=False, *args, **kwargs):
+    instance._facet_key_before = None
+    if raw or instance.pk is None:
+        return
+    row = Item.objects.filter(pk=instance.pk).values_list(
+        'category', 'label', 'price', 'discount_price').first()
+    if row is not None:
+        instance._facet_key_before = facet_key(*row)
+
+
+def item_post_save_receiver(sender, instance, raw=False, *args, **kwargs):
+    if raw:
+        return
+    before = getattr(instance, '_facet_key_before', None)
+    after = item_facet_key(instance)
+    if before == after:
+        return
+    if before is not None:
+        _adjust(before, -1)
+    _adjust(after, 1)
+    _invalidate()
+
+
+def item_post_delete_receiver(sender, instance, *args, **kwargs):
+    _adjust(item_facet_key(instance), -1)
+    _invalidate()
+
+
+pre_save.connect(item_pre_save_receiver, sender=Item)
+post_save.connect(item_post_save_receiver, sender=Item)
+post_delete.connect(item_post_delete_receiver, sender=Item)
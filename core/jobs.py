@@ -0,0 +1,144 @@
+import json
+import os
+import socket
+import threading
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import close_old_connections, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job
+
+# name -> function; the stored name outlives renames of the function
+registry = {}
+
+
+class JobError(Exception):
+    pass
+
+
+def job(name):
+    def register(func):
+        registry[name] = func
+        func.job_name = name
+        return func
+    return register
+
+
+def enqueue(name, priority=0, run_at=None, delay=0, max_attempts=None,
+            **kwargs):
+    name = getattr(name, 'job_name', name)
+    if name not in registry:
+        raise JobError(f"Unknown job: {name}")
+    if run_at is None:
+        run_at = timezone.now() + timedelta(seconds=delay)
+    if max_attempts is None:
+        max_attempts = getattr(settings, 'JOB_MAX_ATTEMPTS', 5)
+    return Job.objects.create(
+        name=name,
+        payload=json.dumps(kwargs, cls=DjangoJSONEncoder),
+        priority=priority,
+        run_at=run_at,
+        max_attempts=max_attempts
+    )
+
+
+def worker_name():
+    name = f'{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}'
+    return name[-100:]
+
+
+def backoff(attempts):
+    # 10s, 20s, 40s, ... up to an hour
+    delay = getattr(settings, 'JOB_RETRY_BACKOFF', 10) * 2 ** (attempts - 1)
+    return min(delay, getattr(settings, 'JOB_MAX_BACKOFF', 60 * 60))
+
+
+def due_jobs():
+    return Job.objects.filter(
+        status='queued', run_at__lte=timezone.now()
+    ).order_by('-priority', 'run_at', 'pk')
+
+
+def claim_jobs(worker, limit=1):
+    claim = dict(status='running', locked_by=worker,
+                 locked_at=timezone.now(), attempts=F('attempts') + 1)
+    if connection.features.has_select_for_update_skip_locked:
+        # Workers skip each other's locked rows instead of queueing
+        # behind them.
+        with transaction.atomic():
+            ids = list(due_jobs().select_for_update(
+                skip_locked=True).values_list('pk', flat=True)[:limit])
+            Job.objects.filter(pk__in=ids).update(**claim)
+    else:
+        # SQLite has no row locks, so each job is taken with a conditional
+        # UPDATE and the ones another worker got first are skipped.
+        ids = [
+            pk for pk in due_jobs().values_list('pk', flat=True)[:limit]
+            if Job.objects.filter(pk=pk, status='queued').update(**claim)
+        ]
+    if not ids:
+        return []
+    return list(Job.objects.filter(pk__in=ids).order_by(
+        '-priority', 'run_at', 'pk'))
+
+
+def run_job(job):
+    released = dict(locked_by='', locked_at=None)
+    try:
+        registry[job.name](**json.loads(job.payload))
+    except Exception:
+        if job.attempts >= job.max_attempts:
+            released.update(status='failed', finished_at=timezone.now())
+        else:
+            released.update(status='queued', run_at=timezone.now()
+                            + timedelta(seconds=backoff(job.attempts)))
+        Job.objects.filter(pk=job.pk).update(
+            error=traceback.format_exc(), **released)
+        return False
+    Job.objects.filter(pk=job.pk).update(
+        status='done', finished_at=timezone.now(), **released)
+    return True
+
+
+def run_pending_jobs(limit=1, worker=None):
+    jobs = claim_jobs(worker or worker_name(), limit)
+    for job in jobs:
+        run_job(job)
+    return len(jobs)
+
+
+def release_stale_jobs():
+    # Jobs of a worker that died mid-run are handed out again, or given up
+    # on when they are out of attempts.
+    timeout = getattr(settings, 'JOB_LOCK_TIMEOUT', 10 * 60)
+    stale = Job.objects.filter(
+        status='running',
+        locked_at__lt=timezone.now() - timedelta(seconds=timeout))
+    released = dict(locked_by='', locked_at=None,
+                    error='Worker stopped before the job finished')
+    requeued = stale.filter(attempts__lt=F('max_attempts')).update(
+        status='queued', **released)
+    failed = stale.update(status='failed', finished_at=timezone.now(),
+                          **released)
+    return requeued + failed
+
+
+def work(stop, batch_size=1, sleep=1.0, drain=False):
+    # Body of a worker thread; stop is a threading.Event.
+    worker = worker_name()
+    try:
+        while not stop.is_set():
+            close_old_connections()
+            if run_pending_jobs(batch_size, worker):
+                continue
+            if drain:
+                break
+            release_stale_jobs()
+            stop.wait(sleep)
+    finally:
+        connection.close()
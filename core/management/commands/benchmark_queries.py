@@ -0,0 +1,124 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+
+from core.models import Address, Coupon, Item, Order, OrderItem
+
+
+class Command(BaseCommand):
+    help = 'Seeds a throwaway test database and prints the plan of every hot view query'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=1000000,
+                            help='Number of orders to seed')
+        parser.add_argument('--orders-per-user', type=int, default=10,
+                            help='Orders per user; the last one stays open')
+        parser.add_argument('--items', type=int, default=10000,
+                            help='Number of catalog items to seed')
+        parser.add_argument('--batch-size', type=int, default=10000)
+        parser.add_argument('--keepdb', action='store_true',
+                            help='Reuse the seeded test database between runs')
+
+    def handle(self, *args, **kwargs):
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False,
+            keepdb=kwargs['keepdb'])
+        try:
+            if not Order.objects.exists():
+                started = time.perf_counter()
+                self.seed(kwargs['orders'], kwargs['orders_per_user'],
+                          kwargs['items'], kwargs['batch_size'])
+                self.stdout.write(
+                    f"Seeded {kwargs['orders']} orders in "
+                    f"{time.perf_counter() - started:.1f}s")
+            self.explain_all()
+        finally:
+            connection.creation.destroy_test_db(
+                old_name, verbosity=0, keepdb=kwargs['keepdb'])
+
+    def seed(self, orders, orders_per_user, items, batch_size):
+        User = get_user_model()
+        users = -(-orders // orders_per_user)
+        now = timezone.now()
+
+        self.bulk(User, (User(id=i, username=f'user{i}')
+                         for i in range(1, users + 1)), batch_size)
+        self.bulk(Item, (Item(id=i, title=f'Item {i}', price=10 + i % 90,
+                              discount_price=(5 + i % 40) if i % 3 == 0 else None,
+                              category='S', label='P', slug=f'item-{i}',
+                              description='', image='item.jpg')
+                         for i in range(1, items + 1)), batch_size)
+        self.bulk(Coupon, (Coupon(id=i, code=f'CODE{i}', amount=5)
+                           for i in range(1, 101)), batch_size)
+        self.bulk(Address, (Address(id=i, user_id=(i - 1) // 2 + 1,
+                                    street_address='1 Main St',
+                                    apartment_address='', country='US',
+                                    zip='10001',
+                                    address_type='S' if i % 2 else 'B',
+                                    default=True)
+                            for i in range(1, users * 2 + 1)), batch_size)
+
+        def order_rows():
+            for i in range(1, orders + 1):
+                is_open = i % orders_per_user == 0
+                yield i, (i - 1) // orders_per_user + 1, is_open
+
+        self.bulk(OrderItem, (OrderItem(id=i, user_id=user_id,
+                                        item_id=i % items + 1,
+                                        ordered=not is_open)
+                              for i, user_id, is_open in order_rows()), batch_size)
+        self.bulk(Order, (Order(id=i, user_id=user_id, ordered_date=now,
+                                ordered=not is_open,
+                                ref_code=None if is_open else f'ref{i:017d}')
+                          for i, user_id, is_open in order_rows()), batch_size)
+        Through = Order.items.through
+        self.bulk(Through, (Through(order_id=i, orderitem_id=i)
+                            for i in range(1, orders + 1)), batch_size)
+
+    def bulk(self, model, objs, batch_size):
+        batch = []
+        for obj in objs:
+            batch.append(obj)
+            if len(batch) >= batch_size:
+                model.objects.bulk_create(batch)
+                batch = []
+        if batch:
+            model.objects.bulk_create(batch)
+
+    def explain_all(self):
+        order = Order.objects.filter(ordered=False).order_by('-pk').first()
+        user = order.user
+        item = Item.objects.order_by('-pk').first()
+        paid = Order.objects.filter(ordered=True).order_by('-pk').first()
+
+        queries = [
+            ('open order', Order.objects.filter(user=user, ordered=False)),
+            ('cart count', OrderItem.objects.filter(
+                order__user=user, order__ordered=False)),
+            ('cart line', OrderItem.objects.filter(
+                order=order, item__slug=item.slug)),
+            ('open order line', OrderItem.objects.filter(
+                user=user, item=item, ordered=False)),
+            ('order total', Order.objects.with_totals().filter(pk=order.pk)),
+            ('product page', Item.objects.filter(slug=item.slug)),
+            ('default address', Address.objects.filter(
+                user=user, address_type='S', default=True)),
+            ('coupon', Coupon.objects.filter(code='CODE1')),
+            ('refund lookup', Order.objects.filter(ref_code=paid.ref_code)),
+            ('catalog by price', Item.objects.order_by(
+                '-effective_price', '-pk')[:11]),
+            ('category price range', Item.objects.filter(
+                category='S', effective_price__gte=25, effective_price__lt=50
+            ).order_by('effective_price', 'pk')[:11]),
+        ]
+        for name, queryset in queries:
+            started = time.perf_counter()
+            list(queryset)
+            elapsed = (time.perf_counter() - started) * 1000
+            self.stdout.write(self.style.SUCCESS(f'{name} ({elapsed:.2f} ms)'))
+            self.stdout.write(queryset.explain())
+            self.stdout.write('')
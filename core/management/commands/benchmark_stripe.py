@@ -0,0 +1,66 @@
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import stripe
+from django.core.management.base import BaseCommand
+
+from core.stripe_client import build_http_client
+from core.stripe_standin import StripeStandIn
+
+
+class Command(BaseCommand):
+    help = ('Measures Stripe charge throughput against a local stand-in, '
+            'with the pooled keep-alive client and without keep-alive')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--charges', type=int, default=500)
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--latency-ms', type=float, default=20,
+                            help='Delay the stand-in adds to every response')
+        parser.add_argument('--handshake-ms', type=float, default=30,
+                            help='Delay the stand-in adds to every new '
+                                 'connection, like a TLS handshake')
+
+    def handle(self, *args, **kwargs):
+        server = StripeStandIn(
+            latency=kwargs['latency_ms'] / 1000,
+            handshake_latency=kwargs['handshake_ms'] / 1000).start()
+        saved = (stripe.api_base, stripe.api_key, stripe.default_http_client,
+                 stripe.max_network_retries)
+        stripe.api_base, stripe.api_key = server.url, 'sk_test_standin'
+        stripe.max_network_retries = 0
+        try:
+            for name, keep_alive in (('pooled keep-alive', True),
+                                     ('no keep-alive', False)):
+                client = build_http_client()
+                if not keep_alive:
+                    client._session.headers['Connection'] = 'close'
+                stripe.default_http_client = client
+                self.run(name, server, kwargs['charges'],
+                         kwargs['concurrency'])
+        finally:
+            (stripe.api_base, stripe.api_key, stripe.default_http_client,
+             stripe.max_network_retries) = saved
+            server.stop()
+
+    def run(self, name, server, charges, concurrency):
+        def charge(i):
+            started = time.perf_counter()
+            stripe.Charge.create(amount=1000, currency='usd',
+                                 source='tok_visa')
+            return time.perf_counter() - started
+
+        connections = server.stats['connections']
+        started = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as pool:
+            latencies = sorted(pool.map(charge, range(charges)))
+        elapsed = time.perf_counter() - started
+
+        p95 = latencies[int(len(latencies) * 0.95) - 1] * 1000
+        self.stdout.write(self.style.SUCCESS(name))
+        self.stdout.write(
+            f'  {charges / elapsed:.0f} charges/s, '
+            f'p50 {statistics.median(latencies) * 1000:.1f} ms, '
+            f'p95 {p95:.1f} ms, '
+            f'{server.stats["connections"] - connections} connections')
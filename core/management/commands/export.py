@@ -0,0 +1,57 @@
+import os
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.exports import DATASETS, Export, get_watermark, set_watermark
+
+
+class Command(BaseCommand):
+    help = ('Streams items, orders or payments to a CSV or JSON Lines file '
+            'without loading them into memory')
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=sorted(DATASETS))
+        parser.add_argument('--format', choices=['csv', 'jsonl'],
+                            default='csv')
+        parser.add_argument('--output',
+                            help="File to write, '-' for stdout; default "
+                                 "<dataset>.<format>[.gz]")
+        parser.add_argument('--gzip', action='store_true')
+        parser.add_argument('--incremental', action='store_true',
+                            help='Only rows added or changed since the last '
+                                 'incremental export')
+        parser.add_argument('--chunk-size', type=int, default=2000,
+                            help='Rows fetched from the database at a time')
+
+    def handle(self, *args, **kwargs):
+        dataset = kwargs['dataset']
+        output = kwargs['output'] or '{}.{}{}'.format(
+            dataset, kwargs['format'], '.gz' if kwargs['gzip'] else '')
+        since, overlap = get_watermark(dataset) if kwargs['incremental'] \
+            else (None, [])
+        export = Export(dataset, since=since, overlap=overlap,
+                        file_format=kwargs['format'],
+                        compress=kwargs['gzip'],
+                        chunk_size=kwargs['chunk_size'])
+
+        started = time.perf_counter()
+        if output == '-':
+            for data in export:
+                sys.stdout.buffer.write(data)
+            sys.stdout.flush()
+        else:
+            # a failed export never leaves a partial file under the name
+            tmp_path = output + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                for data in export:
+                    f.write(data)
+            os.replace(tmp_path, output)
+
+        if kwargs['incremental'] and export.last is not None:
+            set_watermark(dataset, export.last, export.overlap)
+        # stdout may be the export itself
+        self.stderr.write(self.style.SUCCESS(
+            f'Exported {export.count} {dataset} in '
+            f'{time.perf_counter() - started:.1f}s'))
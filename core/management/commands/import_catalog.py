@@ -0,0 +1,74 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core import autocomplete, search
+from core.catalog_import import (CatalogImporter, load_checkpoint,
+                                 read_rows, save_checkpoint)
+from core.facets import rebuild_facet_counts
+
+
+class Command(BaseCommand):
+    help = ('Imports products from a CSV or JSON Lines file, creating new '
+            'items and updating existing ones by slug')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['csv', 'jsonl'],
+                            help='Defaults to the file extension')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Rows written per transaction')
+        parser.add_argument('--checkpoint',
+                            help='Progress file, default <path>.checkpoint')
+        parser.add_argument('--resume', action='store_true',
+                            help='Skip the rows an interrupted run of the '
+                                 'same file already imported')
+        parser.add_argument('--skip-indexes', action='store_true',
+                            help='Do not rebuild facet counts and search '
+                                 'indexes afterwards')
+
+    def handle(self, *args, **kwargs):
+        path = kwargs['path']
+        if not os.path.isfile(path):
+            raise CommandError(f'No such file: {path}')
+        checkpoint = kwargs['checkpoint'] or path + '.checkpoint'
+        skip = load_checkpoint(checkpoint, path) if kwargs['resume'] else 0
+        if skip:
+            self.stdout.write(f'Resuming after row {skip}')
+
+        importer = CatalogImporter(kwargs['batch_size'])
+        started = time.perf_counter()
+
+        def on_batch(rows_read):
+            save_checkpoint(checkpoint, path, rows_read)
+            stats = importer.stats
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f'{rows_read} rows: {stats["created"]} created, '
+                f'{stats["updated"]} updated, '
+                f'{stats["unchanged"]} unchanged, {stats["errors"]} errors '
+                f'({stats["rows"] / elapsed:.0f} rows/s)')
+
+        stats = importer.run(read_rows(path, kwargs['format']), skip,
+                             on_batch)
+        os.remove(checkpoint)
+
+        for number, error in importer.errors:
+            self.stderr.write(f'Row {number}: {error}')
+        if stats['errors'] > len(importer.errors):
+            self.stderr.write(
+                f'... {stats["errors"] - len(importer.errors)} more errors')
+
+        # bulk writes skip the Item signals that keep these up to date
+        if not kwargs['skip_indexes'] and stats['created'] + stats['updated']:
+            rebuild_facet_counts()
+            directory = getattr(settings, 'SEARCH_INDEX_DIR', None)
+            if directory is not None:
+                search.rebuild_index(directory)
+                autocomplete.rebuild_index(directory)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {stats["rows"] - stats["errors"]} of {stats["rows"]} '
+            f'rows in {time.perf_counter() - started:.1f}s'))
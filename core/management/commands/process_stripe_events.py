@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.webhooks import process_pending_events
+
+
+class Command(BaseCommand):
+    help = ('Applies stored Stripe webhook events to payments, orders and '
+            'refunds, a batch at a time')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep polling for new events')
+        parser.add_argument('--sleep', type=float, default=1.0,
+                            help='Seconds to wait when no events are pending')
+
+    def handle(self, *args, **kwargs):
+        total = 0
+        try:
+            while True:
+                n_events = process_pending_events(kwargs['batch_size'])
+                total += n_events
+                if n_events:
+                    continue
+                if not kwargs['loop']:
+                    break
+                time.sleep(kwargs['sleep'])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(f'Processed {total} events'))
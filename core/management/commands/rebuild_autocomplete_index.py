@@ -0,0 +1,25 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.autocomplete import rebuild_index
+
+
+class Command(BaseCommand):
+    help = ('Rebuilds the memory-mapped autocomplete snapshot of product '
+            'titles, ranked by units sold')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000,
+                            help='Rows fetched from the database per chunk')
+
+    def handle(self, *args, **kwargs):
+        directory = getattr(settings, 'SEARCH_INDEX_DIR', None)
+        if directory is None:
+            raise CommandError('SEARCH_INDEX_DIR is not configured')
+
+        started = time.perf_counter()
+        n_docs = rebuild_index(directory, kwargs['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Indexed {n_docs} titles in {time.perf_counter() - started:.1f}s'))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from core.facets import rebuild_facet_counts
+
+
+class Command(BaseCommand):
+    help = ('Recounts the catalog facet summary table, e.g. after bulk '
+            'imports or queryset updates that bypass Item signals')
+
+    def handle(self, *args, **kwargs):
+        n_items = rebuild_facet_counts()
+        self.stdout.write(self.style.SUCCESS(f'Counted {n_items} items'))
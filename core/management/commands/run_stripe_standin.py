@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from core.stripe_standin import StripeStandIn
+
+
+class Command(BaseCommand):
+    help = ('Serves an in-memory stand-in for the Stripe API; set '
+            'STRIPE_API_BASE to its URL to run payments offline')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--port', type=int, default=12111)
+        parser.add_argument('--latency-ms', type=float, default=0,
+                            help='Delay added to every response')
+        parser.add_argument('--handshake-ms', type=float, default=0,
+                            help='Delay added to every new connection')
+
+    def handle(self, *args, **kwargs):
+        server = StripeStandIn(('127.0.0.1', kwargs['port']),
+                               latency=kwargs['latency_ms'] / 1000,
+                               handshake_latency=kwargs['handshake_ms'] / 1000)
+        self.stdout.write(self.style.SUCCESS(
+            f'Stripe stand-in listening on {server.url}'))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,70 @@
+import signal
+import subprocess
+import sys
+import threading
+
+from django.core.management.base import BaseCommand
+
+from core.jobs import work
+
+
+class Command(BaseCommand):
+    help = ('Runs queued background jobs; several processes and machines '
+            'can work the same queue')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=1)
+        parser.add_argument('--processes', type=int, default=1,
+                            help='Start this many worker processes, each '
+                                 'with --threads threads')
+        parser.add_argument('--batch-size', type=int, default=1,
+                            help='Jobs a thread claims at a time')
+        parser.add_argument('--sleep', type=float, default=1.0,
+                            help='Seconds to wait when no job is due')
+        parser.add_argument('--drain', action='store_true',
+                            help='Exit once no job is due')
+
+    def handle(self, *args, **kwargs):
+        if kwargs['processes'] > 1:
+            return self.spawn(kwargs)
+
+        stop = threading.Event()
+        signal.signal(signal.SIGTERM, lambda *args: stop.set())
+        threads = [
+            threading.Thread(target=work, args=(stop,), kwargs={
+                'batch_size': kwargs['batch_size'],
+                'sleep': kwargs['sleep'],
+                'drain': kwargs['drain'],
+            })
+            for _ in range(kwargs['threads'])
+        ]
+        for thread in threads:
+            thread.start()
+        self.stdout.write(self.style.SUCCESS(
+            f'Worker running with {len(threads)} threads'))
+        try:
+            for thread in threads:
+                while thread.is_alive():
+                    thread.join(0.5)
+        except KeyboardInterrupt:
+            stop.set()
+            for thread in threads:
+                thread.join()
+
+    def spawn(self, kwargs):
+        argv = [sys.executable, sys.argv[0], 'run_worker',
+                '--threads', str(kwargs['threads']),
+                '--batch-size', str(kwargs['batch_size']),
+                '--sleep', str(kwargs['sleep'])]
+        if kwargs['drain']:
+            argv.append('--drain')
+        children = [subprocess.Popen(argv)
+                    for _ in range(kwargs['processes'])]
+        signal.signal(signal.SIGTERM,
+                      lambda *args: [child.terminate() for child in children])
+        try:
+            for child in children:
+                child.wait()
+        except KeyboardInterrupt:
+            for child in children:
+                child.wait()
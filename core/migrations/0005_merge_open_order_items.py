@@ -0,0 +1,43 @@
+# Generated by Django 3.2.25 on 2026-10-17 00:57
+
+from django.db import migrations
+from django.db.models import Count, Min
+
+
+def merge_open_order_items(apps, schema_editor):
+    # Folds duplicate open lines of a user and item into the oldest one so
+    # the unique constraint can be added.
+    OrderItem = apps.get_model('core', 'OrderItem')
+    Through = apps.get_model('core', 'Order').items.through
+    duplicates = OrderItem.objects.filter(ordered=False).values(
+        'user', 'item').annotate(n=Count('id'), keep=Min('id')).filter(n__gt=1)
+    for group in duplicates:
+        lines = list(OrderItem.objects.filter(
+            ordered=False, user=group['user'], item=group['item']))
+        kept = next(line for line in lines if line.pk == group['keep'])
+        others = [line.pk for line in lines if line.pk != kept.pk]
+        kept.quantity = sum(line.quantity for line in lines)
+        kept.save(update_fields=['quantity'])
+        linked = set(Through.objects.filter(orderitem_id=kept.pk).values_list(
+            'order_id', flat=True))
+        for order_id in Through.objects.filter(
+                orderitem_id__in=others).values_list('order_id', flat=True):
+            if order_id not in linked:
+                Through.objects.create(order_id=order_id, orderitem_id=kept.pk)
+                linked.add(order_id)
+        OrderItem.objects.filter(pk__in=others).delete()
+
+
+# On its own so its deletes are committed before the next migration adds
+# the unique index; PostgreSQL refuses to alter a table with trigger
+# events still pending.
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_auto_20190630_1408'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_open_order_items,
+                             migrations.RunPython.noop),
+    ]
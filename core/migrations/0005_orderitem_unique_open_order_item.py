@@ -0,0 +1,17 @@
+# Generated by Django 3.2.25 on 2026-10-17 00:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_merge_open_order_items'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='orderitem',
+            constraint=models.UniqueConstraint(condition=models.Q(('ordered', False)), fields=('user', 'item'), name='unique_open_order_item'),
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 3.2.25 on 2026-10-17 00:58
+
+from django.db import migrations
+from django.db.models import Count, Min
+
+
+def _rename_duplicates(model, field, max_length):
+    # The first row keeps its value; later ones get their id appended.
+    values = model.objects.exclude(**{field: None}).values(field).annotate(
+        n=Count('id')).filter(n__gt=1).values_list(field, flat=True)
+    for value in list(values):
+        for row in model.objects.filter(**{field: value}).order_by('id')[1:]:
+            suffix = f'-{row.pk}'
+            new_value = value[:max_length - len(suffix)] + suffix
+            while model.objects.filter(**{field: new_value}).exists():
+                suffix += 'x'
+                new_value = value[:max_length - len(suffix)] + suffix
+            model.objects.filter(pk=row.pk).update(**{field: new_value})
+
+
+def deduplicate(apps, schema_editor):
+    Order = apps.get_model('core', 'Order')
+    Through = Order.items.through
+    # a blank ref code means none; only one '' could stay unique
+    Order.objects.filter(ref_code='').update(ref_code=None)
+    _rename_duplicates(apps.get_model('core', 'Coupon'), 'code', 15)
+    _rename_duplicates(apps.get_model('core', 'Item'), 'slug', 50)
+    _rename_duplicates(Order, 'ref_code', 20)
+
+    # Several open carts: the oldest one, which the views used to pick,
+    # takes over the lines of the others.
+    carts = Order.objects.filter(ordered=False).values('user').annotate(
+        n=Count('id'), keep=Min('id')).filter(n__gt=1)
+    for cart in carts:
+        others = list(Order.objects.filter(
+            user=cart['user'], ordered=False).exclude(
+            pk=cart['keep']).values_list('pk', flat=True))
+        linked = set(Through.objects.filter(order_id=cart['keep']).values_list(
+            'orderitem_id', flat=True))
+        for orderitem_id in Through.objects.filter(
+                order_id__in=others).values_list('orderitem_id', flat=True):
+            if orderitem_id not in linked:
+                Through.objects.create(order_id=cart['keep'],
+                                       orderitem_id=orderitem_id)
+                linked.add(orderitem_id)
+        Order.objects.filter(pk__in=others).delete()
+
+
+# On its own, so the rows it changes are committed before the next
+# migration alters the tables; PostgreSQL refuses to while trigger events
+# are pending.
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_orderitem_unique_open_order_item'),
+    ]
+
+    operations = [
+        migrations.RunPython(deduplicate, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 3.2.25 on 2026-10-17 01:11
+
+from collections import Counter
+
+from django.db import migrations, models
+
+
+# A copy of core.facets as of this migration; later changes to the live
+# module must not change what this migration computes.
+FACET_FIELDS = ('category', 'label', 'price_bucket', 'on_discount')
+PRICE_BUCKET_LIMITS = (25, 50, 100)
+
+
+def facet_key(category, label, price, discount_price):
+    on_discount = bool(discount_price)
+    effective_price = discount_price if on_discount else price
+    bucket = sum(1 for limit in PRICE_BUCKET_LIMITS
+                 if effective_price >= limit)
+    return (category, label, bucket, on_discount)
+
+
+def populate_facet_counts(apps, schema_editor):
+    Item = apps.get_model('core', 'Item')
+    ItemFacetCount = apps.get_model('core', 'ItemFacetCount')
+    counts = Counter(
+        facet_key(*row) for row in Item.objects.values_list(
+            'category', 'label', 'price', 'discount_price').iterator())
+    ItemFacetCount.objects.bulk_create(
+        ItemFacetCount(count=count, **dict(zip(FACET_FIELDS, key)))
+        for key, count in counts.items())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_item_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ItemFacetCount',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('category', models.CharField(choices=[('S', 'Shirt'), ('SW', 'Sport wear'), ('OW', 'Outwear')], max_length=2)),
+                ('label', models.CharField(choices=[('P', 'primary'), ('S', 'secondary'), ('D', 'danger')], max_length=1)),
+                ('price_bucket', models.PositiveSmallIntegerField()),
+                ('on_discount', models.BooleanField()),
+                ('count', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='itemfacetcount',
+            constraint=models.UniqueConstraint(fields=('category', 'label', 'price_bucket', 'on_discount'), name='unique_item_facet'),
+        ),
+        migrations.RunPython(populate_facet_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 3.2.25 on 2026-10-17 02:05
+
+from django.db import migrations, models
+from django.db.models import F, Value
+from django.db.models.functions import Coalesce, NullIf
+
+
+def fill_effective_price(apps, schema_editor):
+    Item = apps.get_model('core', 'Item')
+    Item.objects.update(effective_price=Coalesce(
+        NullIf(F('discount_price'), Value(0.0)), F('price')))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_itemfacetcount'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='item',
+            name='effective_price',
+            field=models.FloatField(default=0, editable=False),
+            preserve_default=False,
+        ),
+        migrations.RunPython(fill_effective_price, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(fields=['effective_price', 'id'], name='core_item_effecti_b689e5_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(fields=['category', 'effective_price', 'id'], name='core_item_categor_03824e_idx'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 3.2.25 on 2026-10-17 01:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExportWatermark',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dataset', models.CharField(max_length=50, unique=True)),
+                ('value', models.CharField(max_length=50)),
+                ('exported_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-17 02:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_order_template'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exportwatermark',
+            name='overlap',
+            field=models.TextField(default='[]'),
+        ),
+    ]
@@ -1,8 +1,10 @@
 from django.db.models.signals import post_save
 from django.conf import settings
-from django.db import models
-from django.db.models import Sum
+from django.db import models, transaction
+from django.db.models import ExpressionWrapper, F, FloatField, Sum, Value
+from django.db.models.functions import Coalesce, NullIf
 from django.shortcuts import reverse
+from django.utils import timezone
 from django_countries.fields import CountryField
 
 
@@ -23,6 +25,19 @@ ADDRESS_CHOICES = (
     ('S', 'Shipping'),
 )
 
+PAYMENT_STATUS_CHOICES = (
+    ('succeeded', 'Succeeded'),
+    ('failed', 'Failed'),
+    ('refunded', 'Refunded'),
+)
+
+JOB_STATUS_CHOICES = (
+    ('queued', 'Queued'),
+    ('running', 'Running'),
+    ('done', 'Done'),
+    ('failed', 'Failed'),
+)
+
 
 class UserProfile(models.Model):
     user = models.OneToOneField(
@@ -34,19 +49,95 @@ class UserProfile(models.Model):
         return self.user.username
 
 
+def effective_price_expression(price=F('price'),
+                               discount_price=F('discount_price')):
+    # A missing or zero discount price means the item sells at its
+    # regular price.
+    return Coalesce(NullIf(discount_price, Value(0.0)), price)
+
+
+class ItemQuerySet(models.QuerySet):
+
+    def update(self, **kwargs):
+        # bulk_update() passes effective_price itself
+        if ('price' in kwargs or 'discount_price' in kwargs) \
+                and 'effective_price' not in kwargs:
+            # SET expressions see the old row, so the stored price is
+            # derived from the new values.
+            prices = {}
+            for name in ('price', 'discount_price'):
+                value = kwargs.get(name, F(name))
+                if not hasattr(value, 'resolve_expression'):
+                    value = Value(value, output_field=FloatField())
+                prices[name] = value
+            kwargs['effective_price'] = effective_price_expression(**prices)
+        # auto_now only applies to save(); exports and the product page
+        # cache go by updated_at. bulk_update() ends up here as well.
+        kwargs.setdefault('updated_at', timezone.now())
+        from .facets import FACET_SOURCE_FIELDS, update_facet_counts
+        update = super().update
+        if set(FACET_SOURCE_FIELDS).isdisjoint(kwargs):
+            return update(**kwargs)
+        return update_facet_counts(self, lambda: update(**kwargs))
+
+    def bulk_create(self, objs, *args, **kwargs):
+        from .facets import add_facet_counts, rebuild_facet_counts
+        objs = list(objs)
+        for obj in objs:
+            obj.effective_price = obj.get_effective_price()
+        with transaction.atomic(using=self.db):
+            created = super().bulk_create(objs, *args, **kwargs)
+            # skipped conflicts are not reported back
+            if kwargs.get('ignore_conflicts'):
+                rebuild_facet_counts()
+            else:
+                add_facet_counts(created)
+        return created
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        fields = list(fields)
+        if 'price' in fields or 'discount_price' in fields:
+            objs = list(objs)
+            for obj in objs:
+                obj.effective_price = obj.get_effective_price()
+            fields.append('effective_price')
+        return super().bulk_update(objs, fields, *args, **kwargs)
+
+
 class Item(models.Model):
     title = models.CharField(max_length=100)
     price = models.FloatField()
     discount_price = models.FloatField(blank=True, null=True)
+    # discount_price or price, stored so sorting and price ranges can use
+    # an index. Kept in sync by save() and ItemQuerySet.
+    effective_price = models.FloatField(editable=False)
     category = models.CharField(choices=CATEGORY_CHOICES, max_length=2)
     label = models.CharField(choices=LABEL_CHOICES, max_length=1)
-    slug = models.SlugField()
+    slug = models.SlugField(unique=True)
     description = models.TextField()
     image = models.ImageField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = ItemQuerySet.as_manager()
 
     def __str__(self):
         return self.title
 
+    def get_effective_price(self):
+        return self.discount_price or self.price
+
+    def save(self, *args, **kwargs):
+        self.effective_price = self.get_effective_price()
+        update_fields = kwargs.get('update_fields')
+        if update_fields:
+            # auto_now only writes updated_at when it is in update_fields;
+            # the product page cache and exports go by it.
+            update_fields = set(update_fields) | {'updated_at'}
+            if 'price' in update_fields or 'discount_price' in update_fields:
+                update_fields.add('effective_price')
+            kwargs['update_fields'] = update_fields
+        super().save(*args, **kwargs)
+
     def get_absolute_url(self):
         return reverse("core:product", kwargs={
             'slug': self.slug
@@ -62,6 +153,32 @@ class Item(models.Model):
             'slug': self.slug
         })
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['effective_price', 'id']),
+            models.Index(fields=['category', 'effective_price', 'id']),
+        ]
+
+
+class ItemFacetCount(models.Model):
+    category = models.CharField(choices=CATEGORY_CHOICES, max_length=2)
+    label = models.CharField(choices=LABEL_CHOICES, max_length=1)
+    price_bucket = models.PositiveSmallIntegerField()
+    on_discount = models.BooleanField()
+    count = models.IntegerField(default=0)
+
+    def __str__(self):
+        return (f"{self.category}/{self.label}/{self.price_bucket}/"
+                f"{self.on_discount}: {self.count}")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['category', 'label', 'price_bucket', 'on_discount'],
+                name='unique_item_facet'
+            )
+        ]
+
 
 class OrderItem(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL,
@@ -83,15 +200,37 @@ class OrderItem(models.Model):
         return self.get_total_item_price() - self.get_total_discount_item_price()
 
     def get_final_price(self):
-        if self.item.discount_price:
-            return self.get_total_discount_item_price()
-        return self.get_total_item_price()
+        return self.quantity * self.item.get_effective_price()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'item'],
+                condition=models.Q(ordered=False),
+                name='unique_open_order_item'
+            )
+        ]
+
+
+class OrderQuerySet(models.QuerySet):
+
+    def with_totals(self):
+        line_price = ExpressionWrapper(
+            F('items__quantity') * F('items__item__effective_price'),
+            output_field=FloatField()
+        )
+        return self.annotate(
+            subtotal=Coalesce(Sum(line_price), Value(0.0))
+        ).annotate(
+            total=F('subtotal') - Coalesce(F('coupon__amount'), Value(0.0))
+        )
 
 
 class Order(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL,
                              on_delete=models.CASCADE)
-    ref_code = models.CharField(max_length=20, blank=True, null=True)
+    ref_code = models.CharField(
+        max_length=20, blank=True, null=True, unique=True)
     items = models.ManyToManyField(OrderItem)
     start_date = models.DateTimeField(auto_now_add=True)
     ordered_date = models.DateTimeField()
@@ -109,6 +248,8 @@ class Order(models.Model):
     refund_requested = models.BooleanField(default=False)
     refund_granted = models.BooleanField(default=False)
 
+    objects = OrderQuerySet.as_manager()
+
     '''
     1. Item added to cart
     2. Adding a billing address
@@ -124,12 +265,22 @@ class Order(models.Model):
         return self.user.username
 
     def get_total(self):
-        total = 0
-        for order_item in self.items.all():
-            total += order_item.get_final_price()
-        if self.coupon:
-            total -= self.coupon.amount
-        return total
+        if hasattr(self, 'total'):
+            return self.total
+        return Order.objects.with_totals().values_list(
+            'total', flat=True).get(pk=self.pk)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'ordered']),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user'],
+                condition=models.Q(ordered=False),
+                name='unique_open_order'
+            )
+        ]
 
 
 class Address(models.Model):
@@ -147,21 +298,26 @@ class Address(models.Model):
 
     class Meta:
         verbose_name_plural = 'Addresses'
+        indexes = [
+            models.Index(fields=['user', 'address_type', 'default']),
+        ]
 
 
 class Payment(models.Model):
-    stripe_charge_id = models.CharField(max_length=50)
+    stripe_charge_id = models.CharField(max_length=50, db_index=True)
     user = models.ForeignKey(settings.AUTH_USER_MODEL,
                              on_delete=models.SET_NULL, blank=True, null=True)
     amount = models.FloatField()
     timestamp = models.DateTimeField(auto_now_add=True)
+    status = models.CharField(
+        max_length=10, choices=PAYMENT_STATUS_CHOICES, default='succeeded')
 
     def __str__(self):
         return self.user.username
 
 
 class Coupon(models.Model):
-    code = models.CharField(max_length=15)
+    code = models.CharField(max_length=15, unique=True)
     amount = models.FloatField()
 
     def __str__(self):
@@ -178,6 +334,84 @@ class Refund(models.Model):
         return f"{self.pk}"
 
 
+class StripeEvent(models.Model):
+    event_id = models.CharField(max_length=255, unique=True)
+    type = models.CharField(max_length=100)
+    payload = models.TextField()
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(blank=True, null=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True)
+
+    def __str__(self):
+        return f"{self.type} {self.event_id}"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['id'],
+                         condition=models.Q(processed_at__isnull=True),
+                         name='stripe_event_pending'),
+        ]
+
+
+class Job(models.Model):
+    name = models.CharField(max_length=100)
+    payload = models.TextField(default='{}')
+    # higher runs first
+    priority = models.SmallIntegerField(default=0)
+    status = models.CharField(
+        max_length=10, choices=JOB_STATUS_CHOICES, default='queued')
+    run_at = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+    error = models.TextField(blank=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.status})"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-priority', 'run_at', 'id'],
+                         condition=models.Q(status='queued'),
+                         name='job_queued'),
+            models.Index(fields=['locked_at'],
+                         condition=models.Q(status='running'),
+                         name='job_running'),
+        ]
+
+
+class OrderTemplate(models.Model):
+    # A saved OrderPrototype; see core.order_templates
+    name = models.CharField(max_length=100, unique=True)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL,
+                             on_delete=models.CASCADE)
+    # JSON: address ids, [item id, quantity] pairs and preferences
+    payload = models.TextField()
+    version = models.BigIntegerField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.name
+
+
+class ExportWatermark(models.Model):
+    # Where the last incremental export of a dataset stopped
+    dataset = models.CharField(max_length=50, unique=True)
+    value = models.CharField(max_length=50)
+    # JSON list of [pk, watermark] of the rows exported within the safety
+    # lag below value, at most exports.OVERLAP_ROWS of them; the next
+    # export reads them again and skips them.
+    overlap = models.TextField(default='[]')
+    exported_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.dataset} > {self.value}"
+
+
 def userprofile_receiver(sender, instance, created, *args, **kwargs):
     if created:
         userprofile = UserProfile.objects.create(user=instance)
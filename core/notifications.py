@@ -0,0 +1,164 @@
+import atexit
+import threading
+import time
+
+from django.conf import settings
+from django.core.mail import get_connection
+
+
+class QueuedEmail:
+    def __init__(self, message):
+        self.message = message
+        self.status = 'queued'
+        self.attempts = 0
+        self.error = ''
+        self.queued_at = time.monotonic()
+        # set once the message is sent or given up on
+        self.done = threading.Event()
+
+
+class EmailBatcher:
+    # Collects outgoing mail and sends it in batches over one SMTP
+    # connection. A background thread flushes once batch_size messages are
+    # waiting or the oldest has waited interval seconds. Failed messages go
+    # back in the queue until max_attempts.
+
+    def __init__(self, batch_size=50, interval=5.0, max_attempts=3,
+                 connection_factory=get_connection):
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_attempts = max_attempts
+        self.connection_factory = connection_factory
+        self.pending = []
+        self.stats = {'connections': 0, 'sent': 0, 'retried': 0,
+                      'failed': 0}
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+
+    def add(self, message):
+        queued = QueuedEmail(message)
+        with self._cond:
+            self.pending.append(queued)
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name='email-batcher', daemon=True)
+                self._thread.start()
+            if len(self.pending) >= self.batch_size:
+                self._cond.notify()
+        return queued
+
+    def discard(self, queued):
+        # Takes a message out of the queue; False if it is already being
+        # sent or done.
+        with self._cond:
+            if queued in self.pending:
+                self.pending.remove(queued)
+                return True
+        return False
+
+    def _due(self):
+        return self.pending and (
+            len(self.pending) >= self.batch_size
+            or time.monotonic() - self.pending[0].queued_at >= self.interval)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._due():
+                    timeout = None
+                    if self.pending:
+                        timeout = (self.pending[0].queued_at + self.interval
+                                   - time.monotonic())
+                    self._cond.wait(timeout)
+            self.flush()
+
+    def flush(self):
+        with self._flush_lock:
+            with self._cond:
+                batch, self.pending = self.pending, []
+            if batch:
+                self._send(batch)
+            return len(batch)
+
+    def close(self):
+        # Sends everything still queued, retries included, without waiting
+        # for the interval; flush() hands failures back to the queue until
+        # they run out of attempts.
+        while self.flush():
+            pass
+
+    def _open(self):
+        connection = self.connection_factory(fail_silently=False)
+        connection.open()
+        self.stats['connections'] += 1
+        return connection
+
+    def _fail(self, queued, error, retry):
+        queued.error = str(error)
+        if queued.attempts < self.max_attempts:
+            retry.append(queued)
+        else:
+            queued.status = 'failed'
+            self.stats['failed'] += 1
+            queued.done.set()
+
+    def _send(self, batch):
+        retry = []
+        connection = None
+        try:
+            for index, queued in enumerate(batch):
+                queued.attempts += 1
+                try:
+                    if connection is None:
+                        connection = self._open()
+                except Exception as e:
+                    # no connection at all: the whole rest of the batch
+                    # waits for the next flush
+                    for rest in batch[index + 1:]:
+                        rest.attempts += 1
+                    for rest in batch[index:]:
+                        self._fail(rest, e, retry)
+                    break
+                try:
+                    # one message per call, so a refused recipient only
+                    # fails its own message
+                    connection.send_messages([queued.message])
+                except Exception as e:
+                    self._fail(queued, e, retry)
+                    # the connection may be broken; open a fresh one
+                    connection.close()
+                    connection = None
+                else:
+                    queued.status = 'sent'
+                    self.stats['sent'] += 1
+                    queued.done.set()
+        finally:
+            if connection is not None:
+                connection.close()
+        if retry:
+            now = time.monotonic()
+            for queued in retry:
+                # the retry waits for the next interval
+                queued.queued_at = now
+            self.stats['retried'] += len(retry)
+            with self._cond:
+                self.pending.extend(retry)
+                self._cond.notify()
+
+
+_batcher = None
+_batcher_lock = threading.Lock()
+
+
+def get_email_batcher():
+    global _batcher
+    with _batcher_lock:
+        if _batcher is None:
+            _batcher = EmailBatcher(
+                batch_size=getattr(settings, 'EMAIL_BATCH_SIZE', 50),
+                interval=getattr(settings, 'EMAIL_BATCH_INTERVAL', 5.0),
+                max_attempts=getattr(settings, 'EMAIL_MAX_ATTEMPTS', 3))
+            # whatever is still queued goes out before the process exits
+            atexit.register(_batcher.close)
+        return _batcher
@@ -0,0 +1,157 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Address, Item, OrderTemplate
+from .patterns.prototype import OrderPrototype, OrderTemplateManager
+
+TEMPLATE_VERSION_KEY = 'order_template:version:{name}'
+# Bounds how long a lost cache update can leave a stale version behind.
+TEMPLATE_VERSION_TIMEOUT = 5 * 60
+# Cached for a deleted or missing template; real versions are clock times.
+DELETED = 0
+
+
+def version_key(name):
+    # template names may contain spaces, which memcached keys may not
+    return TEMPLATE_VERSION_KEY.format(name=quote(name))
+
+
+def serialize_prototype(prototype):
+    # ids only; the prototype's lines are {'item': Item, 'quantity': n}
+    return json.dumps({
+        'shipping_address': getattr(prototype.shipping_address, 'pk', None),
+        'billing_address': getattr(prototype.billing_address, 'pk', None),
+        'items': [[line['item'].pk, line['quantity']]
+                  for line in prototype.items],
+        'preferences': dict(prototype.preferences),
+    }, separators=(',', ':'))
+
+
+def load_prototype(template):
+    data = json.loads(template.payload)
+    addresses = Address.objects.in_bulk(
+        {data['shipping_address'], data['billing_address']} - {None})
+    items = Item.objects.in_bulk([item_id for item_id, _ in data['items']])
+    prototype = OrderPrototype(
+        user=template.user,
+        # items deleted since the template was saved are left out
+        items=[{'item': items[item_id], 'quantity': quantity}
+               for item_id, quantity in data['items'] if item_id in items],
+        shipping_address=addresses.get(data['shipping_address']),
+        billing_address=addresses.get(data['billing_address'])
+    )
+    prototype.preferences.update(data['preferences'])
+    return prototype
+
+
+class DatabaseTemplateStore(MutableMapping):
+    # Order templates saved in the database, with the most recently used
+    # ones kept in memory. Every save gets a new version, published in the
+    # shared cache once committed; a worker reuses its in-memory copy while
+    # the version matches, so a lookup in steady state is one cache read.
+
+    def __init__(self, max_size=None):
+        if max_size is None:
+            max_size = getattr(settings, 'ORDER_TEMPLATE_CACHE_SIZE', 256)
+        self.max_size = max_size
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _version(self, name):
+        key = version_key(name)
+        version = cache.get(key)
+        if version is None:
+            version = OrderTemplate.objects.filter(name=name).values_list(
+                'version', flat=True).first() or DELETED
+            # add(), so a version read before a concurrent save or delete
+            # committed cannot replace the one that save or delete wrote
+            cache.add(key, version, TEMPLATE_VERSION_TIMEOUT)
+        return version or None
+
+    def _remember(self, name, version, prototype):
+        with self._lock:
+            self._lru[name] = (version, prototype)
+            self._lru.move_to_end(name)
+            while len(self._lru) > self.max_size:
+                self._lru.popitem(last=False)
+
+    def __getitem__(self, name):
+        version = self._version(name)
+        if version is None:
+            with self._lock:
+                self._lru.pop(name, None)
+            raise KeyError(name)
+        with self._lock:
+            entry = self._lru.get(name)
+            if entry is not None and entry[0] == version:
+                self._lru.move_to_end(name)
+                return entry[1]
+        try:
+            template = OrderTemplate.objects.select_related('user').get(
+                name=name)
+        except OrderTemplate.DoesNotExist:
+            raise KeyError(name)
+        prototype = load_prototype(template)
+        self._remember(name, template.version, prototype)
+        return prototype
+
+    def __contains__(self, name):
+        try:
+            self[name]
+        except KeyError:
+            return False
+        return True
+
+    @transaction.atomic
+    def __setitem__(self, name, prototype):
+        # clock-based, so a deleted and re-created template never gets a
+        # version another worker still has in memory
+        version = time.time_ns()
+        OrderTemplate.objects.update_or_create(name=name, defaults={
+            'user': prototype.user,
+            'payload': serialize_prototype(prototype),
+            'version': version,
+        })
+        # a copy, so later changes to the caller's prototype stay out
+        self._remember(name, version, prototype.clone())
+        transaction.on_commit(lambda: cache.set(
+            version_key(name), version, TEMPLATE_VERSION_TIMEOUT))
+
+    @transaction.atomic
+    def __delitem__(self, name):
+        deleted, _ = OrderTemplate.objects.filter(name=name).delete()
+        with self._lock:
+            self._lru.pop(name, None)
+        if not deleted:
+            raise KeyError(name)
+        # a tombstone rather than a delete, so a worker that read the old
+        # version before this commit cannot add it back
+        transaction.on_commit(lambda: cache.set(
+            version_key(name), DELETED, TEMPLATE_VERSION_TIMEOUT))
+
+    def __iter__(self):
+        return iter(OrderTemplate.objects.order_by('name').values_list(
+            'name', flat=True))
+
+    def __len__(self):
+        return OrderTemplate.objects.count()
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_template_manager():
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = OrderTemplateManager(DatabaseTemplateStore())
+        return _manager
@@ -0,0 +1,130 @@
+import base64
+import binascii
+import json
+
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.paginator import InvalidPage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+
+class KeysetPage:
+
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    @property
+    def next_cursor(self):
+        if self._has_next:
+            return self.paginator.encode_cursor(self.object_list[-1])
+
+    @property
+    def previous_cursor(self):
+        if self._has_previous:
+            return self.paginator.encode_cursor(self.object_list[0])
+
+
+# Seek pagination: pages are addressed by the ordering values of their
+# first or last row instead of an OFFSET, so each page is an index range
+# scan and stays stable while new rows are inserted.
+class KeysetPaginator:
+
+    def __init__(self, queryset, per_page, ordering=('pk',),
+                 count_cache_key=None, count_timeout=300):
+        if ordering[-1].lstrip('-') not in ('pk', 'id'):
+            ordering = tuple(ordering) + ('pk',)
+        self.queryset = queryset
+        self.per_page = per_page
+        self.ordering = tuple(ordering)
+        self.count_cache_key = count_cache_key
+        self.count_timeout = count_timeout
+
+    @cached_property
+    def count(self):
+        if self.count_cache_key is None:
+            return self.queryset.count()
+        return cache.get_or_set(
+            self.count_cache_key, self.queryset.count, self.count_timeout)
+
+    def encode_cursor(self, obj):
+        values = [getattr(obj, field.lstrip('-')) for field in self.ordering]
+        return base64.urlsafe_b64encode(
+            json.dumps(values, cls=DjangoJSONEncoder).encode()).decode()
+
+    def decode_cursor(self, cursor):
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        except (binascii.Error, UnicodeError, ValueError):
+            raise InvalidPage("Invalid cursor")
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise InvalidPage("Invalid cursor")
+        # back to the fields' own types, so a forged cursor cannot reach
+        # the database as a value of the wrong type
+        opts = self.queryset.model._meta
+        try:
+            values = [
+                (opts.pk if name in ('pk', 'id') else opts.get_field(name))
+                .to_python(value)
+                for name, value in zip(
+                    (field.lstrip('-') for field in self.ordering), values)
+            ]
+        except (ValidationError, ValueError, TypeError):
+            raise InvalidPage("Invalid cursor")
+        if None in values:
+            raise InvalidPage("Invalid cursor")
+        return values
+
+    def _seek(self, values, reverse):
+        # (a, b) > (x, y)  ==  a > x OR (a = x AND b > y), honouring the
+        # direction of each ordering field.
+        condition = Q()
+        equal = {}
+        for field, value in zip(self.ordering, values):
+            name = field.lstrip('-')
+            descending = field.startswith('-') != reverse
+            lookup = 'lt' if descending else 'gt'
+            condition |= Q(**equal, **{f'{name}__{lookup}': value})
+            equal[name] = value
+        return condition
+
+    def page(self, after=None, before=None):
+        if before:
+            reversed_ordering = [
+                field[1:] if field.startswith('-') else f'-{field}'
+                for field in self.ordering
+            ]
+            queryset = self.queryset.filter(
+                self._seek(self.decode_cursor(before), reverse=True)
+            ).order_by(*reversed_ordering)
+            rows = list(queryset[:self.per_page + 1])
+            has_previous = len(rows) > self.per_page
+            rows = rows[:self.per_page][::-1]
+            return KeysetPage(rows, self, True, has_previous)
+
+        queryset = self.queryset.order_by(*self.ordering)
+        if after:
+            queryset = queryset.filter(
+                self._seek(self.decode_cursor(after), reverse=False))
+        rows = list(queryset[:self.per_page + 1])
+        has_next = len(rows) > self.per_page
+        return KeysetPage(rows[:self.per_page], self, has_next, bool(after))
@@ -1,9 +1,77 @@
+import copy
+import threading
+import time
 from abc import ABC, abstractmethod
+from concurrent.futures import (
+    FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+)
+from itertools import islice
 from decimal import Decimal
-from django.core.mail import send_mail
+from django.core.mail import EmailMessage, send_mail
 from django.conf import settings
+from django.db import close_old_connections
 import stripe
 
+from core.shipping import get_rate_table
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    # One pool per process, shared by all OrderProcessors.
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'ORDER_PROCESSOR_THREADS', 8),
+                thread_name_prefix='order-processor')
+        return _executor
+
+
+def _timed(func, *args):
+    started = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - started
+
+
+def _chunked_ids(orders, size):
+    if hasattr(orders, 'values_list'):
+        ids = orders.values_list('pk', flat=True).iterator(chunk_size=size)
+    else:
+        ids = (getattr(order, 'pk', order) for order in orders)
+    while True:
+        chunk = list(islice(ids, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class RateLimiter:
+    # Spaces calls at least 1/rate seconds apart, across threads.
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def _pooled(func, *args):
+    try:
+        return _timed(func, *args)
+    finally:
+        # pool threads hold their own database connections
+        close_old_connections()
+
 
 class PaymentProcessor(ABC):
     
@@ -23,7 +91,7 @@ class PaymentProcessor(ABC):
 class ShippingMethod(ABC):
     
     @abstractmethod
-    def calculate_cost(self, weight=None, distance=None):
+    def calculate_cost(self, weight=None, distance=None, country=None):
         pass
     
     @abstractmethod
@@ -78,10 +146,24 @@ class StripePaymentProcessor(PaymentProcessor):
         return "Stripe"
 
 
-class StandardShipping(ShippingMethod):
+class RateTableShipping(ShippingMethod):
+    # Priced from the zone and weight tables in core.shipping.
     
-    def calculate_cost(self, weight=None, distance=None):
-        return Decimal('0.00')
+    rate_code = None
+    
+    def calculate_cost(self, weight=None, distance=None, country=None):
+        return get_rate_table().quote(self.rate_code, country, weight)
+    
+    def quote_many(self, shipments):
+        # shipments: iterable of (country, weight)
+        return get_rate_table().quote_many(
+            (self.rate_code, country, weight)
+            for country, weight in shipments)
+
+
+class StandardShipping(RateTableShipping):
+    
+    rate_code = 'standard'
     
     def get_delivery_time(self):
         return "5-7 business days"
@@ -90,12 +172,17 @@ class StandardShipping(ShippingMethod):
         return "Standard Shipping"
 
 
+def order_confirmation_text(order):
+    subject = f"Order Confirmation - {order.ref_code}"
+    message = f"Thank you for your order.\n\nOrder Reference: {order.ref_code}\nTotal: ${order.get_total()}"
+    return subject, message
+
+
 class EmailNotificationService(NotificationService):
     
     def send_order_confirmation(self, order, recipient):
         try:
-            subject = f"Order Confirmation - {order.ref_code}"
-            message = f"Thank you for your order.\n\nOrder Reference: {order.ref_code}\nTotal: ${order.get_total()}"
+            subject, message = order_confirmation_text(order)
             
             send_mail(subject, message, settings.DEFAULT_FROM_EMAIL, [recipient], fail_silently=False)
             return {'success': True, 'method': 'email'}
@@ -103,6 +190,39 @@ class EmailNotificationService(NotificationService):
             return {'success': False, 'error': str(e)}
 
 
+class BatchedEmailNotificationService(NotificationService):
+    
+    def __init__(self, batcher=None):
+        from core.notifications import get_email_batcher
+
+        self.batcher = batcher or get_email_batcher()
+    
+    def send_order_confirmation(self, order, recipient):
+        # Sent with the next batch over a shared SMTP connection; the
+        # returned result only says the message was accepted.
+        try:
+            subject, message = order_confirmation_text(order)
+            queued = self.batcher.add(EmailMessage(
+                subject, message, settings.DEFAULT_FROM_EMAIL, [recipient]))
+            return {'success': True, 'method': 'email', 'queued': True,
+                    'message': queued}
+        except Exception as e:
+            return {'success': False, 'error': str(e)}
+
+
+class QueuedEmailNotificationService(NotificationService):
+    
+    def send_order_confirmation(self, order, recipient):
+        # run_worker sends the email, with retries, after checkout returns
+        from core.jobs import enqueue
+        from core.tasks import send_order_confirmation
+
+        job = enqueue(send_order_confirmation, order_id=order.pk,
+                      recipient=recipient)
+        return {'success': True, 'method': 'email', 'queued': True,
+                'job_id': job.pk}
+
+
 class PayPalPaymentProcessor(PaymentProcessor):
     
     def process_payment(self, amount, currency="USD", token=None):
@@ -122,13 +242,9 @@ class PayPalPaymentProcessor(PaymentProcessor):
         return "PayPal"
 
 
-class ExpressShipping(ShippingMethod):
+class ExpressShipping(RateTableShipping):
     
-    def calculate_cost(self, weight=None, distance=None):
-        base = Decimal('15.00')
-        if weight:
-            base += Decimal(str(weight)) * Decimal('1.00')
-        return base
+    rate_code = 'express'
     
     def get_delivery_time(self):
         return "1-2 business days"
@@ -161,7 +277,7 @@ class StandardOrderFactory(OrderProcessingFactory):
         return StandardShipping()
     
     def create_notification_service(self):
-        return EmailNotificationService()
+        return BatchedEmailNotificationService()
 
 
 class PremiumOrderFactory(OrderProcessingFactory):
@@ -173,15 +289,20 @@ class PremiumOrderFactory(OrderProcessingFactory):
         return ExpressShipping()
     
     def create_notification_service(self):
-        return EmailNotificationService()
+        return BatchedEmailNotificationService()
 
 
 class OrderProcessor:
     
-    def __init__(self, factory):
+    RATE_LIMIT_RETRIES = 3
+    RATE_LIMIT_BACKOFF = 1.0
+    
+    def __init__(self, factory, rate_limit=None):
         self.payment = factory.create_payment_processor()
         self.shipping = factory.create_shipping_method()
         self.notification = factory.create_notification_service()
+        # payment calls per second over all threads, e.g. Stripe's limit
+        self.rate_limiter = RateLimiter(rate_limit) if rate_limit else None
     
     def process_order(self, order, payment_token, user_email):
         payment_result = self.payment.process_payment(
@@ -207,11 +328,112 @@ class OrderProcessor:
             'notification': notification_result
         }
 
+    def process_order_concurrently(self, order, payment_token, user_email,
+                                   defer_notification=False):
+        timings = {}
+        started = time.perf_counter()
+        total = order.get_total()
+        notified_order = order
+        if not hasattr(order, 'total'):
+            # the notification thread reuses it instead of querying again;
+            # a copy, so the caller's order is left as it was
+            notified_order = copy.copy(order)
+            notified_order.total = total
+        payment_result = self.payment.process_payment(
+            amount=total,
+            token=payment_token
+        )
+        timings['payment'] = time.perf_counter() - started
+
+        if not payment_result['success']:
+            timings['total'] = time.perf_counter() - started
+            return {'success': False,
+                    'error': payment_result.get('error', 'Payment failed'),
+                    'timings': timings}
+
+        # The email goes out on the pool while shipping is quoted here.
+        notification = get_executor().submit(
+            _pooled, self.notification.send_order_confirmation,
+            notified_order, user_email)
+        (shipping_cost, delivery_time), timings['shipping'] = _timed(
+            lambda: (self.shipping.calculate_cost(),
+                     self.shipping.get_delivery_time()))
+        if defer_notification:
+            notification_result = {'success': True, 'deferred': True}
+        else:
+            notification_result, timings['notification'] = (
+                notification.result())
+        timings['total'] = time.perf_counter() - started
+
+        return {
+            'success': True,
+            'payment': payment_result,
+            'shipping': {
+                'cost': str(shipping_cost),
+                'delivery_time': delivery_time,
+                'method': self.shipping.get_method_name()
+            },
+            'notification': notification_result,
+            'timings': timings
+        }
+
+    def _process_one(self, order, payment_token):
+        result = None
+        for attempt in range(self.RATE_LIMIT_RETRIES + 1):
+            if self.rate_limiter is not None:
+                self.rate_limiter.wait()
+            try:
+                result = self.process_order(order, payment_token,
+                                            order.user.email)
+                break
+            except stripe.error.RateLimitError as e:
+                result = {'success': False, 'error': str(e)}
+                if attempt < self.RATE_LIMIT_RETRIES:
+                    time.sleep(self.RATE_LIMIT_BACKOFF * 2 ** attempt)
+            except Exception as e:
+                # one bad order must not stop the batch
+                result = {'success': False, 'error': str(e)}
+                break
+        result['order_id'] = order.pk
+        return result
+
+    def process_orders(self, orders, tokens=None, max_workers=8,
+                       chunk_size=500):
+        # Yields one result per order, in completion order. Orders are
+        # loaded chunk_size at a time and at most 2 * max_workers are in
+        # flight, so memory stays flat however many orders there are.
+        from core.models import Order
+
+        tokens = tokens or {}
+        executor = ThreadPoolExecutor(max_workers=max_workers,
+                                      thread_name_prefix='order-batch')
+        pending = set()
+        try:
+            for chunk in _chunked_ids(orders, chunk_size):
+                # totals, users and coupons of the chunk in one query
+                batch = Order.objects.with_totals().select_related(
+                    'user', 'coupon').filter(pk__in=chunk).order_by('pk')
+                for order in batch:
+                    if len(pending) >= 2 * max_workers:
+                        done, pending = wait(pending,
+                                             return_when=FIRST_COMPLETED)
+                        for future in done:
+                            yield future.result()[0]
+                    pending.add(executor.submit(
+                        _pooled, self._process_one, order,
+                        tokens.get(order.pk)))
+            for future in as_completed(pending):
+                yield future.result()[0]
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
 
 __all__ = [
     'PaymentProcessor', 'ShippingMethod', 'NotificationService',
+    'RateTableShipping',
     'StripePaymentProcessor', 'PayPalPaymentProcessor',
     'StandardShipping', 'ExpressShipping', 'EmailNotificationService',
+    'BatchedEmailNotificationService', 'QueuedEmailNotificationService',
     'OrderProcessingFactory', 'StandardOrderFactory', 'PremiumOrderFactory',
-    'OrderProcessor'
+    'OrderProcessor', 'RateLimiter'
 ]
\ No newline at end of file
@@ -1,7 +1,88 @@
 import copy
+from collections.abc import MutableMapping, MutableSequence
+
 from django.utils import timezone
 
 
+class CopyOnWriteList(MutableSequence):
+    # Shares a template's line items until the first change. Lines are
+    # copied one by one as they are read, so editing a line in place
+    # cannot reach the template either.
+
+    def __init__(self, source):
+        self._source = source
+        self._lines = None
+        self._read = {}
+
+    def _own(self):
+        if self._lines is None:
+            self._lines = [self._read[i] if i in self._read
+                           else copy.copy(line)
+                           for i, line in enumerate(self._source)]
+            self._source = self._read = None
+        return self._lines
+
+    def __getitem__(self, index):
+        if self._lines is not None or not isinstance(index, int):
+            return self._own()[index]
+        index = range(len(self._source))[index]
+        if index not in self._read:
+            self._read[index] = copy.copy(self._source[index])
+        return self._read[index]
+
+    def __len__(self):
+        if self._lines is None:
+            return len(self._source)
+        return len(self._lines)
+
+    def __setitem__(self, index, line):
+        self._own()[index] = line
+
+    def __delitem__(self, index):
+        del self._own()[index]
+
+    def insert(self, index, line):
+        self._own().insert(index, line)
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def __repr__(self):
+        return repr(list(self))
+
+
+class CopyOnWriteDict(MutableMapping):
+    # Shares a template's preferences until the first change
+
+    def __init__(self, source):
+        self._source = source
+        self._own = False
+
+    def _write(self):
+        if not self._own:
+            self._source = dict(self._source)
+            self._own = True
+        return self._source
+
+    def __getitem__(self, key):
+        return self._source[key]
+
+    def __setitem__(self, key, value):
+        self._write()[key] = value
+
+    def __delitem__(self, key):
+        del self._write()[key]
+
+    def __iter__(self):
+        return iter(self._source)
+
+    def __len__(self):
+        return len(self._source)
+
+    def __repr__(self):
+        return repr(self._source)
+
+
 class OrderPrototype:
     
     def __init__(self, user, items, shipping_address, billing_address=None):
@@ -15,7 +96,7 @@ class OrderPrototype:
     @classmethod
     def from_order(cls, order):
         items = []
-        for order_item in order.items.all():
+        for order_item in order.items.select_related('item'):
             items.append({'item': order_item.item, 'quantity': order_item.quantity})
         
         prototype = cls(
@@ -30,8 +111,25 @@ class OrderPrototype:
         
         return prototype
     
-    def clone(self):
-        cloned = copy.deepcopy(self)
+    def __deepcopy__(self, memo):
+        # The user, addresses and items are model instances the clone only
+        # refers to; copying them would copy their whole state and caches.
+        # Only the line items and preferences belong to the prototype.
+        cloned = copy.copy(self)
+        cloned.items = [copy.copy(line) for line in self.items]
+        cloned.preferences = copy.deepcopy(dict(self.preferences), memo)
+        return cloned
+    
+    def clone(self, lazy=False):
+        # lazy: the line items and preferences are copied on first use. The
+        # clone reads the template until then, so templates are replaced
+        # (update_template) rather than edited in place.
+        if lazy:
+            cloned = copy.copy(self)
+            cloned.items = CopyOnWriteList(self.items)
+            cloned.preferences = CopyOnWriteDict(self.preferences)
+        else:
+            cloned = copy.deepcopy(self)
         cloned.created_at = timezone.now()
         return cloned
     
@@ -53,16 +151,21 @@ class OrderPrototype:
 
 class OrderTemplateManager:
     
-    def __init__(self):
-        self.templates = {}
+    def __init__(self, templates=None):
+        # any mapping of name to prototype, e.g.
+        # core.order_templates.DatabaseTemplateStore
+        self.templates = {} if templates is None else templates
     
     def register_template(self, name, prototype):
         self.templates[name] = prototype
     
-    def create_order(self, template_name):
-        if template_name not in self.templates:
+    def create_order(self, template_name, lazy=False):
+        # one lookup; a database store checks the version on each
+        try:
+            template = self.templates[template_name]
+        except KeyError:
             raise ValueError(f"Template '{template_name}' not found")
-        return self.templates[template_name].clone()
+        return template.clone(lazy=lazy)
     
     def update_template(self, template_name, prototype):
         if template_name not in self.templates:
@@ -129,10 +232,30 @@ class ReorderService:
         cloned = prototype.clone()
         return cloned.to_dict()
     
+    @staticmethod
+    def reorder_many(orders):
+        # Puts the items of past orders back into their owners' open carts.
+        # Lines are loaded for all orders at once and written per user in
+        # bulk, so the query count does not grow with the number of lines.
+        # Returns {user id: number of distinct items added}.
+        from django.db.models import prefetch_related_objects
+        from core.cart import add_items
+        
+        orders = list(orders)
+        prefetch_related_objects(orders, 'user', 'items')
+        carts = {}
+        for order in orders:
+            user, quantities = carts.setdefault(order.user_id, (order.user, {}))
+            for order_item in order.items.all():
+                quantities[order_item.item_id] = (
+                    quantities.get(order_item.item_id, 0) + order_item.quantity)
+        return {user_id: add_items(user, quantities)
+                for user_id, (user, quantities) in carts.items()}
+    
     @staticmethod
     def save_as_template(order, template_name, user):
         prototype = OrderPrototype.from_order(order)
         return prototype
 
 
-__all__ = ['OrderPrototype', 'OrderTemplateManager', 'ItemPrototype', 'ReorderService']
\ No newline at end of file
+__all__ = ['CopyOnWriteList', 'CopyOnWriteDict', 'OrderPrototype', 'OrderTemplateManager', 'ItemPrototype', 'ReorderService']
\ No newline at end of file
@@ -0,0 +1,72 @@
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+
+from .models import Item
+
+PRODUCT_SLUG_KEY = 'product:slug:{slug}'
+PRODUCT_HTML_KEY = 'product:html:{pk}:{version}'
+PRODUCT_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def get_item_version(item):
+    return int(item.updated_at.timestamp() * 1000000)
+
+
+def get_product_html(slug):
+    pointer = cache.get(PRODUCT_SLUG_KEY.format(slug=slug))
+    if pointer is None:
+        return None
+    pk, version = pointer
+    return cache.get(PRODUCT_HTML_KEY.format(pk=pk, version=version))
+
+
+def set_product_html(item, html):
+    version = get_item_version(item)
+    pointer_key = PRODUCT_SLUG_KEY.format(slug=item.slug)
+    # add() rather than set(): a render that loaded the item before a
+    # concurrent save must not move the pointer back to the old version.
+    cache.add(pointer_key, (item.pk, version), PRODUCT_CACHE_TIMEOUT)
+    if cache.get(pointer_key) == (item.pk, version):
+        cache.set(PRODUCT_HTML_KEY.format(pk=item.pk, version=version),
+                  html, PRODUCT_CACHE_TIMEOUT)
+
+
+# The cache is shared by all workers (see CACHES), so the changes below
+# reach every process. They are made once the transaction commits: a
+# render in another worker that still reads the old row must not be able
+# to store a pointer to it after the invalidation.
+
+
+def invalidate_products(slugs):
+    # For bulk updates, which skip the signals below; the next render
+    # stores a pointer to the new version.
+    keys = [PRODUCT_SLUG_KEY.format(slug=slug) for slug in slugs]
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def item_pre_save_receiver(sender, instance, *args, **kwargs):
+    if instance.pk is None:
+        return
+    old_slug = Item.objects.filter(pk=instance.pk).values_list(
+        'slug', flat=True).first()
+    if old_slug is not None and old_slug != instance.slug:
+        key = PRODUCT_SLUG_KEY.format(slug=old_slug)
+        transaction.on_commit(lambda: cache.delete(key))
+
+
+def item_post_save_receiver(sender, instance, *args, **kwargs):
+    key = PRODUCT_SLUG_KEY.format(slug=instance.slug)
+    pointer = (instance.pk, get_item_version(instance))
+    transaction.on_commit(
+        lambda: cache.set(key, pointer, PRODUCT_CACHE_TIMEOUT))
+
+
+def item_post_delete_receiver(sender, instance, *args, **kwargs):
+    key = PRODUCT_SLUG_KEY.format(slug=instance.slug)
+    transaction.on_commit(lambda: cache.delete(key))
+
+
+pre_save.connect(item_pre_save_receiver, sender=Item)
+post_save.connect(item_post_save_receiver, sender=Item)
+post_delete.connect(item_post_delete_receiver, sender=Item)
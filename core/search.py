@@ -0,0 +1,286 @@
+import heapq
+import math
+import mmap
+import os
+import re
+import struct
+from array import array
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from operator import itemgetter
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+from . import snapshots
+from .models import CATEGORY_CHOICES, Item
+from .snapshots import JournaledIndex, get_index, rebuild_snapshot
+
+FIELD_WEIGHTS = {
+    'title': 3.0,
+    'category': 2.0,
+    'description': 1.0,
+}
+
+INDEX_FILENAME = 'items.idx'
+JOURNAL_FILENAME = 'items.journal'
+
+# Snapshot layout: header, fixed-size term records sorted by term (so a
+# lookup is a binary search over the mmap), the term bytes, then for each
+# term its ascending doc ids (uint32), their weights (float32) and the
+# positions of those postings by descending weight (uint32).
+MAGIC = b'CSIX'
+VERSION = 2
+HEADER = struct.Struct('<4sIII')
+TERM = struct.Struct('<IIQI')
+
+STOP_WORDS = frozenset(
+    'a an and are as at be by for from in is it of on or the to with'.split())
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+CATEGORY_LABELS = dict(CATEGORY_CHOICES)
+
+
+def stem(word):
+    if len(word) <= 3:
+        return word
+    if word.endswith('sses'):
+        return word[:-2]
+    if word.endswith('ies'):
+        return word[:-3] + 'y'
+    for suffix in ('ing', 'ed'):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            return word[:-len(suffix)]
+    if word.endswith('s') and not word.endswith('ss'):
+        return word[:-1]
+    return word
+
+
+def tokenize(text):
+    return [stem(token) for token in TOKEN_RE.findall(text.lower())
+            if token not in STOP_WORDS]
+
+
+def weigh_document(fields):
+    weights = defaultdict(float)
+    for name, text in fields.items():
+        for term, tf in Counter(tokenize(text or '')).items():
+            weights[term] += FIELD_WEIGHTS[name] * (1 + math.log(tf))
+    return dict(weights)
+
+
+def item_fields(title, category, description):
+    return {
+        'title': title,
+        'category': CATEGORY_LABELS.get(category, category),
+        'description': description,
+    }
+
+
+def write_index(path, documents):
+    postings = defaultdict(lambda: (array('I'), array('f')))
+    n_docs = 0
+    for doc_id, weights in documents:
+        n_docs += 1
+        for term, weight in weights.items():
+            ids, term_weights = postings[term]
+            ids.append(doc_id)
+            term_weights.append(weight)
+
+    terms = sorted(postings, key=str.encode)
+    encoded = [term.encode() for term in terms]
+    terms_start = HEADER.size + len(terms) * TERM.size
+    postings_start = terms_start + sum(len(term) for term in encoded)
+    postings_start += -postings_start % 4
+
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, n_docs, len(terms)))
+        term_offset, postings_offset = 0, postings_start
+        for term, key in zip(terms, encoded):
+            df = len(postings[term][0])
+            f.write(TERM.pack(term_offset, len(key), postings_offset, df))
+            term_offset += len(key)
+            postings_offset += 12 * df
+        f.write(b''.join(encoded))
+        f.write(b'\0' * (postings_start - f.tell()))
+        for term in terms:
+            ids, weights = postings.pop(term)
+            by_id = sorted(range(len(ids)), key=ids.__getitem__)
+            by_weight = sorted(range(len(ids)),
+                               key=lambda i: weights[by_id[i]], reverse=True)
+            f.write(array('I', (ids[i] for i in by_id)).tobytes())
+            f.write(array('f', (weights[i] for i in by_id)).tobytes())
+            f.write(array('I', by_weight).tobytes())
+    os.replace(tmp_path, path)
+    return n_docs
+
+
+class IndexReader:
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.n_docs, self.n_terms = HEADER.unpack_from(
+            self._mmap, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a search index snapshot")
+        self._terms_start = HEADER.size + self.n_terms * TERM.size
+        self._view = memoryview(self._mmap)
+
+    def postings(self, term):
+        key = term.encode()
+        lo, hi = 0, self.n_terms
+        while lo < hi:
+            mid = (lo + hi) // 2
+            term_offset, length, offset, df = TERM.unpack_from(
+                self._mmap, HEADER.size + mid * TERM.size)
+            start = self._terms_start + term_offset
+            candidate = self._mmap[start:start + length]
+            if candidate < key:
+                lo = mid + 1
+            elif candidate > key:
+                hi = mid
+            else:
+                ids = self._view[offset:offset + 4 * df].cast('I')
+                weights = self._view[offset + 4 * df:offset + 8 * df].cast('f')
+                ranked = self._view[offset + 8 * df:offset + 12 * df].cast('I')
+                return ids, weights, ranked
+        return (), (), ()
+
+
+class SearchIndex(JournaledIndex):
+    index_filename = INDEX_FILENAME
+    journal_filename = JOURNAL_FILENAME
+    reader_class = IndexReader
+
+    def search(self, query, offset=0, limit=10):
+        terms = list(dict.fromkeys(tokenize(query)))
+        reader, overlay = self.open()
+        if not terms or (reader is None and not overlay):
+            return 0, []
+
+        n_docs = (reader.n_docs if reader else 0) + len(overlay)
+        scored = []
+        for term in terms:
+            if reader:
+                ids, weights, ranked = reader.postings(term)
+            else:
+                ids, weights, ranked = (), (), ()
+            overlay_hits = [(doc_id, doc_terms[term])
+                            for doc_id, doc_terms in overlay.items()
+                            if doc_terms and term in doc_terms]
+            df = len(ids) + len(overlay_hits)
+            if df:
+                scored.append((math.log(1 + n_docs / df), ids, weights, ranked,
+                               overlay_hits))
+        if not scored:
+            return 0, []
+
+        # Every list but the longest is scanned. Documents found there look
+        # up their weight in the longest list by binary search; documents
+        # found only in the longest list score in its weight order, so just
+        # enough of its top postings are read to fill the page.
+        scored.sort(key=lambda entry: len(entry[1]))
+        *rest, (idf, ids, weights, ranked, overlay_hits) = scored
+
+        scores = defaultdict(float)
+        for term_idf, term_ids, term_weights, _, term_hits in rest:
+            for doc_id, weight in zip(term_ids, term_weights):
+                if doc_id not in overlay:
+                    scores[doc_id] += weight * term_idf
+            for doc_id, weight in term_hits:
+                scores[doc_id] += weight * term_idf
+
+        found = 0
+        for doc_id in scores:
+            if doc_id not in overlay:
+                i = bisect_left(ids, doc_id)
+                if i < len(ids) and ids[i] == doc_id:
+                    scores[doc_id] += weights[i] * idf
+                    found += 1
+        for doc_id in overlay:
+            i = bisect_left(ids, doc_id)
+            if i < len(ids) and ids[i] == doc_id:
+                found += 1
+        for doc_id, weight in overlay_hits:
+            scores[doc_id] += weight * idf
+        total = len(scores) + len(ids) - found
+
+        wanted = offset + limit
+        only_longest = {}
+        for i in ranked:
+            if len(only_longest) >= wanted:
+                break
+            doc_id = ids[i]
+            if doc_id not in scores and doc_id not in overlay:
+                only_longest[doc_id] = weights[i] * idf
+        scores.update(only_longest)
+
+        top = heapq.nlargest(wanted, scores.items(), key=itemgetter(1))
+        return total, [doc_id for doc_id, score in top[offset:]]
+
+
+def get_search_index():
+    return get_index(SearchIndex)
+
+
+def append_to_journal(doc_id, terms):
+    snapshots.append_to_journal(SearchIndex, doc_id, terms)
+
+
+def rebuild_index(directory, batch_size=2000):
+    rows = Item.objects.order_by().values_list(
+        'pk', 'title', 'category', 'description').iterator(chunk_size=batch_size)
+    return rebuild_snapshot(SearchIndex, directory, lambda path: write_index(
+        path,
+        ((pk, weigh_document(item_fields(title, category, description)))
+         for pk, title, category, description in rows)
+    ))
+
+
+class SearchResults:
+
+    def __init__(self, query, queryset):
+        self.query = query
+        self.queryset = queryset
+        self.index = get_search_index()
+        self._count = None
+
+    def _search(self, offset, limit):
+        if self.index is None:
+            return 0, []
+        total, ids = self.index.search(self.query, offset, limit)
+        self._count = total
+        return total, ids
+
+    def __len__(self):
+        if self._count is None:
+            self._search(0, 0)
+        return self._count
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            return self[key:key + 1][0]
+        start = key.start or 0
+        stop = len(self) if key.stop is None else key.stop
+        total, ids = self._search(start, max(stop - start, 0))
+        items = self.queryset.in_bulk(ids)
+        return [items[pk] for pk in ids if pk in items]
+
+
+# Journal lines are written once the transaction commits; every worker
+# replays them, so a rolled-back save must never get there.
+def item_post_save_receiver(sender, instance, *args, **kwargs):
+    pk, document = instance.pk, weigh_document(item_fields(
+        instance.title, instance.category, instance.description))
+    transaction.on_commit(lambda: append_to_journal(pk, document))
+
+
+def item_post_delete_receiver(sender, instance, *args, **kwargs):
+    pk = instance.pk
+    transaction.on_commit(lambda: append_to_journal(pk, None))
+
+
+post_save.connect(item_post_save_receiver, sender=Item)
+post_delete.connect(item_post_delete_receiver, sender=Item)
@@ -0,0 +1,166 @@
+import threading
+from array import array
+from bisect import bisect_left
+from decimal import Decimal
+from functools import lru_cache
+from math import ceil
+
+from django.conf import settings
+
+# Prices are in cents. A shipment falls in the first bracket whose upper
+# bound (kg) it does not exceed; above the last bracket every started kg
+# adds per_kg. Countries not listed in any zone are 'international', and
+# a shipment without a country is 'domestic'.
+DEFAULT_RATES = {
+    'brackets': [0, 1, 5, 10, 30],
+    'zones': {
+        'domestic': ['US'],
+        'north_america': ['CA', 'MX'],
+        'europe': ['AT', 'BE', 'CH', 'CZ', 'DE', 'DK', 'ES', 'FI', 'FR',
+                   'GB', 'IE', 'IT', 'NL', 'NO', 'PL', 'PT', 'SE', 'UA'],
+    },
+    'methods': {
+        'standard': {
+            'domestic': {'base': [0, 0, 0, 0, 0], 'per_kg': 0},
+            'north_america': {'base': [800, 900, 1200, 1800, 3000],
+                              'per_kg': 100},
+            'europe': {'base': [1200, 1400, 2000, 3000, 5000],
+                       'per_kg': 150},
+            'international': {'base': [1500, 1800, 2600, 4000, 7000],
+                              'per_kg': 200},
+        },
+        'express': {
+            'domestic': {'base': [1500, 1600, 2000, 2500, 4500],
+                         'per_kg': 100},
+            'north_america': {'base': [2500, 2800, 3500, 4500, 7500],
+                              'per_kg': 200},
+            'europe': {'base': [3500, 4000, 5000, 6500, 10000],
+                       'per_kg': 300},
+            'international': {'base': [4500, 5000, 6500, 8500, 13000],
+                              'per_kg': 400},
+        },
+    },
+}
+
+HOME_ZONE = 'domestic'
+OTHER_ZONE = 'international'
+
+
+def country_code(country):
+    # Address.country is a django_countries Country
+    return getattr(country, 'code', country) or None
+
+
+class RateTable:
+    # The rate tables flattened into arrays once, so pricing a shipment is
+    # a few index lookups.
+
+    def __init__(self, rates):
+        self.brackets = list(rates['brackets'])
+        self.methods = {name: i for i, name in enumerate(rates['methods'])}
+        zones = [HOME_ZONE] + [zone for zone in rates['zones']
+                               if zone != HOME_ZONE] + [OTHER_ZONE]
+        self.zones = {zone: i for i, zone in enumerate(zones)}
+        self.country_zones = {
+            country: self.zones[zone]
+            for zone, countries in rates['zones'].items()
+            for country in countries
+        }
+        n_brackets = len(self.brackets)
+        self.base = array('q', bytes(8 * len(self.methods) * len(zones)
+                                     * n_brackets))
+        self.per_kg = array('q', bytes(8 * len(self.methods) * len(zones)))
+        for method, m in self.methods.items():
+            missing = set(zones) - set(rates['methods'][method])
+            if missing:
+                raise ValueError(
+                    f"{method}: no rates for {', '.join(sorted(missing))}")
+            for zone, rate in rates['methods'][method].items():
+                row = m * len(zones) + self.zones[zone]
+                if len(rate['base']) != n_brackets:
+                    raise ValueError(
+                        f"{method}/{zone}: expected {n_brackets} prices")
+                self.base[row * n_brackets:(row + 1) * n_brackets] = array(
+                    'q', rate['base'])
+                self.per_kg[row] = rate['per_kg']
+        self.quote_bucket = lru_cache(maxsize=4096)(self._quote_bucket)
+
+    def method_index(self, method):
+        try:
+            return self.methods[method]
+        except KeyError:
+            raise ValueError(f"Unknown shipping method: {method}") from None
+
+    def zone_index(self, country):
+        if country is None:
+            return self.zones[HOME_ZONE]
+        return self.country_zones.get(country, self.zones[OTHER_ZONE])
+
+    def bucket(self, weight):
+        # (bracket index, started kg above the last bracket)
+        weight = float(weight or 0)
+        last = len(self.brackets) - 1
+        if weight > self.brackets[last]:
+            return last, ceil(weight - self.brackets[last])
+        return bisect_left(self.brackets, weight), 0
+
+    def _quote_bucket(self, method, zone, bracket, extra_kg):
+        row = method * len(self.zones) + zone
+        cents = (self.base[row * len(self.brackets) + bracket]
+                 + extra_kg * self.per_kg[row])
+        return Decimal(cents).scaleb(-2)
+
+    def quote(self, method, country=None, weight=None):
+        # For single quotes like the checkout page; memoized per zone and
+        # weight bucket.
+        return self.quote_bucket(self.method_index(method),
+                                 self.zone_index(country_code(country)),
+                                 *self.bucket(weight))
+
+    def quote_many(self, shipments):
+        # shipments: iterable of (method, country, weight). One pass with
+        # every lookup bound to a local; returns Decimals in input order.
+        rows = {(method, country): m * len(self.zones) + z
+                for method, m in self.methods.items()
+                for country, z in self.country_zones.items()}
+        other, home = self.zones[OTHER_ZONE], self.zones[HOME_ZONE]
+        n_zones, n_brackets = len(self.zones), len(self.brackets)
+        brackets, last = self.brackets, n_brackets - 1
+        top = brackets[last]
+        base, per_kg = self.base, self.per_kg
+        method_index = self.method_index
+        cents = array('q')
+        append = cents.append
+        for method, country, weight in shipments:
+            row = rows.get((method, country))
+            if row is None:
+                code = country_code(country)
+                zone = home if code is None else self.country_zones.get(
+                    code, other)
+                row = rows[method, country] = (method_index(method) * n_zones
+                                               + zone)
+            # weights may be strings or Decimals, as in quote()
+            weight = float(weight or 0)
+            if not weight:
+                append(base[row * n_brackets])
+            elif weight > top:
+                append(base[row * n_brackets + last]
+                       + ceil(weight - top) * per_kg[row])
+            else:
+                append(base[row * n_brackets + bisect_left(brackets, weight)])
+        # Decimals are built once per distinct price
+        prices = {value: Decimal(value).scaleb(-2) for value in set(cents)}
+        return [prices[value] for value in cents]
+
+
+_table = None
+_table_lock = threading.Lock()
+
+
+def get_rate_table():
+    global _table
+    with _table_lock:
+        if _table is None:
+            _table = RateTable(getattr(settings, 'SHIPPING_RATES',
+                                       DEFAULT_RATES))
+        return _table
@@ -0,0 +1,152 @@
+import fcntl
+import json
+import os
+import threading
+
+from django.conf import settings
+
+
+def get_index_directory():
+    return getattr(settings, 'SEARCH_INDEX_DIR', None)
+
+
+# A memory-mapped snapshot shared by every worker, plus an append-only
+# journal of changes made since the snapshot was built. Each worker replays
+# new journal lines before reading, so edits show up in every process
+# without rebuilding the snapshot.
+class JournaledIndex:
+    index_filename = None
+    journal_filename = None
+    reader_class = None
+
+    def __init__(self, directory):
+        self.index_path = os.path.join(directory, self.index_filename)
+        self.journal_path = os.path.join(directory, self.journal_filename)
+        self._reader = None
+        self._snapshot_key = None
+        self._journal_offset = 0
+        self._journal_ino = None
+        self._overlay = {}
+        self._lock = threading.Lock()
+
+    def open(self):
+        with self._lock:
+            self.refresh()
+            return self._reader, self._overlay
+
+    def refresh(self):
+        try:
+            stat = os.stat(self.index_path)
+            snapshot_key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            snapshot_key = None
+        if snapshot_key != self._snapshot_key:
+            self._reader = (self.reader_class(self.index_path)
+                            if snapshot_key else None)
+            self._snapshot_key = snapshot_key
+            self._reset_overlay()
+        self._replay_journal()
+
+    def _reset_overlay(self):
+        self._overlay = {}
+        self._journal_offset = 0
+
+    def _replay_journal(self):
+        try:
+            f = open(self.journal_path, 'rb')
+        except FileNotFoundError:
+            return
+        with f:
+            stat = os.fstat(f.fileno())
+            size = stat.st_size
+            # A rebuild compacts the journal into a new file; by the next
+            # read it may already have grown past the old offset, so the
+            # inode tells a new journal apart, not the size.
+            if stat.st_ino != self._journal_ino or size < self._journal_offset:
+                self._reset_overlay()
+                self._journal_ino = stat.st_ino
+            f.seek(self._journal_offset)
+            data = f.read(size - self._journal_offset)
+        end = data.rfind(b'\n') + 1
+        if not end:
+            return
+        # Replace rather than mutate: readers in other threads may still
+        # be iterating the previous overlay.
+        overlay = dict(self._overlay)
+        for line in data[:end].splitlines():
+            entry = json.loads(line)
+            overlay[entry['id']] = entry['data']
+        self._overlay = overlay
+        self._journal_offset += end
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_index(index_class):
+    directory = get_index_directory()
+    if directory is None:
+        return None
+    key = (index_class, directory)
+    with _indexes_lock:
+        if key not in _indexes:
+            _indexes[key] = index_class(directory)
+        return _indexes[key]
+
+
+def append_to_journal(index_class, doc_id, data):
+    directory = get_index_directory()
+    if directory is None:
+        return
+    os.makedirs(directory, exist_ok=True)
+    line = json.dumps({'id': doc_id, 'data': data}) + '\n'
+    # A single O_APPEND write keeps lines from concurrent workers whole;
+    # the shared lock keeps them out of a compaction in progress.
+    fd = open_journal(os.path.join(directory, index_class.journal_filename),
+                      os.O_WRONLY | os.O_APPEND, fcntl.LOCK_SH)
+    try:
+        os.write(fd, line.encode())
+    finally:
+        os.close(fd)
+
+
+def open_journal(path, flags, lock):
+    # Opens and locks the current journal. A compaction replaces the file
+    # while holding the exclusive lock, so whoever was waiting on the old
+    # one opens the new one instead.
+    while True:
+        fd = os.open(path, flags | os.O_CREAT, 0o644)
+        fcntl.flock(fd, lock)
+        try:
+            if os.fstat(fd).st_ino == os.stat(path).st_ino:
+                return fd
+        except FileNotFoundError:
+            pass
+        os.close(fd)
+
+
+def rebuild_snapshot(index_class, directory, write):
+    os.makedirs(directory, exist_ok=True)
+    index_path = os.path.join(directory, index_class.index_filename)
+    journal_path = os.path.join(directory, index_class.journal_filename)
+    try:
+        journal_start = os.path.getsize(journal_path)
+    except FileNotFoundError:
+        journal_start = 0
+
+    result = write(index_path)
+
+    # Keep only the journal lines written while the snapshot was built;
+    # appends wait until the new journal is in place.
+    fd = open_journal(journal_path, os.O_RDONLY, fcntl.LOCK_EX)
+    try:
+        with open(fd, 'rb', closefd=False) as f:
+            f.seek(journal_start)
+            tail = f.read()
+        with open(f'{journal_path}.tmp', 'wb') as f:
+            f.write(tail)
+        os.replace(f'{journal_path}.tmp', journal_path)
+    finally:
+        os.close(fd)
+    return result
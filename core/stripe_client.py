@@ -0,0 +1,74 @@
+import requests
+import stripe
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from requests.adapters import HTTPAdapter
+from stripe.http_client import RequestsClient
+
+
+def build_http_client():
+    # One session for every thread, so each worker reuses keep-alive
+    # connections from a bounded pool instead of opening one per call.
+    pool_size = getattr(settings, 'STRIPE_POOL_SIZE', 10)
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    timeout = (getattr(settings, 'STRIPE_CONNECT_TIMEOUT', 3.05),
+               getattr(settings, 'STRIPE_READ_TIMEOUT', 15))
+    return RequestsClient(timeout=timeout, session=session)
+
+
+def configure_stripe():
+    stripe.api_key = settings.STRIPE_SECRET_KEY
+    stripe.api_base = (getattr(settings, 'STRIPE_API_BASE', '')
+                       or 'https://api.stripe.com')
+    # Retried POSTs carry an idempotency key, so a charge whose response
+    # timed out is never made twice.
+    stripe.max_network_retries = getattr(
+        settings, 'STRIPE_MAX_NETWORK_RETRIES', 2)
+    stripe.default_http_client = build_http_client()
+
+
+# Saved cards live in the cache shared by all workers (see CACHES), so a
+# webhook handled by one process invalidates the card everywhere.
+CARD_SUMMARY_KEY = 'stripe:card:{customer_id}'
+CARD_SUMMARY_TIMEOUT = 60 * 60
+CARD_FIELDS = ('brand', 'last4', 'exp_month', 'exp_year')
+
+
+def card_summary(card):
+    return {field: card[field] for field in CARD_FIELDS}
+
+
+def cache_default_card(customer_id, card):
+    # An empty dict records "no card", so customers without one are not
+    # looked up on every page load either.
+    summary = card_summary(card) if card else {}
+    cache.set(CARD_SUMMARY_KEY.format(customer_id=customer_id), summary,
+              CARD_SUMMARY_TIMEOUT)
+    return summary
+
+
+def invalidate_default_card(customer_id):
+    # Webhooks call this inside the event transaction; the summary is
+    # dropped once it commits, immediately outside one.
+    key = CARD_SUMMARY_KEY.format(customer_id=customer_id)
+    transaction.on_commit(lambda: cache.delete(key))
+
+
+def get_default_card(customer_id):
+    if not customer_id:
+        return None
+    summary = cache.get(CARD_SUMMARY_KEY.format(customer_id=customer_id))
+    if summary is None:
+        try:
+            cards = stripe.Customer.list_sources(
+                customer_id, limit=1, object='card')
+        except stripe.error.StripeError:
+            # The page works without the saved card; try again next time.
+            return None
+        summary = cache_default_card(
+            customer_id, cards['data'][0] if cards['data'] else None)
+    return summary or None
@@ -0,0 +1,191 @@
+import itertools
+import json
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+DECLINED_TOKEN = 'tok_chargeDeclined'
+
+CUSTOMER_RE = re.compile(r'^/v1/customers/(?P<id>[^/]+)$')
+SOURCES_RE = re.compile(r'^/v1/customers/(?P<id>[^/]+)/sources$')
+
+
+def stripe_error(status, error_type, message, **extra):
+    return status, {'error': dict(type=error_type, message=message, **extra)}
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 keeps connections open, like the real API.
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        self.server.count('connections')
+        if self.server.handshake_latency:
+            time.sleep(self.server.handshake_latency)
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.respond(self.server.route('GET', self.path, {}))
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length).decode()
+        params = {key: values[-1] for key, values in parse_qs(body).items()}
+        self.respond(self.server.route('POST', self.path, params))
+
+    def respond(self, result):
+        status, payload = result
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        if self.close_connection:
+            self.send_header('Connection', 'close')
+        self.end_headers()
+        self.wfile.write(data)
+
+
+# A small in-memory imitation of the Stripe endpoints PaymentView uses,
+# for offline tests and benchmarks. latency is added to every response and
+# handshake_latency to every new connection, standing in for TLS setup.
+class StripeStandIn(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address=('127.0.0.1', 0), latency=0.0,
+                 handshake_latency=0.0):
+        super().__init__(address, StandInHandler)
+        self.latency = latency
+        self.handshake_latency = handshake_latency
+        self.customers = {}
+        self.stats = {'connections': 0, 'requests': 0}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, args=(0.05,),
+                         daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def handle_error(self, request, client_address):
+        # Clients that time out hang up before the response is written.
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+    def count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def new_id(self, prefix):
+        with self._lock:
+            return f'{prefix}_{next(self._ids):014d}'
+
+    def new_card(self, token):
+        return {
+            'id': self.new_id('card'),
+            'object': 'card',
+            'brand': 'Visa',
+            'last4': '4242',
+            'exp_month': 12,
+            'exp_year': 2030,
+            'tokenization_method': token,
+        }
+
+    def route(self, method, path, params):
+        self.count('requests')
+        path = urlparse(path).path
+        if method == 'POST' and path == '/v1/customers':
+            return self.create_customer(params)
+        if method == 'POST' and path == '/v1/charges':
+            return self.create_charge(params)
+        match = CUSTOMER_RE.match(path)
+        if method == 'GET' and match:
+            return self.get_customer(match['id'])
+        match = SOURCES_RE.match(path)
+        if match and method == 'POST':
+            return self.create_source(match['id'], params)
+        if match and method == 'GET':
+            return self.list_sources(match['id'])
+        return stripe_error(404, 'invalid_request_error',
+                            f'Unrecognized request URL ({method}: {path})')
+
+    def customer_object(self, customer):
+        fields = {key: value for key, value in customer.items()
+                  if key != 'cards'}
+        return dict(fields, sources={
+            'object': 'list',
+            'data': customer['cards'][:10],
+            'has_more': len(customer['cards']) > 10,
+            'url': f"/v1/customers/{customer['id']}/sources",
+        })
+
+    def missing_customer(self, customer_id):
+        return stripe_error(404, 'invalid_request_error',
+                            f'No such customer: {customer_id}',
+                            param='customer')
+
+    def create_customer(self, params):
+        customer = {
+            'id': self.new_id('cus'),
+            'object': 'customer',
+            'email': params.get('email'),
+            'cards': [],
+        }
+        if params.get('source'):
+            customer['cards'].append(self.new_card(params['source']))
+        self.customers[customer['id']] = customer
+        return 200, self.customer_object(customer)
+
+    def get_customer(self, customer_id):
+        customer = self.customers.get(customer_id)
+        if customer is None:
+            return self.missing_customer(customer_id)
+        return 200, self.customer_object(customer)
+
+    def create_source(self, customer_id, params):
+        customer = self.customers.get(customer_id)
+        if customer is None:
+            return self.missing_customer(customer_id)
+        card = self.new_card(params.get('source'))
+        customer['cards'].insert(0, card)
+        return 200, card
+
+    def list_sources(self, customer_id):
+        customer = self.customers.get(customer_id)
+        if customer is None:
+            return self.missing_customer(customer_id)
+        return 200, self.customer_object(customer)['sources']
+
+    def create_charge(self, params):
+        customer_id = params.get('customer')
+        if customer_id and customer_id not in self.customers:
+            return self.missing_customer(customer_id)
+        if params.get('source') == DECLINED_TOKEN:
+            return stripe_error(402, 'card_error', 'Your card was declined.',
+                                code='card_declined')
+        return 200, {
+            'id': self.new_id('ch'),
+            'object': 'charge',
+            'amount': int(params.get('amount', 0)),
+            'currency': params.get('currency', 'usd'),
+            'customer': customer_id,
+            'paid': True,
+            'status': 'succeeded',
+        }
@@ -0,0 +1,29 @@
+from django.conf import settings
+
+from .jobs import JobError, job
+from .models import Order
+
+
+@job('orders.send_confirmation')
+def send_order_confirmation(order_id, recipient):
+    from .patterns.abstract_factory import BatchedEmailNotificationService
+
+    # The worker's threads share the batcher, so their emails go out over
+    # one SMTP connection. The job only finishes once its email is sent;
+    # run the worker with several threads for the batches to fill up.
+    order = Order.objects.get(pk=order_id)
+    service = BatchedEmailNotificationService()
+    result = service.send_order_confirmation(order, recipient)
+    if not result['success']:
+        # raising hands the job back to the queue for a retry
+        raise JobError(result['error'])
+    queued = result['message']
+    timeout = getattr(settings, 'EMAIL_SEND_TIMEOUT', 60)
+    if not queued.done.wait(timeout):
+        if service.batcher.discard(queued):
+            # dropped, so the retry cannot send it twice
+            raise JobError(f"Email not sent within {timeout}s")
+        # already handed to SMTP; wait for the outcome
+        queued.done.wait()
+    if queued.status != 'sent':
+        raise JobError(queued.error)
@@ -1,25 +1,38 @@
-import random
-import string
-
 import stripe
 from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.core.exceptions import ObjectDoesNotExist
+from django.core.exceptions import ImproperlyConfigured, ObjectDoesNotExist
+from django.core.paginator import InvalidPage
+from django.http import Http404, HttpResponse, JsonResponse
 from django.shortcuts import redirect
-from django.shortcuts import render, get_object_or_404
-from django.utils import timezone
+from django.shortcuts import render
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
 from django.views.generic import ListView, DetailView, View
 
+from .autocomplete import get_autocomplete_index
+from .cart import add_item, bump_cart_version, remove_item, remove_single_item
+from .checkout import (
+    CheckoutError, finalize_order, get_default_addresses, save_checkout_addresses
+)
+from .facets import (
+    count_items, facet_links, filter_items, filter_query, get_facet_cells,
+    parse_filters
+)
 from .forms import CheckoutForm, CouponForm, RefundForm, PaymentForm
-from .models import Item, OrderItem, Order, Address, Payment, Coupon, Refund, UserProfile
-
-stripe.api_key = settings.STRIPE_SECRET_KEY
-
-
-def create_ref_code():
-    return ''.join(random.choices(string.ascii_lowercase + string.digits, k=20))
+from .jobs import enqueue
+from .models import Item, Order, Coupon, Refund, UserProfile
+from .pagination import KeysetPaginator
+from .patterns.prototype import ReorderService
+from .product_cache import get_product_html, set_product_html
+from .search import SearchResults
+from .stripe_client import cache_default_card, get_default_card
+from .tasks import send_order_confirmation
+from .webhooks import receive_event
 
 
 def products(request):
@@ -29,18 +42,12 @@ def products(request):
     return render(request, "products.html", context)
 
 
-def is_valid_form(values):
-    valid = True
-    for field in values:
-        if field == '':
-            valid = False
-    return valid
-
-
 class CheckoutView(View):
     def get(self, *args, **kwargs):
         try:
-            order = Order.objects.get(user=self.request.user, ordered=False)
+            order = Order.objects.with_totals().select_related(
+                'coupon').prefetch_related('items__item').get(
+                user=self.request.user, ordered=False)
             form = CheckoutForm()
             context = {
                 'form': form,
@@ -49,23 +56,13 @@ class CheckoutView(View):
                 'DISPLAY_COUPON_FORM': True
             }
 
-            shipping_address_qs = Address.objects.filter(
-                user=self.request.user,
-                address_type='S',
-                default=True
-            )
-            if shipping_address_qs.exists():
+            default_addresses = get_default_addresses(self.request.user)
+            if 'S' in default_addresses:
                 context.update(
-                    {'default_shipping_address': shipping_address_qs[0]})
-
-            billing_address_qs = Address.objects.filter(
-                user=self.request.user,
-                address_type='B',
-                default=True
-            )
-            if billing_address_qs.exists():
+                    {'default_shipping_address': default_addresses['S']})
+            if 'B' in default_addresses:
                 context.update(
-                    {'default_billing_address': billing_address_qs[0]})
+                    {'default_billing_address': default_addresses['B']})
             return render(self.request, "checkout.html", context)
         except ObjectDoesNotExist:
             messages.info(self.request, "You do not have an active order")
@@ -76,120 +73,12 @@ class CheckoutView(View):
         try:
             order = Order.objects.get(user=self.request.user, ordered=False)
             if form.is_valid():
-
-                use_default_shipping = form.cleaned_data.get(
-                    'use_default_shipping')
-                if use_default_shipping:
-                    print("Using the defualt shipping address")
-                    address_qs = Address.objects.filter(
-                        user=self.request.user,
-                        address_type='S',
-                        default=True
-                    )
-                    if address_qs.exists():
-                        shipping_address = address_qs[0]
-                        order.shipping_address = shipping_address
-                        order.save()
-                    else:
-                        messages.info(
-                            self.request, "No default shipping address available")
-                        return redirect('core:checkout')
-                else:
-                    print("User is entering a new shipping address")
-                    shipping_address1 = form.cleaned_data.get(
-                        'shipping_address')
-                    shipping_address2 = form.cleaned_data.get(
-                        'shipping_address2')
-                    shipping_country = form.cleaned_data.get(
-                        'shipping_country')
-                    shipping_zip = form.cleaned_data.get('shipping_zip')
-
-                    if is_valid_form([shipping_address1, shipping_country, shipping_zip]):
-                        shipping_address = Address(
-                            user=self.request.user,
-                            street_address=shipping_address1,
-                            apartment_address=shipping_address2,
-                            country=shipping_country,
-                            zip=shipping_zip,
-                            address_type='S'
-                        )
-                        shipping_address.save()
-
-                        order.shipping_address = shipping_address
-                        order.save()
-
-                        set_default_shipping = form.cleaned_data.get(
-                            'set_default_shipping')
-                        if set_default_shipping:
-                            shipping_address.default = True
-                            shipping_address.save()
-
-                    else:
-                        messages.info(
-                            self.request, "Please fill in the required shipping address fields")
-
-                use_default_billing = form.cleaned_data.get(
-                    'use_default_billing')
-                same_billing_address = form.cleaned_data.get(
-                    'same_billing_address')
-
-                if same_billing_address:
-                    billing_address = shipping_address
-                    billing_address.pk = None
-                    billing_address.save()
-                    billing_address.address_type = 'B'
-                    billing_address.save()
-                    order.billing_address = billing_address
-                    order.save()
-
-                elif use_default_billing:
-                    print("Using the defualt billing address")
-                    address_qs = Address.objects.filter(
-                        user=self.request.user,
-                        address_type='B',
-                        default=True
-                    )
-                    if address_qs.exists():
-                        billing_address = address_qs[0]
-                        order.billing_address = billing_address
-                        order.save()
-                    else:
-                        messages.info(
-                            self.request, "No default billing address available")
-                        return redirect('core:checkout')
-                else:
-                    print("User is entering a new billing address")
-                    billing_address1 = form.cleaned_data.get(
-                        'billing_address')
-                    billing_address2 = form.cleaned_data.get(
-                        'billing_address2')
-                    billing_country = form.cleaned_data.get(
-                        'billing_country')
-                    billing_zip = form.cleaned_data.get('billing_zip')
-
-                    if is_valid_form([billing_address1, billing_country, billing_zip]):
-                        billing_address = Address(
-                            user=self.request.user,
-                            street_address=billing_address1,
-                            apartment_address=billing_address2,
-                            country=billing_country,
-                            zip=billing_zip,
-                            address_type='B'
-                        )
-                        billing_address.save()
-
-                        order.billing_address = billing_address
-                        order.save()
-
-                        set_default_billing = form.cleaned_data.get(
-                            'set_default_billing')
-                        if set_default_billing:
-                            billing_address.default = True
-                            billing_address.save()
-
-                    else:
-                        messages.info(
-                            self.request, "Please fill in the required billing address fields")
+                try:
+                    save_checkout_addresses(
+                        self.request.user, order, form.cleaned_data)
+                except CheckoutError as e:
+                    messages.info(self.request, str(e))
+                    return redirect('core:checkout')
 
                 payment_option = form.cleaned_data.get('payment_option')
 
@@ -201,6 +90,8 @@ class CheckoutView(View):
                     messages.warning(
                         self.request, "Invalid payment option selected")
                     return redirect('core:checkout')
+            messages.warning(self.request, "Invalid data received")
+            return redirect('core:checkout')
         except ObjectDoesNotExist:
             messages.warning(self.request, "You do not have an active order")
             return redirect("core:order-summary")
@@ -208,7 +99,9 @@ class CheckoutView(View):
 
 class PaymentView(View):
     def get(self, *args, **kwargs):
-        order = Order.objects.get(user=self.request.user, ordered=False)
+        order = Order.objects.with_totals().select_related(
+            'coupon').prefetch_related('items__item').get(
+            user=self.request.user, ordered=False)
         if order.billing_address:
             context = {
                 'order': order,
@@ -217,17 +110,11 @@ class PaymentView(View):
             }
             userprofile = self.request.user.userprofile
             if userprofile.one_click_purchasing:
-                # fetch the users card list
-                cards = stripe.Customer.list_sources(
-                    userprofile.stripe_customer_id,
-                    limit=3,
-                    object='card'
-                )
-                card_list = cards['data']
-                if len(card_list) > 0:
-                    # update the context with the default card
+                # the default card summary is cached per Stripe customer
+                card = get_default_card(userprofile.stripe_customer_id)
+                if card:
                     context.update({
-                        'card': card_list[0]
+                        'card': card
                     })
             return render(self.request, "payment.html", context)
         else:
@@ -244,58 +131,54 @@ class PaymentView(View):
             save = form.cleaned_data.get('save')
             use_default = form.cleaned_data.get('use_default')
 
-            if save:
-                if userprofile.stripe_customer_id != '' and userprofile.stripe_customer_id is not None:
-                    customer = stripe.Customer.retrieve(
-                        userprofile.stripe_customer_id)
-                    customer.sources.create(source=token)
-
-                else:
-                    customer = stripe.Customer.create(
-                        email=self.request.user.email,
-                    )
-                    customer.sources.create(source=token)
-                    userprofile.stripe_customer_id = customer['id']
-                    userprofile.one_click_purchasing = True
-                    userprofile.save()
-
-            amount = int(order.get_total() * 100)
+            total = order.get_total()
+            amount = int(total * 100)
 
             try:
+                # One Stripe call to save the card, one to charge it.
+                if save:
+                    if userprofile.stripe_customer_id != '' and userprofile.stripe_customer_id is not None:
+                        card = stripe.Customer.create_source(
+                            userprofile.stripe_customer_id, source=token)
+
+                    else:
+                        customer = stripe.Customer.create(
+                            email=self.request.user.email,
+                            source=token,
+                            expand=['sources']
+                        )
+                        card = customer['sources']['data'][0]
+                        userprofile.stripe_customer_id = customer['id']
+                        userprofile.one_click_purchasing = True
+                        userprofile.save()
+                    # the newest card is the one the payment page offers
+                    cache_default_card(userprofile.stripe_customer_id, card)
 
                 if use_default or save:
                     # charge the customer because we cannot charge the token more than once
                     charge = stripe.Charge.create(
                         amount=amount,  # cents
                         currency="usd",
-                        customer=userprofile.stripe_customer_id
+                        customer=userprofile.stripe_customer_id,
+                        # lets the webhook worker find the order
+                        metadata={'order_id': order.pk}
                     )
                 else:
                     # charge once off on the token
                     charge = stripe.Charge.create(
                         amount=amount,  # cents
                         currency="usd",
-                        source=token
+                        source=token,
+                        metadata={'order_id': order.pk}
                     )
 
-                # create the payment
-                payment = Payment()
-                payment.stripe_charge_id = charge['id']
-                payment.user = self.request.user
-                payment.amount = order.get_total()
-                payment.save()
-
-                # assign the payment to the order
-
-                order_items = order.items.all()
-                order_items.update(ordered=True)
-                for item in order_items:
-                    item.save()
-
-                order.ordered = True
-                order.payment = payment
-                order.ref_code = create_ref_code()
-                order.save()
+                # create the payment and mark the order as paid
+                finalize_order(order, charge, total)
+                bump_cart_version(self.request.user)
+                if self.request.user.email:
+                    # sent by run_worker, so SMTP stays out of checkout
+                    enqueue(send_order_confirmation, order_id=order.pk,
+                            recipient=self.request.user.email)
 
                 messages.success(self.request, "Your order was successful!")
                 return redirect("/")
@@ -349,12 +232,108 @@ class HomeView(ListView):
     model = Item
     paginate_by = 10
     template_name = "home.html"
+    card_fields = ('title', 'price', 'discount_price', 'effective_price',
+                   'category', 'label', 'slug', 'image')
+    # Each ordering is served by an index on Item, ascending or backwards.
+    sort_options = {
+        '': ('Default', ('pk',)),
+        'price': ('Price: low to high', ('effective_price', 'pk')),
+        '-price': ('Price: high to low', ('-effective_price', '-pk')),
+    }
+
+    def get_queryset(self):
+        self.filters = parse_filters(self.request.GET)
+        self.sort = self.request.GET.get('sort', '')
+        if self.sort not in self.sort_options:
+            self.sort = ''
+        return filter_items(Item.objects.only(*self.card_fields), self.filters)
+
+    def paginate_queryset(self, queryset, page_size):
+        name, ordering = self.sort_options[self.sort]
+        paginator = KeysetPaginator(
+            queryset, page_size, ordering,
+            count_cache_key=None if self.filters else 'catalog:item-count')
+        try:
+            page = paginator.page(
+                after=self.request.GET.get('after'),
+                before=self.request.GET.get('before'))
+        except InvalidPage:
+            raise Http404("Invalid page")
+        return (paginator, page, page.object_list, page.has_other_pages())
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        cells = get_facet_cells()
+        sort_params = [('sort', self.sort)] if self.sort else []
+        facets = facet_links(cells, self.filters, sort_params)
+        context['facets'] = facets
+        context['filter_facets'] = [
+            facets[field] for field in ('label', 'price_bucket', 'on_discount')
+        ]
+        context['sort_links'] = [
+            {
+                'name': name,
+                'active': sort == self.sort,
+                'query': filter_query(
+                    self.filters, [('sort', sort)] if sort else []),
+            }
+            for sort, (name, ordering) in self.sort_options.items()
+        ]
+        context['result_count'] = count_items(cells, self.filters)
+        query = filter_query(self.filters, sort_params)
+        context['filter_query'] = f'{query}&' if query else ''
+        return context
+
+
+class SearchView(ListView):
+    paginate_by = 10
+    template_name = "search.html"
+
+    def get_queryset(self):
+        self.query = self.request.GET.get('q', '').strip()
+        return SearchResults(
+            self.query, Item.objects.only(*HomeView.card_fields))
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['query'] = self.query
+        return context
+
+
+def autocomplete(request):
+    index = get_autocomplete_index()
+    query = request.GET.get('q', '')
+    suggestions = index.suggest(query, 8) if index is not None else []
+    return JsonResponse({'suggestions': [
+        {
+            'title': suggestion['title'],
+            'url': reverse('core:product', kwargs={'slug': suggestion['slug']})
+        }
+        for suggestion in suggestions
+    ]})
+
+
+@csrf_exempt
+@require_POST
+def stripe_webhook(request):
+    # Only verify and store here; process_stripe_events does the work.
+    try:
+        receive_event(request.body,
+                      request.META.get('HTTP_STRIPE_SIGNATURE', ''))
+    except (ValueError, stripe.error.SignatureVerificationError):
+        return HttpResponse(status=400)
+    except ImproperlyConfigured:
+        # Stripe keeps retrying until the secret is configured
+        return HttpResponse(status=503)
+    return HttpResponse(status=200)
 
 
 class OrderSummaryView(LoginRequiredMixin, View):
     def get(self, *args, **kwargs):
         try:
-            order = Order.objects.get(user=self.request.user, ordered=False)
+            order = Order.objects.with_totals().select_related(
+                'coupon').prefetch_related('items__item').get(
+                user=self.request.user, ordered=False)
             context = {
                 'object': order
             }
@@ -368,92 +347,66 @@ class ItemDetailView(DetailView):
     model = Item
     template_name = "product.html"
 
+    def get(self, request, *args, **kwargs):
+        product_html = get_product_html(kwargs['slug'])
+        if product_html is None:
+            self.object = self.get_object()
+            product_html = render_to_string(
+                "product_snippet.html", {'object': self.object})
+            set_product_html(self.object, product_html)
+        return render(request, self.template_name, {
+            'product_html': product_html
+        })
+
 
 @login_required
 def add_to_cart(request, slug):
-    item = get_object_or_404(Item, slug=slug)
-    order_item, created = OrderItem.objects.get_or_create(
-        item=item,
-        user=request.user,
-        ordered=False
-    )
-    order_qs = Order.objects.filter(user=request.user, ordered=False)
-    if order_qs.exists():
-        order = order_qs[0]
-        # check if the order item is in the order
-        if order.items.filter(item__slug=item.slug).exists():
-            order_item.quantity += 1
-            order_item.save()
-            messages.info(request, "This item quantity was updated.")
-            return redirect("core:order-summary")
-        else:
-            order.items.add(order_item)
-            messages.info(request, "This item was added to your cart.")
-            return redirect("core:order-summary")
-    else:
-        ordered_date = timezone.now()
-        order = Order.objects.create(
-            user=request.user, ordered_date=ordered_date)
-        order.items.add(order_item)
+    if add_item(request.user, slug):
         messages.info(request, "This item was added to your cart.")
-        return redirect("core:order-summary")
+    else:
+        messages.info(request, "This item quantity was updated.")
+    return redirect("core:order-summary")
+
+
+@login_required
+def buy_again(request, ref_code):
+    orders = Order.objects.filter(
+        user=request.user, ordered=True, ref_code=ref_code)
+    # {user id: items added}; an order whose items are all gone adds 0
+    added = ReorderService.reorder_many(orders).get(request.user.pk)
+    if added is None:
+        messages.info(request, "This order was not found")
+        return redirect("/")
+    if not added:
+        messages.info(request, "None of the items of this order are "
+                               "available any more.")
+        return redirect("/")
+    messages.info(request, "The items of this order were added to your cart.")
+    return redirect("core:order-summary")
 
 
 @login_required
 def remove_from_cart(request, slug):
-    item = get_object_or_404(Item, slug=slug)
-    order_qs = Order.objects.filter(
-        user=request.user,
-        ordered=False
-    )
-    if order_qs.exists():
-        order = order_qs[0]
-        # check if the order item is in the order
-        if order.items.filter(item__slug=item.slug).exists():
-            order_item = OrderItem.objects.filter(
-                item=item,
-                user=request.user,
-                ordered=False
-            )[0]
-            order.items.remove(order_item)
-            order_item.delete()
+    try:
+        if remove_item(request.user, slug):
             messages.info(request, "This item was removed from your cart.")
             return redirect("core:order-summary")
-        else:
-            messages.info(request, "This item was not in your cart")
-            return redirect("core:product", slug=slug)
-    else:
+        messages.info(request, "This item was not in your cart")
+        return redirect("core:product", slug=slug)
+    except ObjectDoesNotExist:
         messages.info(request, "You do not have an active order")
         return redirect("core:product", slug=slug)
 
 
 @login_required
 def remove_single_item_from_cart(request, slug):
-    item = get_object_or_404(Item, slug=slug)
-    order_qs = Order.objects.filter(
-        user=request.user,
-        ordered=False
-    )
-    if order_qs.exists():
-        order = order_qs[0]
-        # check if the order item is in the order
-        if order.items.filter(item__slug=item.slug).exists():
-            order_item = OrderItem.objects.filter(
-                item=item,
-                user=request.user,
-                ordered=False
-            )[0]
-            if order_item.quantity > 1:
-                order_item.quantity -= 1
-                order_item.save()
-            else:
-                order.items.remove(order_item)
+    try:
+        if remove_single_item(request.user, slug):
             messages.info(request, "This item quantity was updated.")
             return redirect("core:order-summary")
-        else:
-            messages.info(request, "This item was not in your cart")
-            return redirect("core:product", slug=slug)
-    else:
+        messages.info(request, "This item was not in your cart")
+        return redirect("core:product", slug=slug)
+    except ObjectDoesNotExist:
         messages.info(request, "You do not have an active order")
         return redirect("core:product", slug=slug)
 
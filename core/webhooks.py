@@ -0,0 +1,178 @@
+import json
+import traceback
+
+import stripe
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .cart import bump_cart_version
+from .checkout import finalize_order
+from .jobs import enqueue
+from .models import Order, Payment, Refund, StripeEvent
+from .stripe_client import invalidate_default_card
+from .tasks import send_order_confirmation
+
+# Events that keep failing stay in the table for inspection but are no
+# longer picked up by the worker.
+MAX_ATTEMPTS = 5
+CHARGE_EVENTS = ('charge.succeeded', 'charge.failed', 'charge.refunded')
+# What PaymentView charges in.
+CURRENCY = 'usd'
+
+
+class ChargeMismatch(Exception):
+    pass
+
+
+def store_event(event, payload):
+    # One INSERT and nothing else, so the endpoint acknowledges quickly.
+    # Stripe redelivers events; the unique event id drops the repeats.
+    StripeEvent.objects.bulk_create([
+        StripeEvent(event_id=event['id'], type=event['type'],
+                    payload=payload)
+    ], ignore_conflicts=True)
+
+
+def receive_event(payload, signature):
+    # Raises ValueError or SignatureVerificationError for requests that
+    # did not come from Stripe. Without a secret nothing can be verified,
+    # so nothing is accepted.
+    if not settings.STRIPE_WEBHOOK_SECRET:
+        raise ImproperlyConfigured("STRIPE_WEBHOOK_SECRET is not set")
+    event = stripe.Webhook.construct_event(
+        payload, signature, settings.STRIPE_WEBHOOK_SECRET)
+    if isinstance(payload, bytes):
+        payload = payload.decode()
+    store_event(event, payload)
+    return event
+
+
+def pending_events():
+    return StripeEvent.objects.filter(
+        processed_at__isnull=True, attempts__lt=MAX_ATTEMPTS).order_by('pk')
+
+
+class EventBatch:
+    def __init__(self, events):
+        self.objects = {event.pk: json.loads(event.payload)['data']['object']
+                        for event in events}
+        charge_ids = [self.objects[event.pk]['id'] for event in events
+                      if event.type in CHARGE_EVENTS]
+        # Payments of the whole batch in one query.
+        self.payments = {
+            payment.stripe_charge_id: payment
+            for payment in Payment.objects.filter(
+                stripe_charge_id__in=charge_ids)
+        }
+        self.statuses = {}
+
+    def handle(self, event):
+        handler = getattr(self, 'on_' + event.type.replace('.', '_'), None)
+        if handler is None:
+            return
+        statuses, payments = dict(self.statuses), dict(self.payments)
+        try:
+            handler(self.objects[event.pk])
+        except Exception:
+            # The handler's savepoint is rolled back; so is what it left
+            # for flush().
+            self.statuses, self.payments = statuses, payments
+            raise
+
+    def set_status(self, charge, status):
+        payment = self.payments.get(charge['id'])
+        if payment is not None and \
+                self.statuses.get(payment.pk, payment.status) != status:
+            self.statuses[payment.pk] = status
+
+    def on_charge_succeeded(self, charge):
+        if charge['id'] in self.payments:
+            self.set_status(charge, 'succeeded')
+            return
+        # The checkout request died between the charge and recording it.
+        order_id = (charge.get('metadata') or {}).get('order_id')
+        if not order_id:
+            return
+        order = Order.objects.filter(pk=order_id, ordered=False).first()
+        if order is not None and charge['paid']:
+            # The cart may have changed since it was charged.
+            if charge['currency'] != CURRENCY or \
+                    charge['amount'] != int(order.get_total() * 100):
+                raise ChargeMismatch(
+                    f"{charge['id']} does not match order {order.pk}")
+            payment = finalize_order(order, charge, charge['amount'] / 100)
+            if payment is not None:
+                self.payments[charge['id']] = payment
+                # what PaymentView does after a checkout that went through;
+                # dropped with the savepoint if this event fails
+                bump_cart_version(order.user)
+                if order.user.email:
+                    order_id, email = order.pk, order.user.email
+                    transaction.on_commit(lambda: enqueue(
+                        send_order_confirmation, order_id=order_id,
+                        recipient=email))
+
+    def on_charge_failed(self, charge):
+        self.set_status(charge, 'failed')
+
+    def on_charge_refunded(self, charge):
+        # Partial refunds also send charge.refunded; only a full refund
+        # changes the payment.
+        if charge.get('refunded'):
+            self.set_status(charge, 'refunded')
+
+    def on_customer_source_created(self, card):
+        invalidate_default_card(card.get('customer'))
+
+    on_customer_source_updated = on_customer_source_created
+    on_customer_source_deleted = on_customer_source_created
+
+    def flush(self):
+        by_status = {}
+        for payment_id, status in self.statuses.items():
+            by_status.setdefault(status, []).append(payment_id)
+        for status, payment_ids in by_status.items():
+            Payment.objects.filter(pk__in=payment_ids).update(status=status)
+        refunded = by_status.get('refunded')
+        if refunded:
+            Order.objects.filter(payment__in=refunded).update(
+                refund_requested=False, refund_granted=True)
+            Refund.objects.filter(order__payment__in=refunded).update(
+                accepted=True)
+
+
+def process_pending_events(batch_size=100):
+    # Workers running side by side skip each other's locked rows.
+    with transaction.atomic():
+        events = list(pending_events().select_for_update(
+            skip_locked=True)[:batch_size])
+        if not events:
+            return 0
+        batch = EventBatch(events)
+        processed = []
+        for event in events:
+            try:
+                with transaction.atomic():
+                    batch.handle(event)
+            except Exception:
+                StripeEvent.objects.filter(pk=event.pk).update(
+                    attempts=F('attempts') + 1,
+                    error=traceback.format_exc())
+            else:
+                processed.append(event.pk)
+        try:
+            with transaction.atomic():
+                batch.flush()
+        except Exception:
+            # Nothing is marked processed, and every event counts the
+            # attempt, so a flush that keeps failing parks them as well.
+            StripeEvent.objects.filter(pk__in=processed).update(
+                attempts=F('attempts') + 1,
+                error=traceback.format_exc())
+        else:
+            StripeEvent.objects.filter(pk__in=processed).update(
+                processed_at=timezone.now())
+    return len(events)
@@ -68,6 +68,23 @@ STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static_in_env')]
 STATIC_ROOT = os.path.join(BASE_DIR, 'static_root')
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media_root')
 
+# Cache
+# Cart counts, rendered product pages and saved cards are invalidated
+# through this cache, so every worker process has to see the same one;
+# Django's default LocMemCache is private to each process. The file cache
+# is shared by the workers of one host. With several hosts, point
+# CACHE_BACKEND/CACHE_LOCATION at memcached, e.g.
+# django.core.cache.backends.memcached.PyMemcacheCache and 127.0.0.1:11211.
+CACHES = {
+    'default': {
+        'BACKEND': config(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': config(
+            'CACHE_LOCATION', default=os.path.join(BASE_DIR, 'cache')),
+    }
+}
+
 # Auth
 
 AUTHENTICATION_BACKENDS = (
@@ -84,6 +101,29 @@ CRISPY_TEMPLATE_PACK = 'bootstrap4'
 # Stripe Configuration
 STRIPE_SECRET_KEY = config('STRIPE_TEST_SECRET_KEY', default='sk_test_demo_key')
 STRIPE_PUBLISHABLE_KEY = config('STRIPE_TEST_PUBLIC_KEY', default='pk_test_demo_key')
+# Point at a local stand-in (manage.py run_stripe_standin) for offline runs
+STRIPE_API_BASE = config('STRIPE_API_BASE', default='')
+STRIPE_CONNECT_TIMEOUT = 3.05
+STRIPE_READ_TIMEOUT = 15
+STRIPE_MAX_NETWORK_RETRIES = 2
+STRIPE_POOL_SIZE = 10
+# Signing secret of the webhook endpoint (whsec_...)
+STRIPE_WEBHOOK_SECRET = config('STRIPE_WEBHOOK_SECRET', default='')
 
 # Email Configuration
-DEFAULT_FROM_EMAIL = config('DEFAULT_FROM_EMAIL', default='noreply@example.com')
\ No newline at end of file
+DEFAULT_FROM_EMAIL = config('DEFAULT_FROM_EMAIL', default='noreply@example.com')
+# BatchedEmailNotificationService (see core.notifications)
+EMAIL_BATCH_SIZE = 50
+EMAIL_BATCH_INTERVAL = 5.0
+EMAIL_MAX_ATTEMPTS = 3
+# Product search index (see core.search)
+SEARCH_INDEX_DIR = os.path.join(BASE_DIR, 'search_index')
+
+# Background jobs (core.jobs, manage.py run_worker)
+JOB_MAX_ATTEMPTS = 5
+JOB_RETRY_BACKOFF = 10
+JOB_MAX_BACKOFF = 60 * 60
+JOB_LOCK_TIMEOUT = 10 * 60
+
+# Order templates kept in memory per worker (core.order_templates)
+ORDER_TEMPLATE_CACHE_SIZE = 256
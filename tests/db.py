@@ -0,0 +1,40 @@
+import os
+import sys
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'djecommerce.settings')
+
+import django
+from django.conf import settings
+
+if not hasattr(settings, 'STRIPE_SECRET_KEY'):
+    settings.STRIPE_SECRET_KEY = 'test_secret_key'
+
+django.setup()
+
+from django.apps import apps
+from django.test.runner import DiscoverRunner
+from django.test.utils import setup_test_environment
+
+# Тести шаблонів працюють без бази даних, тому застосунок core та
+# тестова SQLite-база в пам'яті підключаються лише тут, один раз
+# на процес.
+if not apps.is_installed('core'):
+    settings.DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': ':memory:',
+        }
+    }
+    apps.set_installed_apps([
+        'django.contrib.contenttypes',
+        'django.contrib.auth',
+        'django.contrib.sessions',
+        'django.contrib.messages',
+        'django_countries',
+        'core',
+    ])
+    setup_test_environment()
+    DiscoverRunner(verbosity=0).setup_databases()
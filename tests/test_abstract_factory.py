@@ -0,0 +1,114 @@
+import unittest
+import os
+import sys
+import threading
+import time
+from decimal import Decimal
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'djecommerce.settings')
+
+import django
+from django.conf import settings
+
+if not hasattr(settings, 'STRIPE_SECRET_KEY'):
+    settings.STRIPE_SECRET_KEY = 'test_secret_key'
+
+django.setup()
+
+from core.patterns.abstract_factory import (
+    ExpressShipping, NotificationService, OrderProcessingFactory,
+    OrderProcessor, PayPalPaymentProcessor
+)
+
+DELAY = 0.2
+
+
+class MockOrder:
+    ref_code = 'ORDER-001'
+
+    def get_total(self):
+        return Decimal('150.00')
+
+
+class SlowShipping(ExpressShipping):
+
+    def calculate_cost(self, weight=None, distance=None):
+        time.sleep(DELAY)
+        return super().calculate_cost(weight, distance)
+
+
+class SlowNotification(NotificationService):
+
+    def __init__(self):
+        self.sent = threading.Event()
+
+    def send_order_confirmation(self, order, recipient):
+        time.sleep(DELAY)
+        self.sent.set()
+        return {'success': True, 'method': 'email'}
+
+
+class SlowFactory(OrderProcessingFactory):
+
+    def create_payment_processor(self):
+        return PayPalPaymentProcessor()
+
+    def create_shipping_method(self):
+        return SlowShipping()
+
+    def create_notification_service(self):
+        return SlowNotification()
+
+
+class TestConcurrentOrderProcessor(unittest.TestCase):
+
+    def setUp(self):
+        self.processor = OrderProcessor(SlowFactory())
+
+    def test_same_result_as_sequential(self):
+        print("\n[TEST] Паралельна обробка дає той самий результат")
+        started = time.perf_counter()
+        sequential = self.processor.process_order(
+            MockOrder(), 'tok', 'a@example.com')
+        sequential_time = time.perf_counter() - started
+
+        order = MockOrder()
+        result = self.processor.process_order_concurrently(
+            order, 'tok', 'a@example.com')
+        timings = result.pop('timings')
+        print(f"  Послідовно: {sequential_time * 1000:.0f} мс, "
+              f"паралельно: {timings['total'] * 1000:.0f} мс")
+        self.assertEqual(result, sequential)
+        self.assertEqual(set(timings),
+                         {'payment', 'shipping', 'notification', 'total'})
+        self.assertLess(timings['total'], 1.5 * DELAY)
+        self.assertGreaterEqual(sequential_time, 2 * DELAY)
+        # замовлення викликача не змінюється
+        self.assertFalse(hasattr(order, 'total'))
+
+    def test_deferred_notification(self):
+        print("\n[TEST] Лист надсилається у фоні після відповіді")
+        result = self.processor.process_order_concurrently(
+            MockOrder(), 'tok', 'a@example.com', defer_notification=True)
+        print(f"  Відповідь за {result['timings']['total'] * 1000:.0f} мс")
+        self.assertEqual(result['notification'],
+                         {'success': True, 'deferred': True})
+        self.assertNotIn('notification', result['timings'])
+        self.assertTrue(self.processor.notification.sent.wait(5))
+
+    def test_failed_payment(self):
+        print("\n[TEST] Відмова оплати зупиняє обробку")
+        self.processor.payment.process_payment = (
+            lambda amount, token: {'success': False, 'error': 'declined'})
+        result = self.processor.process_order_concurrently(
+            MockOrder(), 'tok', 'a@example.com')
+        self.assertEqual((result['success'], result['error']),
+                         (False, 'declined'))
+        self.assertFalse(self.processor.notification.sent.is_set())
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,162 @@
+import fcntl
+import json
+import os
+import tempfile
+import threading
+import unittest
+
+from tests import db  # noqa: F401
+
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+from django.test import TestCase, override_settings
+
+from core import snapshots
+from core.autocomplete import (
+    HEAVY_PREFIX, INDEX_FILENAME, AutocompleteIndex, rebuild_index,
+    write_index
+)
+from core.models import Item, OrderItem
+
+
+def titles(suggestions):
+    return [suggestion['title'] for suggestion in suggestions]
+
+
+class TestAutocompleteIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.directory = self.tmp.name
+        write_index(os.path.join(self.directory, INDEX_FILENAME), [
+            (1, 'Red cotton shirt', 'red-cotton-shirt', 5),
+            (2, 'Running jacket', 'running-jacket', 9),
+            (3, 'Blue denim jacket', 'blue-denim-jacket', 0),
+            (4, 'Red running shorts', 'red-running-shorts', 2),
+        ])
+        self.index = AutocompleteIndex(self.directory)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_prefix_of_any_word_by_popularity(self):
+        print("\n[TEST] Підказки за початком будь-якого слова, за популярністю")
+        suggestions = self.index.suggest('ru')
+        print(f"  'ru' -> {titles(suggestions)}")
+        self.assertEqual(titles(suggestions),
+                         ['Running jacket', 'Red running shorts'])
+        self.assertEqual(titles(self.index.suggest('Jack')),
+                         ['Running jacket', 'Blue denim jacket'])
+        self.assertEqual(titles(self.index.suggest('red r')),
+                         ['Red running shorts'])
+        self.assertEqual(self.index.suggest('  '), [])
+
+    def test_heavy_prefix_uses_precomputed_top(self):
+        print("\n[TEST] Популярні префікси мають готовий топ підказок")
+        write_index(os.path.join(self.directory, INDEX_FILENAME), [
+            (pk, f'Shirt {pk}', f'shirt-{pk}', pk)
+            for pk in range(1, HEAVY_PREFIX * 3)
+        ])
+        suggestions = self.index.suggest('sh', limit=3)
+        print(f"  'sh' -> {titles(suggestions)}")
+        last = HEAVY_PREFIX * 3 - 1
+        self.assertEqual(titles(suggestions),
+                         [f'Shirt {pk}' for pk in (last, last - 1, last - 2)])
+        self.assertEqual(len(self.index.suggest('shirt', limit=40)), 40)
+
+    def test_journal_overrides_snapshot(self):
+        print("\n[TEST] Зміни товарів із журналу без перебудови знімка")
+        with override_settings(SEARCH_INDEX_DIR=self.directory):
+            snapshots.append_to_journal(AutocompleteIndex, 3, {
+                'title': 'Blue rain jacket', 'slug': 'blue-rain-jacket',
+                'popularity': 20})
+            snapshots.append_to_journal(AutocompleteIndex, 2, None)
+
+        self.assertEqual(titles(self.index.suggest('jacket')),
+                         ['Blue rain jacket'])
+        self.assertEqual(self.index.suggest('denim'), [])
+
+    def test_compacted_journal_is_replayed_from_start(self):
+        print("\n[TEST] Стиснений журнал читається заново, навіть якщо довший")
+        with override_settings(SEARCH_INDEX_DIR=self.directory):
+            snapshots.append_to_journal(AutocompleteIndex, 2, None)
+        self.assertEqual(titles(self.index.suggest('running')),
+                         ['Red running shorts'])
+
+        # перебудова замінює журнал новим файлом, який встиг вирости
+        journal = os.path.join(self.directory,
+                               AutocompleteIndex.journal_filename)
+        with open(f'{journal}.tmp', 'w') as f:
+            f.write(json.dumps({'id': 4, 'data': {
+                'title': 'Red trail running shorts',
+                'slug': 'red-trail-running-shorts', 'popularity': 1}}) + '\n')
+        os.replace(f'{journal}.tmp', journal)
+
+        self.assertEqual(titles(self.index.suggest('running')),
+                         ['Running jacket', 'Red trail running shorts'])
+
+    def test_append_during_compaction_is_kept(self):
+        print("\n[TEST] Запис під час стиснення журналу не губиться")
+        journal = os.path.join(self.directory,
+                               AutocompleteIndex.journal_filename)
+        # стиснення тримає журнал заблокованим, поки не замінить файл
+        fd = snapshots.open_journal(journal, os.O_RDONLY, fcntl.LOCK_EX)
+        with override_settings(SEARCH_INDEX_DIR=self.directory):
+            writer = threading.Thread(
+                target=snapshots.append_to_journal,
+                args=(AutocompleteIndex, 2, None))
+            writer.start()
+            writer.join(0.2)
+            self.assertTrue(writer.is_alive())
+            with open(f'{journal}.tmp', 'wb'):
+                pass
+            os.replace(f'{journal}.tmp', journal)
+            os.close(fd)
+            writer.join()
+
+        with open(journal) as f:
+            self.assertEqual([json.loads(line) for line in f],
+                             [{'id': 2, 'data': None}])
+
+
+class TestRebuildAutocomplete(TestCase):
+
+    def test_rolled_back_item_is_not_suggested(self):
+        print("\n[TEST] Відкочений товар не з'являється в підказках")
+        with tempfile.TemporaryDirectory() as directory, \
+                override_settings(SEARCH_INDEX_DIR=directory):
+            write_index(os.path.join(directory, INDEX_FILENAME), [])
+            index = AutocompleteIndex(directory)
+            with self.captureOnCommitCallbacks(execute=True):
+                with self.assertRaises(IntegrityError):
+                    with transaction.atomic():
+                        Item.objects.create(
+                            title='Ghost', slug='ghost', price=10.0,
+                            category='S', label='P', description='')
+                        raise IntegrityError
+            self.assertEqual(index.suggest('gho'), [])
+
+    def test_popularity_from_orders(self):
+        print("\n[TEST] Популярність рахується з оплачених замовлень")
+        user = get_user_model().objects.create(username='buyer')
+        tee, polo = [
+            Item.objects.create(title=title, slug=title.lower(), price=10.0,
+                                category='S', label='P', description='')
+            for title in ('Tee', 'Polo')
+        ]
+        OrderItem.objects.create(user=user, item=polo, ordered=True,
+                                 quantity=3)
+        OrderItem.objects.create(user=user, item=tee, ordered=False,
+                                 quantity=5)
+
+        with tempfile.TemporaryDirectory() as directory:
+            self.assertEqual(rebuild_index(directory), 2)
+            index = AutocompleteIndex(directory)
+            reader, overlay = index.open()
+            print(f"  Найпопулярніший: {reader.item(0)}")
+            self.assertEqual(reader.item(0)[:2], (polo.pk, 'Polo'))
+            self.assertEqual(reader.item(0)[3], 3)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,75 @@
+import unittest
+
+from tests import db  # noqa: F401
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.test import TestCase
+from django.utils import timezone
+
+from core.cart import bump_cart_version, get_cart_item_count
+from core.models import Item, Order, OrderItem
+
+
+class TestCartItemCountCache(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create(username='buyer')
+        self.item = Item.objects.create(
+            title='Shirt', price=20.0, category='S', label='P',
+            slug='shirt', description='')
+        self.order = Order.objects.create(
+            user=self.user, ordered_date=timezone.now())
+        self.order.items.add(
+            OrderItem.objects.create(user=self.user, item=self.item))
+
+    def test_cache_hit_needs_no_queries(self):
+        print("\n[TEST] Лічильник кошика з кешу без запитів до БД")
+        self.assertEqual(get_cart_item_count(self.user), 1)
+
+        user = get_user_model().objects.get(pk=self.user.pk)
+        with self.assertNumQueries(0):
+            count = get_cart_item_count(user)
+
+        print(f"  Товарів у кошику: {count}")
+        self.assertEqual(count, 1)
+
+    def test_bump_invalidates_count(self):
+        print("\n[TEST] Нова версія кошика скидає закешований лічильник")
+        self.assertEqual(get_cart_item_count(self.user), 1)
+
+        other = Item.objects.create(
+            title='Jacket', price=50.0, category='OW', label='S',
+            slug='jacket', description='')
+        self.order.items.add(
+            OrderItem.objects.create(user=self.user, item=other))
+        self.assertEqual(get_cart_item_count(self.user), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            bump_cart_version(self.user)
+        count = get_cart_item_count(self.user)
+
+        print(f"  Товарів у кошику після зміни: {count}")
+        self.assertEqual(count, 2)
+
+    def test_rolled_back_change_keeps_version(self):
+        print("\n[TEST] Відкат транзакції не змінює версію кошика")
+        self.assertEqual(get_cart_item_count(self.user), 1)
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            try:
+                with transaction.atomic():
+                    bump_cart_version(self.user)
+                    raise IntegrityError
+            except IntegrityError:
+                pass
+        self.assertEqual(callbacks, [])
+
+        user = get_user_model().objects.get(pk=self.user.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_cart_item_count(user), 1)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,85 @@
+import unittest
+
+from tests import db  # noqa: F401
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import IntegrityError, transaction
+from django.http import Http404
+from django.test import TestCase
+from django.utils import timezone
+
+from core.cart import add_item, remove_item, remove_single_item
+from core.models import Item, Order, OrderItem
+
+
+class TestCartService(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create(username='buyer')
+        self.item = Item.objects.create(
+            title='Shirt', price=20.0, category='S', label='P',
+            slug='shirt', description='')
+
+    def test_add_creates_order_and_line(self):
+        print("\n[TEST] Перше додавання створює кошик і позицію")
+        self.assertTrue(add_item(self.user, 'shirt'))
+
+        order = Order.objects.get(user=self.user, ordered=False)
+        self.assertEqual(order.items.get().quantity, 1)
+
+    def test_repeat_add_is_single_update(self):
+        print("\n[TEST] Повторне додавання: блокування кошика + один UPDATE")
+        add_item(self.user, 'shirt')
+
+        # SAVEPOINT/RELEASE від transaction.atomic + SELECT ... FOR UPDATE + UPDATE
+        with self.assertNumQueries(4):
+            created = add_item(self.user, 'shirt')
+
+        self.assertFalse(created)
+        self.assertEqual(OrderItem.objects.get().quantity, 2)
+
+    def test_unknown_slug(self):
+        print("\n[TEST] Невідомий товар повертає 404")
+        with self.assertRaises(Http404):
+            add_item(self.user, 'missing')
+        add_item(self.user, 'shirt')
+        with self.assertRaises(Http404):
+            remove_item(self.user, 'missing')
+        with self.assertRaises(Http404):
+            remove_single_item(self.user, 'missing')
+
+    def test_remove_single_then_delete(self):
+        print("\n[TEST] Зменшення кількості та видалення останньої одиниці")
+        add_item(self.user, 'shirt')
+        add_item(self.user, 'shirt')
+
+        self.assertTrue(remove_single_item(self.user, 'shirt'))
+        self.assertEqual(OrderItem.objects.get().quantity, 1)
+        self.assertTrue(remove_single_item(self.user, 'shirt'))
+        self.assertFalse(OrderItem.objects.exists())
+        self.assertFalse(remove_single_item(self.user, 'shirt'))
+
+    def test_remove_without_order(self):
+        print("\n[TEST] Видалення без активного кошика")
+        with self.assertRaises(ObjectDoesNotExist):
+            remove_item(self.user, 'shirt')
+
+    def test_one_open_line_per_item(self):
+        print("\n[TEST] Обмеження unique_open_order_item")
+        OrderItem.objects.create(user=self.user, item=self.item)
+        OrderItem.objects.create(user=self.user, item=self.item, ordered=True)
+
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            OrderItem.objects.create(user=self.user, item=self.item)
+
+    def test_one_open_order_per_user(self):
+        print("\n[TEST] Обмеження unique_open_order: один відкритий кошик")
+        add_item(self.user, 'shirt')
+
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Order.objects.create(user=self.user, ordered_date=timezone.now())
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,152 @@
+import unittest
+import csv
+import json
+import os
+import tempfile
+from io import StringIO
+
+from tests import db  # noqa: F401
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from core.catalog_import import (CatalogImporter, load_checkpoint,
+                                 read_rows, save_checkpoint)
+from core.models import Item
+from core.product_cache import PRODUCT_SLUG_KEY
+
+FIELDS = ['type', 'title', 'price', 'discount_price', 'category', 'label',
+          'slug', 'author', 'pages', 'brand', 'warranty_months', 'size',
+          'color', 'material']
+
+
+def book(n, **extra):
+    row = {'type': 'book', 'title': f'Book {n}', 'price': '10.50',
+           'category': 'S', 'label': 'P', 'author': 'Author', 'pages': '100'}
+    row.update(extra)
+    return row
+
+
+class TestCatalogImport(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+
+    def write_csv(self, rows, name='catalog.csv'):
+        path = os.path.join(self.dir.name, name)
+        with open(path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, FIELDS)
+            writer.writeheader()
+            writer.writerows(rows)
+        return path
+
+    def test_rows_go_through_the_factory(self):
+        print("\n[TEST] Рядки CSV перевіряються через ProductFactory")
+        path = self.write_csv([
+            book(1),
+            {'type': 'electronics', 'title': 'Phone', 'price': '300',
+             'discount_price': '250', 'category': 'OW', 'label': 'S',
+             'brand': 'Acme', 'warranty_months': '12'},
+            {'type': 'furniture', 'title': 'Chair', 'price': '5',
+             'category': 'S', 'label': 'P'},
+            book(2, author=''),
+            book(3, price='abc'),
+            book(4, category='BK'),
+            book(5, slug='bad slug!'),
+        ])
+        importer = CatalogImporter()
+        stats = importer.run(read_rows(path))
+
+        print(f"  Статистика: {stats}")
+        self.assertEqual(stats, {'rows': 7, 'created': 2, 'updated': 0,
+                                 'unchanged': 0, 'errors': 5})
+        self.assertEqual([number for number, _ in importer.errors],
+                         [3, 4, 5, 6, 7])
+        self.assertIn('Unknown product type', importer.errors[0][1])
+        phone = Item.objects.get(slug='phone')
+        self.assertEqual((phone.price, phone.discount_price,
+                          phone.effective_price), (300.0, 250.0, 250.0))
+        self.assertEqual(Item.objects.get(slug='book-1').price, 10.5)
+
+    def test_malformed_jsonl_lines(self):
+        print("\n[TEST] Зіпсовані рядки JSONL не зупиняють імпорт")
+        path = os.path.join(self.dir.name, 'catalog.jsonl')
+        with open(path, 'w') as f:
+            f.write(json.dumps(book(1)) + '\n')
+            f.write('{"type": "book", "title": \n')
+            f.write('[1, 2]\n')
+            f.write('"book"\n')
+            f.write(json.dumps(book(2)) + '\n')
+
+        importer = CatalogImporter()
+        stats = importer.run(read_rows(path))
+        print(f"  Помилки: {importer.errors}")
+        self.assertEqual((stats['rows'], stats['created'], stats['errors']),
+                         (5, 2, 3))
+        self.assertEqual([number for number, _ in importer.errors], [2, 3, 4])
+        self.assertIn('Invalid JSON', importer.errors[0][1])
+        self.assertIn('Expected an object', importer.errors[1][1])
+
+    def test_upsert_by_slug(self):
+        print("\n[TEST] Наявні товари оновлюються за slug")
+        Item.objects.create(title='Old', slug='book-1', price=1.0,
+                            category='SW', label='D', description='')
+        cache.set(PRODUCT_SLUG_KEY.format(slug='book-1'), (1, 1))
+        path = os.path.join(self.dir.name, 'catalog.jsonl')
+        with open(path, 'w') as f:
+            for row in [book(1), book(2), book(2, price='12')]:
+                f.write(json.dumps(row) + '\n')
+
+        with self.assertNumQueries(5), \
+                self.captureOnCommitCallbacks(execute=True):
+            stats = CatalogImporter().run(read_rows(path))
+
+        self.assertEqual((stats['created'], stats['updated']), (1, 1))
+        updated = Item.objects.get(slug='book-1')
+        self.assertEqual((updated.title, updated.price, updated.category),
+                         ('Book 1', 10.5, 'S'))
+        self.assertEqual(Item.objects.get(slug='book-2').price, 12.0)
+        self.assertIsNone(cache.get(PRODUCT_SLUG_KEY.format(slug='book-1')))
+
+        # the same file again changes nothing and writes nothing
+        with self.assertNumQueries(3):
+            stats = CatalogImporter().run(read_rows(path))
+        self.assertEqual(stats['unchanged'], 2)
+        self.assertEqual(Item.objects.get(slug='book-1').updated_at,
+                         updated.updated_at)
+
+    def test_resume_from_checkpoint(self):
+        print("\n[TEST] Перерваний імпорт продовжується з контрольної точки")
+        path = self.write_csv([book(n) for n in range(10)])
+        checkpoint = path + '.checkpoint'
+        save_checkpoint(checkpoint, path, 6)
+        self.assertEqual(load_checkpoint(checkpoint, path), 6)
+
+        stats = CatalogImporter(batch_size=3).run(read_rows(path), skip=6)
+        self.assertEqual(stats['created'], 4)
+        self.assertEqual(sorted(Item.objects.values_list('slug', flat=True)),
+                         ['book-6', 'book-7', 'book-8', 'book-9'])
+
+        # a changed file does not match the checkpoint
+        self.write_csv([book(n) for n in range(11)])
+        self.assertEqual(load_checkpoint(checkpoint, path), 0)
+
+    def test_command(self):
+        print("\n[TEST] Команда import_catalog звітує про хід імпорту")
+        path = self.write_csv([book(n) for n in range(2500)])
+        out = StringIO()
+        with override_settings(SEARCH_INDEX_DIR=self.dir.name):
+            call_command('import_catalog', path, '--batch-size', '1000',
+                         stdout=out, stderr=StringIO())
+
+        print(f"  {out.getvalue().splitlines()[-1]}")
+        self.assertEqual(Item.objects.count(), 2500)
+        self.assertEqual(out.getvalue().count('rows/s'), 3)
+        self.assertFalse(os.path.exists(path + '.checkpoint'))
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,136 @@
+import unittest
+
+from tests import db  # noqa: F401
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.utils import timezone
+
+from core.checkout import CheckoutError, finalize_order, save_checkout_addresses
+from core.models import Address, Item, Order, OrderItem
+
+# SAVEPOINT та RELEASE від transaction.atomic всередині TestCase
+ATOMIC = 2
+# Без RETURNING bulk_create не повертає id, тож адреси вставляються поштучно
+BULK_INSERT = connection.features.can_return_rows_from_bulk_insert
+
+
+def address_data(prefix, **extra):
+    data = {
+        f'{prefix}_address': '1 Main St',
+        f'{prefix}_address2': 'Apt 2',
+        f'{prefix}_country': 'US',
+        f'{prefix}_zip': '10001',
+    }
+    data.update(extra)
+    return data
+
+
+class TestCheckoutAddresses(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create(username='buyer')
+        self.order = Order.objects.create(
+            user=self.user, ordered_date=timezone.now())
+
+    def add_default(self, address_type):
+        return Address.objects.create(
+            user=self.user, street_address='Old St', apartment_address='',
+            country='US', zip='1', address_type=address_type, default=True)
+
+    def test_new_shipping_same_billing(self):
+        print("\n[TEST] Нова адреса доставки + така сама адреса оплати")
+        data = address_data('shipping', same_billing_address=True)
+
+        # INSERT адрес + один UPDATE замовлення
+        budget = ATOMIC + (1 if BULK_INSERT else 2) + 1
+        with self.assertNumQueries(budget):
+            save_checkout_addresses(self.user, self.order, data)
+
+        self.order.refresh_from_db()
+        print(f"  Запитів: {budget}")
+        self.assertEqual(self.order.shipping_address.address_type, 'S')
+        self.assertEqual(self.order.billing_address.address_type, 'B')
+        self.assertNotEqual(self.order.shipping_address_id,
+                            self.order.billing_address_id)
+
+    def test_both_defaults_one_lookup(self):
+        print("\n[TEST] Обидві адреси за замовчуванням одним SELECT")
+        shipping = self.add_default('S')
+        billing = self.add_default('B')
+        data = {'use_default_shipping': True, 'use_default_billing': True}
+
+        # SELECT адрес за замовчуванням + UPDATE замовлення
+        with self.assertNumQueries(ATOMIC + 2):
+            save_checkout_addresses(self.user, self.order, data)
+
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.shipping_address, shipping)
+        self.assertEqual(self.order.billing_address, billing)
+
+    def test_new_default_replaces_old(self):
+        print("\n[TEST] Нова адреса за замовчуванням знімає прапорець зі старої")
+        old = self.add_default('S')
+        data = address_data('shipping', set_default_shipping=True,
+                            use_default_billing=True)
+        self.add_default('B')
+
+        save_checkout_addresses(self.user, self.order, data)
+
+        old.refresh_from_db()
+        self.assertFalse(old.default)
+        self.assertEqual(
+            Address.objects.filter(user=self.user, address_type='S',
+                                   default=True).get(),
+            Order.objects.get(pk=self.order.pk).shipping_address)
+
+    def test_missing_fields_roll_back(self):
+        print("\n[TEST] Помилка у формі відкочує всю транзакцію")
+        data = address_data('shipping', billing_address='')
+
+        with self.assertRaises(CheckoutError):
+            save_checkout_addresses(self.user, self.order, data)
+
+        self.assertFalse(Address.objects.exists())
+        self.order.refresh_from_db()
+        self.assertIsNone(self.order.shipping_address)
+
+
+class TestFinalizeOrder(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create(username='buyer')
+
+    def make_order(self, lines):
+        order = Order.objects.create(
+            user=self.user, ordered_date=timezone.now())
+        Item.objects.bulk_create([
+            Item(title=f'Item {i}', price=10.0, category='S', label='P',
+                 slug=f'item-{lines}-{i}', description='')
+            for i in range(lines)
+        ])
+        for item in Item.objects.filter(slug__startswith=f'item-{lines}-'):
+            order.items.add(
+                OrderItem.objects.create(user=self.user, item=item))
+        return Order.objects.get(pk=order.pk)
+
+    def test_constant_statements(self):
+        print("\n[TEST] finalize_order: сталий бюджет запитів для будь-якого кошика")
+        # SELECT суми + INSERT Payment + UPDATE позицій + UPDATE замовлення
+        for lines in (1, 20):
+            order = self.make_order(lines)
+            with self.assertNumQueries(ATOMIC + 4):
+                payment = finalize_order(order, {'id': f'ch_{lines}'})
+            print(f"  {lines} позицій -> {ATOMIC + 4} запитів")
+
+            self.assertAlmostEqual(payment.amount, 10.0 * lines)
+            self.assertFalse(order.items.filter(ordered=False).exists())
+            order.refresh_from_db()
+            self.assertTrue(order.ordered)
+            self.assertEqual(order.payment, payment)
+            self.assertEqual(len(order.ref_code), 20)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,85 @@
+import unittest
+
+from tests import db  # noqa: F401
+
+from django.db.models import F
+from django.test import TestCase
+
+from core.models import Item
+from core.pagination import KeysetPaginator
+
+
+def make_item(slug, price, discount_price=None):
+    return Item.objects.create(
+        title=slug, slug=slug, category='S', label='P', price=price,
+        discount_price=discount_price, description='')
+
+
+def stored(slug):
+    return Item.objects.values_list('effective_price', flat=True).get(
+        slug=slug)
+
+
+class TestEffectivePrice(TestCase):
+
+    def test_save(self):
+        print("\n[TEST] save() зберігає фактичну ціну")
+        item = make_item('tee', 20.0, 15.0)
+        self.assertEqual(stored('tee'), 15.0)
+
+        item.discount_price = 0
+        item.save(update_fields=['discount_price'])
+        print(f"  Без знижки: {stored('tee')}")
+        self.assertEqual(stored('tee'), 20.0)
+
+    def test_queryset_update(self):
+        print("\n[TEST] update() перераховує ціну з нових значень")
+        make_item('tee', 20.0, 15.0)
+        make_item('polo', 30.0)
+
+        Item.objects.filter(slug='tee').update(discount_price=None)
+        self.assertEqual(stored('tee'), 20.0)
+
+        Item.objects.update(price=F('price') * 2)
+        self.assertEqual(stored('tee'), 40.0)
+        self.assertEqual(stored('polo'), 60.0)
+
+        Item.objects.filter(slug='polo').update(price=10.0, discount_price=8)
+        self.assertEqual(stored('polo'), 8.0)
+
+    def test_bulk_create_and_update(self):
+        print("\n[TEST] bulk_create та bulk_update")
+        Item.objects.bulk_create([
+            Item(title='a', slug='a', category='S', label='P', price=5.0,
+                 discount_price=4.0, description=''),
+            Item(title='b', slug='b', category='S', label='P', price=7.0,
+                 description=''),
+        ])
+        self.assertEqual((stored('a'), stored('b')), (4.0, 7.0))
+
+        items = list(Item.objects.order_by('slug'))
+        items[0].discount_price = None
+        items[1].price = 9.0
+        Item.objects.bulk_update(items, ['price', 'discount_price'])
+        self.assertEqual((stored('a'), stored('b')), (5.0, 9.0))
+
+    def test_sorted_pages(self):
+        print("\n[TEST] Сторінки за ціною через keyset-пагінацію")
+        for i, price in enumerate([30.0, 10.0, 20.0, 10.0, 40.0]):
+            make_item(f'item-{i}', price)
+
+        paginator = KeysetPaginator(
+            Item.objects.all(), 2, ('-effective_price', '-pk'))
+        prices, cursor = [], None
+        while True:
+            page = paginator.page(after=cursor)
+            prices += [item.effective_price for item in page]
+            if not page.has_next():
+                break
+            cursor = page.next_cursor
+        print(f"  Ціни: {prices}")
+        self.assertEqual(prices, [40.0, 30.0, 20.0, 10.0, 10.0])
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,173 @@
+import unittest
+import csv
+import gzip
+import json
+import os
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from tests import db  # noqa: F401
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from core.exports import Export, export_csv
+from core.models import (Coupon, ExportWatermark, Item, Order, OrderItem,
+                         Payment)
+
+
+def make_item(slug, price=10.0):
+    return Item.objects.create(title=slug, slug=slug, price=price,
+                               category='S', label='P', description='')
+
+
+class TestExports(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+
+    def export(self, *args):
+        path = os.path.join(self.dir.name, 'out')
+        call_command('export', *args, '--output', path, stderr=StringIO())
+        return path
+
+    def make_order(self, username, items, coupon=None):
+        user = get_user_model().objects.create_user(
+            username, f'{username}@example.com', 'pass')
+        order = Order.objects.create(user=user, ordered_date=timezone.now(),
+                                     coupon=coupon)
+        for item, quantity in items:
+            order.items.add(OrderItem.objects.create(
+                user=user, item=item, quantity=quantity, ordered=True))
+        order.payment = Payment.objects.create(
+            user=user, stripe_charge_id=f'ch_{username}', amount=0)
+        order.ordered = True
+        order.ref_code = f'REF-{username}'
+        order.save()
+        return order
+
+    def test_incremental_item_export(self):
+        print("\n[TEST] Інкрементний експорт лише змінених товарів")
+        for n in range(5):
+            make_item(f'item-{n}')
+        with open(self.export('items', '--incremental')) as f:
+            rows = list(csv.DictReader(f))
+        self.assertEqual([row['slug'] for row in rows],
+                         [f'item-{n}' for n in range(5)])
+        self.assertEqual(rows[0]['price'], '10.0')
+
+        item = Item.objects.get(slug='item-2')
+        item.price = 12.0
+        item.save()
+        make_item('item-5')
+        with open(self.export('items', '--incremental')) as f:
+            rows = list(csv.DictReader(f))
+        print(f"  Другий експорт: {[row['slug'] for row in rows]}")
+        self.assertEqual([(row['slug'], row['price']) for row in rows],
+                         [('item-2', '12.0'), ('item-5', '10.0')])
+
+        with open(self.export('items', '--incremental')) as f:
+            self.assertEqual(list(csv.DictReader(f)), [])
+        self.assertEqual(ExportWatermark.objects.get(dataset='items').value,
+                         Item.objects.get(slug='item-5').updated_at
+                         .isoformat())
+
+    def test_late_commit_is_not_missed(self):
+        print("\n[TEST] Рядок, закомічений пізніше за експорт, не губиться")
+        for n in range(3):
+            make_item(f'item-{n}')
+        self.export('items', '--incremental')
+        watermark = Item.objects.get(slug='item-2').updated_at
+
+        # транзакція почалась раніше, тож updated_at менший за позначку
+        late = make_item('late')
+        Item.objects.filter(pk=late.pk).update(
+            updated_at=watermark - timedelta(seconds=1))
+        # update() на QuerySet теж оновлює updated_at
+        Item.objects.filter(slug='item-0').update(price=11.0)
+
+        with open(self.export('items', '--incremental')) as f:
+            rows = list(csv.DictReader(f))
+        print(f"  Другий експорт: {[row['slug'] for row in rows]}")
+        self.assertEqual(sorted(row['slug'] for row in rows),
+                         ['item-0', 'late'])
+        with open(self.export('items', '--incremental')) as f:
+            self.assertEqual(list(csv.DictReader(f)), [])
+
+    def test_overlap_is_bounded(self):
+        print("\n[TEST] Список уже експортованих рядків обмежений")
+        for n in range(5):
+            make_item(f'item-{n}')
+        # масове оновлення дає всім рядкам однаковий updated_at
+        Item.objects.update(price=11.0)
+        with mock.patch('core.exports.OVERLAP_ROWS', 3):
+            self.export('items', '--incremental')
+            overlap = json.loads(
+                ExportWatermark.objects.get(dataset='items').overlap)
+            print(f"  Збережено: {overlap}")
+            self.assertEqual([pk for pk, _ in overlap],
+                             list(Item.objects.order_by('pk').values_list(
+                                 'pk', flat=True))[2:])
+
+            # пошук починається з найстаршого збереженого рядка
+            with open(self.export('items', '--incremental')) as f:
+                self.assertEqual(list(csv.DictReader(f)), [])
+            make_item('item-5')
+            with open(self.export('items', '--incremental')) as f:
+                self.assertEqual([row['slug'] for row in csv.DictReader(f)],
+                                 ['item-5'])
+
+    def test_orders_as_gzipped_jsonl(self):
+        print("\n[TEST] Замовлення у JSONL зі стисненням gzip")
+        shirt, hat = make_item('shirt', 20.0), make_item('hat', 5.0)
+        coupon = Coupon.objects.create(code='FIVE', amount=5.0)
+        self.make_order('ann', [(shirt, 2), (hat, 1)], coupon)
+        self.make_order('bob', [(hat, 3)])
+        # an open cart is not an order yet
+        cart_user = get_user_model().objects.create_user('cat')
+        Order.objects.create(user=cart_user, ordered_date=timezone.now())
+
+        path = self.export('orders', '--format', 'jsonl', '--gzip')
+        with gzip.open(path, 'rt') as f:
+            orders = [json.loads(line) for line in f]
+        self.assertEqual(
+            [(o['ref_code'], o['total'], o['coupon'], o['charge_id'])
+             for o in orders],
+            [('REF-ann', 40.0, 'FIVE', 'ch_ann'),
+             ('REF-bob', 15.0, None, 'ch_bob')])
+
+    def test_rows_stream_from_one_query(self):
+        print("\n[TEST] Експорт читає рядки частинами одним запитом")
+        user = get_user_model().objects.create_user('ann')
+        Payment.objects.bulk_create([
+            Payment(user=user, stripe_charge_id=f'ch_{n}', amount=n)
+            for n in range(3000)])
+
+        export = Export('payments', chunk_size=500)
+        with self.assertNumQueries(1):
+            pieces = list(export)
+        print(f"  Рядків: {export.count}, частин: {len(pieces)}")
+        self.assertEqual(export.count, 3000)
+        self.assertEqual(len(pieces), 3)
+        self.assertEqual(export.last, str(Payment.objects.last().pk))
+
+    def test_admin_action(self):
+        print("\n[TEST] Дія адмінки віддає CSV потоком")
+        for n in range(3):
+            make_item(f'item-{n}')
+        response = export_csv('items')(
+            None, None, Item.objects.exclude(slug='item-1'))
+        content = b''.join(response.streaming_content).decode()
+        self.assertEqual(response['Content-Disposition'],
+                         'attachment; filename="items.csv"')
+        self.assertEqual([row['slug'] for row in csv.DictReader(
+            StringIO(content))], ['item-0', 'item-2'])
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
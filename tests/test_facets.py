@@ -0,0 +1,126 @@
+import unittest
+
+from tests import db  # noqa: F401
+
+from django.core import serializers
+from django.core.cache import cache
+from django.test import TestCase
+from django.utils import timezone
+
+from core.facets import (
+    count_items, facet_counts, filter_items, get_facet_cells, parse_filters,
+    rebuild_facet_counts
+)
+from core.models import Item, ItemFacetCount
+
+
+def make_item(slug, category='S', label='P', price=20.0, discount_price=None):
+    return Item.objects.create(
+        title=slug, slug=slug, category=category, label=label, price=price,
+        discount_price=discount_price, description='')
+
+
+class TestFacets(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        make_item('tee', price=10.0)
+        make_item('polo', price=40.0, discount_price=20.0)
+        make_item('hoodie', category='SW', price=60.0)
+        make_item('parka', category='OW', label='D', price=150.0)
+
+    def cells(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            pass
+        return get_facet_cells()
+
+    def test_counts_follow_item_changes(self):
+        print("\n[TEST] Лічильники фасетів оновлюються при зміні товарів")
+        self.assertEqual(count_items(self.cells(), {'category': 'S'}), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            hoodie = Item.objects.get(slug='hoodie')
+            hoodie.category = 'S'
+            hoodie.save()
+            Item.objects.get(slug='parka').delete()
+
+        cells = get_facet_cells()
+        print(f"  Комірок: {len(cells)}")
+        self.assertEqual(count_items(cells, {'category': 'S'}), 3)
+        self.assertEqual(count_items(cells, {'category': 'OW'}), 0)
+        self.assertEqual(count_items(cells, {}), 3)
+        self.assertFalse(ItemFacetCount.objects.filter(count__lt=0).exists())
+
+    def test_counts_follow_bulk_changes(self):
+        print("\n[TEST] Лічильники фасетів при update(), bulk_update(), "
+              "bulk_create()")
+        self.assertEqual(count_items(self.cells(), {'category': 'S'}), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            # фільтр перестає збігатися з рядками після оновлення
+            Item.objects.filter(category='S').update(category='SW')
+        self.assertEqual(count_items(get_facet_cells(), {'category': 'SW'}),
+                         3)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            parka = Item.objects.get(slug='parka')
+            parka.discount_price = 90.0
+            Item.objects.bulk_update([parka], ['discount_price'])
+            Item.objects.bulk_create([
+                Item(title='cap', slug='cap', category='S', label='P',
+                     price=5.0, description='')])
+        cells = get_facet_cells()
+        self.assertEqual(count_items(cells, {'on_discount': True}), 2)
+        self.assertEqual(count_items(cells, {'price_bucket': 2}), 2)
+        self.assertEqual(count_items(cells, {'category': 'S'}), 1)
+
+        counts = list(ItemFacetCount.objects.filter(count__gt=0).values_list(
+            'category', 'label', 'price_bucket', 'on_discount', 'count'))
+        rebuild_facet_counts()
+        self.assertCountEqual(
+            counts, ItemFacetCount.objects.values_list(
+                'category', 'label', 'price_bucket', 'on_discount', 'count'))
+
+    def test_cached_counts_need_no_queries(self):
+        print("\n[TEST] Лічильники з кешу без запитів до БД")
+        self.cells()
+        with self.assertNumQueries(0):
+            cells = get_facet_cells()
+            counts = facet_counts(
+                cells, {'category': 'S', 'price_bucket': 0})
+        print(f"  Категорії при ціні до $25: {dict(counts['category'])}")
+        self.assertEqual(counts['category'], {'S': 2})
+        self.assertEqual(counts['price_bucket'], {0: 2})
+        self.assertEqual(counts['on_discount'], {False: 1, True: 1})
+
+    def test_listing_matches_counts(self):
+        print("\n[TEST] Відфільтрований список збігається з лічильниками")
+        cells = self.cells()
+        for params in ({'category': 'S'}, {'price': '0'}, {'discount': '1'},
+                       {'label': 'D', 'price': '3'}, {'price': '9'}):
+            filters = parse_filters(params)
+            listed = filter_items(Item.objects.all(), filters).count()
+            self.assertEqual(listed, count_items(cells, filters), params)
+
+    def test_rebuild(self):
+        print("\n[TEST] Перерахунок після оновлень в обхід сигналів")
+        Item.objects.filter(slug='tee').update(category='OW')
+        self.assertEqual(rebuild_facet_counts(), 4)
+        self.assertEqual(count_items(self.cells(), {'category': 'OW'}), 2)
+
+    def test_fixtures_are_skipped(self):
+        print("\n[TEST] Завантаження фікстур (raw) не змінює лічильники")
+        before = count_items(self.cells(), {})
+        fixture = serializers.serialize('json', [
+            Item(pk=100, title='cap', slug='cap', category='S', label='P',
+                 price=5.0, effective_price=5.0, description='',
+                 updated_at=timezone.now())])
+        # так зберігає рядки loaddata
+        for obj in serializers.deserialize('json', fixture):
+            obj.save()
+        self.assertEqual(count_items(self.cells(), {}), before)
+        self.assertEqual(rebuild_facet_counts(), before + 1)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
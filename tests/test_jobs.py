@@ -0,0 +1,163 @@
+import unittest
+from unittest import mock
+from datetime import timedelta
+
+from tests import db  # noqa: F401
+
+from django.core import mail
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from core.jobs import (
+    JobError, backoff, claim_jobs, enqueue, job, release_stale_jobs,
+    run_pending_jobs
+)
+from core.models import Job, Order
+from core.notifications import EmailBatcher
+from core.patterns.abstract_factory import QueuedEmailNotificationService
+from core.tasks import send_order_confirmation
+
+calls = []
+
+
+@job('tests.record')
+def record(value, fail_times=0):
+    calls.append(value)
+    if calls.count(value) <= fail_times:
+        raise RuntimeError(f'{value} failed')
+
+
+class TestJobQueue(TestCase):
+
+    def setUp(self):
+        calls.clear()
+
+    def test_priority_and_schedule(self):
+        print("\n[TEST] Пріоритети та відкладені завдання")
+        enqueue(record, value='low')
+        enqueue(record, value='high', priority=10)
+        enqueue(record, value='later', priority=20, delay=60)
+        enqueue('tests.record', value='normal')
+
+        while run_pending_jobs():
+            pass
+        print(f"  Порядок: {calls}")
+        self.assertEqual(calls, ['high', 'low', 'normal'])
+        self.assertEqual(Job.objects.get(status='queued').payload,
+                         '{"value": "later"}')
+
+        Job.objects.filter(status='queued').update(run_at=timezone.now())
+        self.assertEqual(run_pending_jobs(), 1)
+        self.assertEqual(Job.objects.filter(status='done').count(), 4)
+
+    def test_unknown_job(self):
+        print("\n[TEST] Невідоме завдання -> JobError")
+        with self.assertRaises(JobError):
+            enqueue('tests.missing')
+
+    def test_claimed_job_is_not_handed_out_twice(self):
+        print("\n[TEST] Завдання отримує лише один воркер")
+        enqueue(record, value='a')
+        enqueue(record, value='b')
+        first = claim_jobs('worker-1', limit=1)
+        second = claim_jobs('worker-2', limit=5)
+        self.assertEqual([j.locked_by for j in first + second],
+                         ['worker-1', 'worker-2'])
+        self.assertEqual(claim_jobs('worker-3', limit=5), [])
+        self.assertEqual(first[0].attempts, 1)
+
+    @override_settings(JOB_RETRY_BACKOFF=10, JOB_MAX_BACKOFF=30)
+    def test_retry_with_backoff(self):
+        print("\n[TEST] Повтор із наростаючою затримкою")
+        self.assertEqual([backoff(n) for n in range(1, 5)], [10, 20, 30, 30])
+        enqueue(record, value='flaky', fail_times=1)
+
+        started = timezone.now()
+        self.assertEqual(run_pending_jobs(), 1)
+        retry = Job.objects.get()
+        print(f"  Після помилки: {retry.status}, спроба {retry.attempts}")
+        self.assertEqual((retry.status, retry.attempts), ('queued', 1))
+        self.assertIn('flaky failed', retry.error)
+        self.assertGreaterEqual(retry.run_at, started + timedelta(seconds=10))
+        self.assertEqual(run_pending_jobs(), 0)
+
+        Job.objects.update(run_at=timezone.now())
+        run_pending_jobs()
+        self.assertEqual(Job.objects.get().status, 'done')
+
+    def test_gives_up_after_max_attempts(self):
+        print("\n[TEST] Після max_attempts завдання позначається failed")
+        enqueue(record, value='broken', fail_times=10, max_attempts=2)
+        for _ in range(2):
+            Job.objects.update(run_at=timezone.now())
+            run_pending_jobs()
+        failed = Job.objects.get()
+        self.assertEqual((failed.status, failed.attempts), ('failed', 2))
+        self.assertIsNotNone(failed.finished_at)
+
+    @override_settings(JOB_LOCK_TIMEOUT=60)
+    def test_stale_jobs_are_released(self):
+        print("\n[TEST] Завдання зупиненого воркера повертаються в чергу")
+        enqueue(record, value='a')
+        enqueue(record, value='b', max_attempts=1)
+        claim_jobs('dead-worker', limit=2)
+        self.assertEqual(release_stale_jobs(), 0)
+
+        Job.objects.update(locked_at=timezone.now() - timedelta(minutes=5))
+        self.assertEqual(release_stale_jobs(), 2)
+        self.assertEqual(
+            dict(Job.objects.values_list('payload', 'status')),
+            {'{"value": "a"}': 'queued', '{"value": "b"}': 'failed'})
+
+    def test_queued_order_confirmation(self):
+        print("\n[TEST] Лист-підтвердження надсилається з черги")
+        user = get_user_model().objects.create_user('buyer')
+        order = Order.objects.create(user=user, ordered_date=timezone.now(),
+                                     ref_code='ref123')
+
+        result = QueuedEmailNotificationService().send_order_confirmation(
+            order, 'buyer@example.com')
+        self.assertTrue(result['queued'])
+        self.assertEqual(len(mail.outbox), 0)
+
+        # завдання завершується лише після відправки листа
+        with mock.patch('core.notifications._batcher',
+                        EmailBatcher(interval=0.05)):
+            run_pending_jobs()
+        self.assertEqual(Job.objects.get(pk=result['job_id']).status, 'done')
+        self.assertEqual(mail.outbox[0].subject, 'Order Confirmation - ref123')
+        self.assertEqual(mail.outbox[0].to, ['buyer@example.com'])
+
+    def test_failed_confirmation_is_retried(self):
+        print("\n[TEST] Невдала відправка листа повертає завдання в чергу")
+        user = get_user_model().objects.create_user('buyer')
+        order = Order.objects.create(user=user, ordered_date=timezone.now(),
+                                     ref_code='ref123')
+        job = enqueue(send_order_confirmation, order_id=order.pk,
+                      recipient='buyer@example.com')
+
+        def refuse(**kwargs):
+            raise ConnectionRefusedError('smtp down')
+
+        with mock.patch('core.notifications._batcher', EmailBatcher(
+                interval=0.01, max_attempts=1, connection_factory=refuse)):
+            run_pending_jobs()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('queued', 1))
+        self.assertIn('smtp down', job.error)
+        self.assertEqual(mail.outbox, [])
+
+        with self.settings(EMAIL_SEND_TIMEOUT=0.05), \
+                mock.patch('core.notifications._batcher',
+                           EmailBatcher(interval=60)):
+            Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+            run_pending_jobs()
+        job.refresh_from_db()
+        # лист не відправлено вчасно: його прибрано з черги
+        self.assertEqual(job.status, 'queued')
+        self.assertIn('not sent within', job.error)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
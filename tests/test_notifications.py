@@ -0,0 +1,149 @@
+import unittest
+import os
+import sys
+import time
+from decimal import Decimal
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'djecommerce.settings')
+
+import django
+from django.conf import settings
+
+if not hasattr(settings, 'STRIPE_SECRET_KEY'):
+    settings.STRIPE_SECRET_KEY = 'test_secret_key'
+
+django.setup()
+
+from django.core import mail
+from django.core.mail import EmailMessage
+from django.core.mail.backends.locmem import EmailBackend
+
+from core.notifications import EmailBatcher
+from core.patterns.abstract_factory import BatchedEmailNotificationService
+
+
+class MockOrder:
+    ref_code = 'ORDER-001'
+
+    def get_total(self):
+        return Decimal('150.00')
+
+
+class FlakyBackend(EmailBackend):
+    # locmem backend that counts connections and refuses some recipients
+    opened = 0
+    refuse = {}
+
+    def open(self):
+        FlakyBackend.opened += 1
+        if FlakyBackend.refuse.get('connect', 0):
+            FlakyBackend.refuse['connect'] -= 1
+            raise ConnectionRefusedError('smtp down')
+        return True
+
+    def send_messages(self, messages):
+        for message in messages:
+            if FlakyBackend.refuse.get(message.to[0], 0):
+                FlakyBackend.refuse[message.to[0]] -= 1
+                raise OSError(f'{message.to[0]} refused')
+        return super().send_messages(messages)
+
+
+def message(to):
+    return EmailMessage('Hi', 'Body', 'shop@example.com', [to])
+
+
+class TestEmailBatcher(unittest.TestCase):
+
+    def setUp(self):
+        mail.outbox = []
+        FlakyBackend.opened = 0
+        FlakyBackend.refuse = {}
+
+    def batcher(self, **kwargs):
+        kwargs.setdefault('interval', 60)
+        return EmailBatcher(connection_factory=FlakyBackend, **kwargs)
+
+    def test_full_batch_uses_one_connection(self):
+        print("\n[TEST] Повний пакет листів іде одним з'єднанням")
+        batcher = self.batcher(batch_size=20)
+        queued = [batcher.add(message(f'user{i}@example.com'))
+                  for i in range(20)]
+        self.assertTrue(queued[-1].done.wait(5))
+        print(f"  Листів: {len(mail.outbox)}, "
+              f"з'єднань: {FlakyBackend.opened}")
+        self.assertEqual(len(mail.outbox), 20)
+        self.assertEqual(FlakyBackend.opened, 1)
+        self.assertEqual({q.status for q in queued}, {'sent'})
+
+    def test_time_threshold(self):
+        print("\n[TEST] Неповний пакет надсилається за часом")
+        batcher = self.batcher(batch_size=100, interval=0.1)
+        started = time.monotonic()
+        queued = batcher.add(message('a@example.com'))
+        self.assertTrue(queued.done.wait(5))
+        self.assertGreaterEqual(time.monotonic() - started, 0.1)
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_failed_message_is_retried_alone(self):
+        print("\n[TEST] Помилка одного листа не зупиняє пакет")
+        FlakyBackend.refuse = {'bad@example.com': 1}
+        batcher = self.batcher(batch_size=100)
+        bad = batcher.add(message('bad@example.com'))
+        good = batcher.add(message('good@example.com'))
+
+        self.assertEqual(batcher.flush(), 2)
+        self.assertEqual((good.status, bad.status), ('sent', 'queued'))
+        self.assertEqual(bad.error, 'bad@example.com refused')
+
+        self.assertEqual(batcher.flush(), 1)
+        self.assertEqual((bad.status, bad.attempts), ('sent', 2))
+        self.assertEqual(batcher.stats, {'connections': 3, 'sent': 2,
+                                         'retried': 1, 'failed': 0})
+
+    def test_gives_up_after_max_attempts(self):
+        print("\n[TEST] Після max_attempts лист позначається failed")
+        FlakyBackend.refuse = {'connect': 10}
+        batcher = self.batcher(batch_size=100, max_attempts=2)
+        queued = [batcher.add(message(f'user{i}@example.com'))
+                  for i in range(3)]
+
+        batcher.flush()
+        batcher.flush()
+        self.assertEqual(FlakyBackend.opened, 2)
+        self.assertEqual([(q.status, q.attempts) for q in queued],
+                         [('failed', 2)] * 3)
+        self.assertEqual(queued[0].error, 'smtp down')
+        self.assertEqual(batcher.flush(), 0)
+
+    def test_close_sends_retries_too(self):
+        print("\n[TEST] close() відправляє все, включно з повторами")
+        FlakyBackend.refuse = {'bad@example.com': 1}
+        batcher = self.batcher(batch_size=100)
+        queued = [batcher.add(message(to))
+                  for to in ('bad@example.com', 'good@example.com')]
+
+        batcher.close()
+        self.assertEqual([q.status for q in queued], ['sent', 'sent'])
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(batcher.pending, [])
+
+    def test_notification_service(self):
+        print("\n[TEST] BatchedEmailNotificationService не чекає на SMTP")
+        batcher = self.batcher(batch_size=100)
+        service = BatchedEmailNotificationService(batcher)
+        result = service.send_order_confirmation(MockOrder(), 'a@example.com')
+        self.assertTrue(result['queued'])
+        self.assertEqual(len(mail.outbox), 0)
+
+        batcher.flush()
+        self.assertEqual(result['message'].status, 'sent')
+        self.assertEqual(mail.outbox[0].subject,
+                         'Order Confirmation - ORDER-001')
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
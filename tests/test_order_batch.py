@@ -0,0 +1,131 @@
+import threading
+import time
+import unittest
+
+from tests import db  # noqa: F401
+
+import stripe
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.utils import timezone
+
+from core.models import Coupon, Item, Order, OrderItem
+from core.patterns.abstract_factory import (
+    NotificationService, OrderProcessingFactory, OrderProcessor,
+    PaymentProcessor, StandardShipping
+)
+
+
+class RecordingPayment(PaymentProcessor):
+
+    def __init__(self):
+        self.charges = []
+        self.rate_limited = set()
+        self.lock = threading.Lock()
+
+    def process_payment(self, amount, currency="USD", token=None):
+        with self.lock:
+            if token == 'busy' and token not in self.rate_limited:
+                self.rate_limited.add(token)
+                raise stripe.error.RateLimitError('Too many requests')
+            self.charges.append((amount, token, time.monotonic()))
+        if token == 'broken':
+            raise ValueError('processor exploded')
+        return {'success': True, 'amount': amount}
+
+    def refund(self, charge_id, amount=None):
+        pass
+
+    def get_processor_name(self):
+        return 'Recording'
+
+
+class RecordingNotification(NotificationService):
+
+    def send_order_confirmation(self, order, recipient):
+        return {'success': True, 'to': recipient}
+
+
+class RecordingFactory(OrderProcessingFactory):
+
+    def create_payment_processor(self):
+        return RecordingPayment()
+
+    def create_shipping_method(self):
+        return StandardShipping()
+
+    def create_notification_service(self):
+        return RecordingNotification()
+
+
+class TestProcessOrders(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        item = Item.objects.create(title='T', slug='t', category='S',
+                                   label='P', price=10.0, description='')
+        coupon = Coupon.objects.create(code='C', amount=5.0)
+        for i in range(30):
+            user = get_user_model().objects.create_user(
+                f'user{i}', f'user{i}@example.com')
+            order = Order.objects.create(
+                user=user, ordered_date=timezone.now(),
+                coupon=coupon if i % 2 else None)
+            order.items.add(OrderItem.objects.create(
+                user=user, item=item, quantity=i + 1))
+
+    def setUp(self):
+        self.processor = OrderProcessor(RecordingFactory())
+        self.processor.RATE_LIMIT_BACKOFF = 0.01
+
+    def test_streams_every_order_with_chunked_queries(self):
+        print("\n[TEST] Пакетна обробка: запити лише на чанк")
+        # ids + одне вибирання на кожен чанк з 10 замовлень
+        with self.assertNumQueries(1 + 3):
+            results = list(self.processor.process_orders(
+                Order.objects.all(), max_workers=4, chunk_size=10))
+        print(f"  Оброблено {len(results)} замовлень")
+
+        self.assertEqual(len(results), 30)
+        self.assertTrue(all(result['success'] for result in results))
+        by_order = {result['order_id']: result for result in results}
+        order = Order.objects.select_related('user').get(
+            user__username='user3')
+        self.assertEqual(by_order[order.pk]['payment']['amount'], 35.0)
+        self.assertEqual(by_order[order.pk]['notification']['to'],
+                         'user3@example.com')
+
+    def test_failures_and_rate_limit_retries(self):
+        print("\n[TEST] RateLimitError повторюється, помилки не зупиняють")
+        ids = list(Order.objects.order_by('pk').values_list('pk', flat=True))
+        tokens = {ids[0]: 'busy', ids[1]: 'broken'}
+        results = {result['order_id']: result
+                   for result in self.processor.process_orders(
+                       ids[:5], tokens=tokens, max_workers=2)}
+
+        self.assertTrue(results[ids[0]]['success'])
+        self.assertEqual(results[ids[1]],
+                         {'success': False, 'error': 'processor exploded',
+                          'order_id': ids[1]})
+        self.assertEqual(sum(r['success'] for r in results.values()), 4)
+
+    def test_rate_limit(self):
+        print("\n[TEST] Обмеження частоти викликів оплати")
+        processor = OrderProcessor(RecordingFactory(), rate_limit=100)
+        list(processor.process_orders(Order.objects.all(), max_workers=8))
+        times = sorted(charge[2] for charge in processor.payment.charges)
+        print(f"  30 оплат за {(times[-1] - times[0]) * 1000:.0f} мс")
+        self.assertGreaterEqual(times[-1] - times[0], 29 / 100 * 0.9)
+
+    def test_stopping_early(self):
+        print("\n[TEST] Генератор можна зупинити посередині")
+        results = self.processor.process_orders(
+            Order.objects.all(), max_workers=2, chunk_size=5)
+        first = next(results)
+        results.close()
+        self.assertTrue(first['success'])
+        self.assertLess(len(self.processor.payment.charges), 30)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,134 @@
+import unittest
+
+from tests import db  # noqa: F401
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.utils import timezone
+
+from core.models import Address, Item, Order, OrderItem, OrderTemplate
+from core.order_templates import DELETED, DatabaseTemplateStore, version_key
+from core.patterns.prototype import OrderPrototype, OrderTemplateManager
+
+
+class TestDatabaseTemplateStore(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user('ann')
+        self.address = Address.objects.create(
+            user=self.user, street_address='1 Main St', apartment_address='',
+            country='US', zip='10001', address_type='S')
+        self.items = [
+            Item.objects.create(title=f'Item {n}', slug=f'item-{n}',
+                                price=10.0, category='S', label='P',
+                                description='')
+            for n in range(3)
+        ]
+
+    def prototype(self, quantities):
+        prototype = OrderPrototype(
+            user=self.user,
+            items=[{'item': item, 'quantity': quantity}
+                   for item, quantity in zip(self.items, quantities)],
+            shipping_address=self.address
+        )
+        prototype.preferences['coupon_code'] = 'SAVE10'
+        return prototype
+
+    def manager(self, **kwargs):
+        # one manager per simulated worker process
+        return OrderTemplateManager(DatabaseTemplateStore(**kwargs))
+
+    def register(self, manager, name, prototype):
+        with self.captureOnCommitCallbacks(execute=True):
+            manager.register_template(name, prototype)
+
+    def test_templates_survive_the_process(self):
+        print("\n[TEST] Шаблон зберігається в БД і доступний іншому процесу")
+        self.register(self.manager(), 'weekly', self.prototype([1, 2, 3]))
+        payload = OrderTemplate.objects.get(name='weekly').payload
+        print(f"  Збережено: {payload}")
+
+        order = self.manager().create_order('weekly')
+        self.assertEqual(order.user, self.user)
+        self.assertEqual(order.shipping_address, self.address)
+        self.assertEqual([(line['item'], line['quantity'])
+                          for line in order.items],
+                         list(zip(self.items, [1, 2, 3])))
+        self.assertEqual(order.preferences, {'coupon_code': 'SAVE10'})
+        self.assertEqual(self.manager().list_templates(), ['weekly'])
+
+    def test_steady_state_checks_only_the_version(self):
+        print("\n[TEST] Повторне створення замовлення без запитів до БД")
+        self.register(self.manager(), 'weekly', self.prototype([1, 2, 3]))
+        manager = self.manager()
+        # версія вже в кеші: шаблон з користувачем, адреси, товари
+        with self.assertNumQueries(3):
+            manager.create_order('weekly')
+        with self.assertNumQueries(0):
+            first = manager.create_order('weekly')
+            second = manager.create_order('weekly')
+        first.items[0]['quantity'] = 9
+        self.assertEqual(second.items[0]['quantity'], 1)
+
+    def test_update_reaches_other_workers(self):
+        print("\n[TEST] Зміна шаблону видна в усіх процесах")
+        worker_a, worker_b = self.manager(), self.manager()
+        self.register(worker_a, 'weekly', self.prototype([1, 1, 1]))
+        self.assertEqual(len(worker_b.create_order('weekly').items), 3)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            worker_a.update_template('weekly', self.prototype([5]))
+        order = worker_b.create_order('weekly')
+        self.assertEqual([line['quantity'] for line in order.items], [5])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            worker_a.delete_template('weekly')
+        with self.assertRaises(ValueError):
+            worker_b.create_order('weekly')
+
+    def test_delete_leaves_a_tombstone(self):
+        print("\n[TEST] Видалення залишає надгробок замість старої версії")
+        self.register(self.manager(), 'weekly', self.prototype([1]))
+        old = OrderTemplate.objects.get(name='weekly').version
+        with self.captureOnCommitCallbacks(execute=True):
+            self.manager().delete_template('weekly')
+        # процес, що прочитав стару версію до видалення, не поверне її
+        self.assertFalse(cache.add(version_key('weekly'), old))
+        self.assertNotIn('weekly', self.manager().templates)
+
+        # без запису в кеші версія читається з БД
+        cache.clear()
+        self.assertNotIn('weekly', self.manager().templates)
+        self.assertEqual(cache.get(version_key('weekly')), DELETED)
+
+    def test_lru_is_bounded(self):
+        print("\n[TEST] Кеш шаблонів у пам'яті обмежений за розміром")
+        manager = self.manager(max_size=2)
+        for n in range(3):
+            self.register(manager, f'template {n}', self.prototype([n + 1]))
+        self.assertEqual(list(manager.templates._lru),
+                         ['template 1', 'template 2'])
+        self.assertEqual(
+            manager.create_order('template 0').items[0]['quantity'], 1)
+        self.assertEqual(list(manager.templates._lru),
+                         ['template 2', 'template 0'])
+
+    def test_from_order(self):
+        print("\n[TEST] Шаблон із наявного замовлення")
+        order = Order.objects.create(user=self.user, ordered=True,
+                                     ordered_date=timezone.now())
+        for item in self.items:
+            order.items.add(OrderItem.objects.create(
+                user=self.user, item=item, quantity=2, ordered=True))
+        self.register(self.manager(), 'again',
+                      OrderPrototype.from_order(order))
+        clone = self.manager().create_order('again')
+        self.assertEqual(sorted(line['item'].slug for line in clone.items),
+                         ['item-0', 'item-1', 'item-2'])
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,60 @@
+import unittest
+
+from tests import db  # noqa: F401
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.utils import timezone
+
+from core.models import Coupon, Item, Order, OrderItem
+
+
+class TestOrderTotals(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create(username='buyer')
+        self.shirt = Item.objects.create(
+            title='Shirt', price=20.0, discount_price=15.0,
+            category='S', label='P', slug='shirt', description='')
+        self.jacket = Item.objects.create(
+            title='Jacket', price=50.0, discount_price=0,
+            category='OW', label='S', slug='jacket', description='')
+        self.order = Order.objects.create(
+            user=self.user, ordered_date=timezone.now())
+        self.order.items.add(
+            OrderItem.objects.create(user=self.user, item=self.shirt, quantity=2),
+            OrderItem.objects.create(user=self.user, item=self.jacket, quantity=1)
+        )
+
+    def test_get_total_single_query(self):
+        print("\n[TEST] Order.get_total рахується одним запитом")
+        self.order.coupon = Coupon.objects.create(code='SAVE5', amount=5.0)
+        self.order.save()
+        order = Order.objects.get(pk=self.order.pk)
+
+        with self.assertNumQueries(1):
+            total = order.get_total()
+
+        print(f"  Сума замовлення: {total}")
+        self.assertAlmostEqual(total, 2 * 15.0 + 50.0 - 5.0)
+
+    def test_with_totals_annotates_many_orders(self):
+        print("\n[TEST] Order.objects.with_totals() для списку замовлень")
+        other = get_user_model().objects.create(username='browser')
+        empty = Order.objects.create(user=other, ordered_date=timezone.now())
+
+        with self.assertNumQueries(1):
+            totals = {o.pk: o.get_total() for o in Order.objects.with_totals()}
+
+        print(f"  Суми: {totals}")
+        self.assertAlmostEqual(totals[self.order.pk], 80.0)
+        self.assertEqual(totals[empty.pk], 0)
+
+    def test_matches_python_total(self):
+        print("\n[TEST] Результат збігається з підсумком по OrderItem")
+        expected = sum(i.get_final_price() for i in self.order.items.all())
+        self.assertAlmostEqual(self.order.get_total(), expected)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
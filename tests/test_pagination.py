@@ -0,0 +1,83 @@
+import unittest
+import base64
+import json
+
+from tests import db  # noqa: F401
+
+from django.core.paginator import InvalidPage
+from django.test import TestCase
+
+from core.models import Item
+from core.pagination import KeysetPaginator
+
+
+class TestKeysetPaginator(TestCase):
+
+    def setUp(self):
+        Item.objects.bulk_create([
+            Item(title=f'Item {i}', price=10 + i % 4, category='S',
+                 label='P', slug=f'item-{i}', description='')
+            for i in range(25)
+        ])
+        self.paginator = KeysetPaginator(Item.objects.all(), 10)
+
+    def test_walk_forward_and_back(self):
+        print("\n[TEST] Перехід сторінками вперед і назад за курсором")
+        first = self.paginator.page()
+        second = self.paginator.page(after=first.next_cursor)
+        third = self.paginator.page(after=second.next_cursor)
+
+        print(f"  Розміри сторінок: {len(first)}, {len(second)}, {len(third)}")
+        self.assertEqual([len(first), len(second), len(third)], [10, 10, 5])
+        self.assertFalse(first.has_previous())
+        self.assertFalse(third.has_next())
+
+        back = self.paginator.page(before=third.previous_cursor)
+        self.assertEqual([i.pk for i in back], [i.pk for i in second])
+        self.assertTrue(back.has_previous())
+        self.assertTrue(back.has_next())
+
+    def test_page_is_one_query(self):
+        print("\n[TEST] Сторінка завантажується одним запитом без COUNT")
+        first = self.paginator.page()
+        with self.assertNumQueries(1):
+            self.paginator.page(after=first.next_cursor)
+
+    def test_stable_under_inserts(self):
+        print("\n[TEST] Нові товари не зсувають наступну сторінку")
+        expected = [i.pk for i in Item.objects.order_by('pk')[10:20]]
+        cursor = self.paginator.page().next_cursor
+
+        Item.objects.create(title='New', price=1, category='S', label='P',
+                            slug='new', description='')
+
+        self.assertEqual(
+            [i.pk for i in self.paginator.page(after=cursor)], expected)
+
+    def test_compound_descending_ordering(self):
+        print("\n[TEST] Курсор за кількома полями (-price, pk)")
+        paginator = KeysetPaginator(Item.objects.all(), 7, ordering=('-price',))
+        seen = []
+        page = paginator.page()
+        seen.extend(page)
+        while page.has_next():
+            page = paginator.page(after=page.next_cursor)
+            seen.extend(page)
+
+        expected = list(Item.objects.order_by('-price', 'pk'))
+        self.assertEqual(seen, expected)
+
+    def test_invalid_cursor(self):
+        print("\n[TEST] Некоректний курсор")
+        with self.assertRaises(InvalidPage):
+            self.paginator.page(after='not-a-cursor')
+        # правильний JSON, але значення не того типу
+        for values in (['abc'], [[1]], [None]):
+            cursor = base64.urlsafe_b64encode(
+                json.dumps(values).encode()).decode()
+            with self.assertRaises(InvalidPage):
+                self.paginator.page(after=cursor)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,85 @@
+import unittest
+
+from tests import db  # noqa: F401
+
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.test import TestCase
+
+from core.models import Item
+from core.product_cache import get_product_html, set_product_html
+
+
+class TestProductCache(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.item = Item.objects.create(
+            title='Shirt', price=20.0, category='S', label='P',
+            slug='shirt', description='Cotton')
+
+    def test_cached_fragment_needs_no_queries(self):
+        print("\n[TEST] Сторінка товару з кешу без запитів до БД")
+        self.assertIsNone(get_product_html('shirt'))
+        set_product_html(self.item, '<p>Cotton</p>')
+
+        with self.assertNumQueries(0):
+            html = get_product_html('shirt')
+
+        self.assertEqual(html, '<p>Cotton</p>')
+
+    def test_save_invalidates_fragment(self):
+        print("\n[TEST] Збереження товару робить фрагмент застарілим")
+        stale = Item.objects.get(pk=self.item.pk)
+        set_product_html(self.item, '<p>Cotton</p>')
+
+        self.item.description = 'Linen'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.item.save()
+        self.assertIsNone(get_product_html('shirt'))
+
+        set_product_html(stale, '<p>Cotton</p>')
+        print("  Рендер зі старою версією не потрапляє в кеш")
+        self.assertIsNone(get_product_html('shirt'))
+
+        set_product_html(self.item, '<p>Linen</p>')
+        self.assertEqual(get_product_html('shirt'), '<p>Linen</p>')
+
+    def test_save_with_update_fields(self):
+        print("\n[TEST] save(update_fields=...) теж оновлює версію")
+        set_product_html(self.item, '<p>$20</p>')
+        self.item.price = 25.0
+        with self.captureOnCommitCallbacks(execute=True):
+            self.item.save(update_fields=['price'])
+        self.assertIsNone(get_product_html('shirt'))
+        self.assertEqual(Item.objects.get(pk=self.item.pk).updated_at,
+                         self.item.updated_at)
+
+    def test_slug_change_and_delete(self):
+        print("\n[TEST] Зміна slug та видалення товару")
+        set_product_html(self.item, '<p>Cotton</p>')
+
+        self.item.slug = 'cotton-shirt'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.item.save()
+        self.assertIsNone(get_product_html('shirt'))
+
+        set_product_html(self.item, '<p>Cotton</p>')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.item.delete()
+        self.assertIsNone(get_product_html('cotton-shirt'))
+
+    def test_rolled_back_save_keeps_fragment(self):
+        print("\n[TEST] Відкочене збереження не скидає кеш")
+        set_product_html(self.item, '<p>Cotton</p>')
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(IntegrityError):
+                with transaction.atomic():
+                    self.item.description = 'Linen'
+                    self.item.save()
+                    raise IntegrityError
+        self.assertEqual(get_product_html('shirt'), '<p>Cotton</p>')
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
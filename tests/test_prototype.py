@@ -1,6 +1,8 @@
 import unittest
+import copy
 import os
 import sys
+import time
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.insert(0, BASE_DIR)
@@ -22,6 +24,23 @@ class MockUser:
     username = "test_user"
 
 
+class HeavyModel:
+    # stands in for a model instance with a large related-object cache
+    def __init__(self, size):
+        self.cache = [{'row': i, 'data': [i] * 5} for i in range(size)]
+
+
+def heavy_prototype(graph_size, lines=20):
+    model = HeavyModel(graph_size)
+    prototype = OrderPrototype(
+        user=model,
+        items=[{'item': model, 'quantity': 1} for _ in range(lines)],
+        shipping_address=model
+    )
+    prototype.preferences['coupon_code'] = 'SAVE10'
+    return prototype
+
+
 class TestPrototypePattern(unittest.TestCase):
     
     def test_prototype_clone(self):
@@ -87,6 +106,58 @@ class TestPrototypePattern(unittest.TestCase):
         self.assertIsNot(order1, order2)
         print("  Результат: Кожне замовлення є незалежним клоном шаблону")
 
+    def test_clone_shares_models(self):
+        print("\n[TEST] Клон посилається на ті самі моделі, а рядки копіює")
+        original = heavy_prototype(10)
+        clone = original.clone()
+
+        self.assertIs(clone.user, original.user)
+        self.assertIs(clone.shipping_address, original.shipping_address)
+        self.assertIs(clone.items[0]['item'], original.items[0]['item'])
+        self.assertIsNot(clone.items[0], original.items[0])
+
+        clone.items[0]['quantity'] = 5
+        clone.preferences['coupon_code'] = 'OTHER'
+        self.assertEqual(original.items[0]['quantity'], 1)
+        self.assertEqual(original.preferences['coupon_code'], 'SAVE10')
+
+    def test_lazy_clone_copies_on_write(self):
+        print("\n[TEST] Лінивий клон копіює дані лише при зміні")
+        manager = OrderTemplateManager()
+        template = heavy_prototype(10, lines=3)
+        manager.register_template("weekly", template)
+        clone = manager.create_order("weekly", lazy=True)
+
+        self.assertEqual(len(clone.items), 3)
+        self.assertIsNone(clone.items._lines)
+        clone.items[1]['quantity'] = 4
+        clone.items.append({'item': None, 'quantity': 2})
+        del clone.items[0]
+        clone.preferences['gift'] = True
+
+        self.assertEqual([line['quantity'] for line in clone.items], [4, 1, 2])
+        self.assertEqual([line['quantity'] for line in template.items],
+                         [1, 1, 1])
+        self.assertNotIn('gift', template.preferences)
+        self.assertEqual(copy.deepcopy(clone).items, clone.items)
+
+    def test_clone_cost_ignores_model_size(self):
+        print("\n[TEST] Вартість клонування не залежить від розміру моделей")
+        for graph_size in (10, 1000, 10000):
+            prototype = heavy_prototype(graph_size)
+            timings = []
+            for clone in (lambda: copy.deepcopy(prototype.__dict__),
+                          prototype.clone,
+                          lambda: prototype.clone(lazy=True)):
+                started = time.perf_counter()
+                for _ in range(20):
+                    clone()
+                timings.append((time.perf_counter() - started) / 20 * 1e6)
+            print(f"  Моделі з {graph_size} записами: deepcopy "
+                  f"{timings[0]:.0f} мкс, clone {timings[1]:.1f} мкс, "
+                  f"lazy {timings[2]:.1f} мкс")
+        self.assertLess(timings[1], timings[0])
+
 
 if __name__ == '__main__':
     unittest.main(verbosity=2)
\ No newline at end of file
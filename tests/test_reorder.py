@@ -0,0 +1,106 @@
+import unittest
+
+from tests import db  # noqa: F401
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.utils import timezone
+
+from core.cart import add_item, add_items, get_cart_item_count
+from core.models import Item, Order, OrderItem
+from core.patterns.prototype import ReorderService
+
+
+class TestReorder(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create(username='buyer')
+        Item.objects.bulk_create([
+            Item(title=f'Item {n}', slug=f'item-{n}', price=10.0,
+                 category='S', label='P', description='')
+            for n in range(50)
+        ])
+        self.items = list(Item.objects.order_by('pk'))
+
+    def past_order(self, items, user=None, quantity=2):
+        user = user or self.user
+        order = Order.objects.create(user=user, ordered_date=timezone.now())
+        OrderItem.objects.bulk_create([
+            OrderItem(user=user, item=item, quantity=quantity)
+            for item in items])
+        order.items.add(*OrderItem.objects.filter(
+            user=user, ordered=False, item__in=items))
+        OrderItem.objects.filter(user=user, ordered=False).update(
+            ordered=True)
+        Order.objects.filter(pk=order.pk).update(ordered=True)
+        return order
+
+    def test_query_count_does_not_grow_with_lines(self):
+        print("\n[TEST] Повторне замовлення: кількість запитів не залежить "
+              "від кількості позицій")
+        small = self.past_order(self.items[:5])
+        large = self.past_order(self.items)
+
+        queries = []
+        for order in (small, large):
+            # кошик очищується між запусками
+            Order.objects.filter(user=self.user, ordered=False).delete()
+            OrderItem.objects.filter(user=self.user, ordered=False).delete()
+            # замовлення, користувач, позиції; новий кошик; наявні позиції,
+            # INSERT, їхні id (SQLite), зв'язки з кошиком; точки збереження
+            with self.assertNumQueries(13) as context:
+                ReorderService.reorder_many(Order.objects.filter(pk=order.pk))
+            queries.append(len(context.captured_queries))
+        print(f"  Запитів для 5 і 50 позицій: {queries}")
+
+        cart = Order.objects.get(user=self.user, ordered=False)
+        self.assertEqual(cart.items.count(), 50)
+        self.assertEqual(set(cart.items.values_list('quantity', flat=True)),
+                         {2})
+
+    def test_merges_into_open_cart(self):
+        print("\n[TEST] Позиції додаються до вже відкритого кошика")
+        first = self.past_order(self.items[:2], quantity=1)
+        second = self.past_order(self.items[1:3], quantity=3)
+        add_item(self.user, 'item-0')
+        self.assertEqual(get_cart_item_count(self.user), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            result = ReorderService.reorder_many([first, second])
+        self.assertEqual(result, {self.user.pk: 3})
+
+        cart = Order.objects.get(user=self.user, ordered=False)
+        self.assertEqual(
+            dict(cart.items.values_list('item__slug', 'quantity')),
+            {'item-0': 2, 'item-1': 4, 'item-2': 3})
+        # кешований лічильник кошика скинуто
+        self.assertEqual(get_cart_item_count(self.user), 3)
+
+    def test_orders_of_several_users(self):
+        print("\n[TEST] Замовлення різних користувачів у їхні кошики")
+        other = get_user_model().objects.create(username='other')
+        orders = [self.past_order(self.items[:1]),
+                  self.past_order(self.items[1:4], user=other)]
+        result = ReorderService.reorder_many(
+            Order.objects.filter(pk__in=[o.pk for o in orders]))
+        self.assertEqual(result, {self.user.pk: 1, other.pk: 3})
+        self.assertEqual(
+            Order.objects.get(user=other, ordered=False).items.count(), 3)
+
+    def test_nothing_to_add(self):
+        print("\n[TEST] Порожній список замовлень нічого не змінює")
+        self.assertEqual(ReorderService.reorder_many(Order.objects.none()),
+                         {})
+        self.assertEqual(add_items(self.user, {}), 0)
+        # товари замовлення видалено: користувач є, але додано 0
+        gone = self.past_order(self.items[:2])
+        Item.objects.filter(pk__in=[i.pk for i in self.items[:2]]).delete()
+        self.assertEqual(ReorderService.reorder_many([gone]),
+                         {self.user.pk: 0})
+        self.assertFalse(Order.objects.filter(ordered=False).exists())
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,100 @@
+import os
+import tempfile
+import unittest
+
+from tests import db  # noqa: F401
+
+from django.db import IntegrityError, transaction
+from django.test import TestCase, override_settings
+
+from core.models import Item
+from core.search import (
+    INDEX_FILENAME, SearchIndex, append_to_journal, item_fields, tokenize,
+    weigh_document, write_index
+)
+
+
+def document(title, category='S', description=''):
+    return weigh_document(item_fields(title, category, description))
+
+
+class TestSearchIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.directory = self.tmp.name
+        write_index(os.path.join(self.directory, INDEX_FILENAME), [
+            (1, document('Red cotton shirt', description='Soft shirts')),
+            (2, document('Running jacket', 'OW', 'Light jacket for runs')),
+            (3, document('Blue denim jacket', 'OW', 'Cotton lining')),
+        ])
+        self.index = SearchIndex(self.directory)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_tokenize_stems_and_drops_stop_words(self):
+        print("\n[TEST] Токенізація зі стемінгом")
+        tokens = tokenize('The Shirts and Jackets')
+        print(f"  Токени: {tokens}")
+        self.assertEqual(tokens, ['shirt', 'jacket'])
+
+    def test_ranked_by_field_weight(self):
+        print("\n[TEST] Збіг у назві важить більше, ніж в описі")
+        total, ids = self.index.search('cotton')
+        print(f"  Знайдено {total}: {ids}")
+        self.assertEqual(total, 2)
+        self.assertEqual(ids, [1, 3])
+
+    def test_category_and_pagination(self):
+        print("\n[TEST] Пошук за категорією та пагінація")
+        total, first = self.index.search('outwear jacket', 0, 1)
+        total, second = self.index.search('outwear jacket', 1, 1)
+        self.assertEqual(total, 2)
+        self.assertEqual(sorted(first + second), [2, 3])
+
+    def test_journal_updates_every_reader(self):
+        print("\n[TEST] Журнал змін бачать усі процеси без перебудови індексу")
+        other_worker = SearchIndex(self.directory)
+        self.assertEqual(other_worker.search('linen')[0], 0)
+
+        with override_settings(SEARCH_INDEX_DIR=self.directory):
+            append_to_journal(4, document('Linen shirt'))
+            append_to_journal(1, None)
+
+        total, ids = other_worker.search('shirt')
+        print(f"  Результати після змін: {ids}")
+        self.assertEqual(ids, [4])
+        self.assertEqual(other_worker.search('linen'), (1, [4]))
+
+
+class TestJournalAfterCommit(TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        write_index(os.path.join(self.tmp.name, INDEX_FILENAME), [])
+        self.index = SearchIndex(self.tmp.name)
+
+    def create(self, title):
+        return Item.objects.create(title=title, slug=title.lower(),
+                                   price=10.0, category='S', label='P',
+                                   description='')
+
+    def test_rolled_back_item_is_not_indexed(self):
+        print("\n[TEST] Відкочене збереження не потрапляє в журнал пошуку")
+        with override_settings(SEARCH_INDEX_DIR=self.tmp.name):
+            with self.captureOnCommitCallbacks(execute=True):
+                with self.assertRaises(IntegrityError):
+                    with transaction.atomic():
+                        self.create('Ghost')
+                        raise IntegrityError
+            self.assertEqual(self.index.search('ghost'), (0, []))
+
+            with self.captureOnCommitCallbacks(execute=True):
+                item = self.create('Ghost')
+            self.assertEqual(self.index.search('ghost'), (1, [item.pk]))
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,110 @@
+import unittest
+import os
+import random
+import sys
+import time
+from decimal import Decimal
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'djecommerce.settings')
+
+import django
+from django.conf import settings
+
+if not hasattr(settings, 'STRIPE_SECRET_KEY'):
+    settings.STRIPE_SECRET_KEY = 'test_secret_key'
+
+django.setup()
+
+from django_countries.fields import Country
+
+from core.patterns.abstract_factory import ExpressShipping, StandardShipping
+from core.shipping import DEFAULT_RATES, RateTable
+
+
+class TestRateTable(unittest.TestCase):
+
+    def setUp(self):
+        self.table = RateTable(DEFAULT_RATES)
+
+    def test_zones_and_brackets(self):
+        print("\n[TEST] Ціна залежить від зони та вагової категорії")
+        quote = self.table.quote
+        self.assertEqual(quote('express', None, None), Decimal('15.00'))
+        self.assertEqual(quote('express', 'US', 1), Decimal('16.00'))
+        self.assertEqual(quote('express', 'US', 1.01), Decimal('20.00'))
+        self.assertEqual(quote('express', 'CA', 4), Decimal('35.00'))
+        self.assertEqual(quote('express', Country('DE'), 10),
+                         Decimal('65.00'))
+        self.assertEqual(quote('standard', 'JP', 0.5), Decimal('18.00'))
+        # понад 30 кг кожен початий кілограм доплачується
+        self.assertEqual(quote('standard', 'UA', 31.5), Decimal('53.00'))
+        self.assertEqual(str(quote('standard', 'US', 3)), '0.00')
+
+    def test_quote_many_matches_single_quotes(self):
+        print("\n[TEST] quote_many дає ті самі ціни, що й quote")
+        rng = random.Random(7)
+        countries = ['US', 'CA', 'MX', 'DE', 'UA', 'JP', 'BR', None]
+        shipments = [
+            (rng.choice(['standard', 'express']), rng.choice(countries),
+             rng.choice([None, 0, 0.3, 1, 2.5, 5, 7, 10, 29.9, 30, 45.2,
+                         '2.5', '31', Decimal('1.5')]))
+            for _ in range(2000)
+        ]
+        self.assertEqual(self.table.quote_many(shipments),
+                         [self.table.quote(*s) for s in shipments])
+
+    def test_unknown_method(self):
+        print("\n[TEST] Невідомий спосіб доставки: однакова помилка")
+        with self.assertRaises(ValueError):
+            self.table.quote('overnight', 'US', 1)
+        with self.assertRaises(ValueError):
+            self.table.quote_many([('overnight', 'US', 1)])
+        with self.assertRaises(ValueError):
+            self.table.quote_many([('overnight', 'JP', 1)])
+
+    def test_bad_tables(self):
+        print("\n[TEST] Неповна таблиця тарифів відхиляється")
+        rates = dict(DEFAULT_RATES, brackets=[0, 1])
+        with self.assertRaises(ValueError):
+            RateTable(rates)
+        methods = {'standard': {'domestic': {'base': [0] * 5, 'per_kg': 0}}}
+        with self.assertRaises(ValueError):
+            RateTable(dict(DEFAULT_RATES, methods=methods))
+
+    def test_many_shipments_in_one_pass(self):
+        print("\n[TEST] Пакетний розрахунок 100 000 відправлень")
+        rng = random.Random(1)
+        shipments = [
+            (rng.choice(['US', 'DE', 'JP']), round(rng.uniform(0, 40), 1))
+            for _ in range(100000)
+        ]
+        shipping = ExpressShipping()
+
+        started = time.perf_counter()
+        batch = shipping.quote_many(shipments)
+        batch_time = time.perf_counter() - started
+        started = time.perf_counter()
+        single = [shipping.calculate_cost(weight, country=country)
+                  for country, weight in shipments]
+        single_time = time.perf_counter() - started
+
+        print(f"  quote_many: {batch_time * 1000:.0f} мс, "
+              f"calculate_cost по одному: {single_time * 1000:.0f} мс")
+        self.assertEqual(batch, single)
+
+    def test_shipping_methods(self):
+        print("\n[TEST] Способи доставки беруть ціни з таблиці")
+        self.assertEqual(StandardShipping().calculate_cost(),
+                         Decimal('0.00'))
+        self.assertEqual(ExpressShipping().calculate_cost(),
+                         Decimal('15.00'))
+        self.assertEqual(
+            StandardShipping().quote_many([('CA', 2), ('FR', 12)]),
+            [Decimal('12.00'), Decimal('50.00')])
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,127 @@
+import unittest
+
+from tests import db  # noqa: F401
+
+import stripe
+from django.core.cache import cache
+from django.test import override_settings
+
+from core.stripe_client import (
+    cache_default_card, configure_stripe, get_default_card,
+    invalidate_default_card
+)
+from core.stripe_standin import DECLINED_TOKEN, StripeStandIn
+
+
+class StandInTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.saved = (stripe.api_base, stripe.api_key,
+                      stripe.default_http_client, stripe.max_network_retries)
+
+    def tearDown(self):
+        (stripe.api_base, stripe.api_key, stripe.default_http_client,
+         stripe.max_network_retries) = self.saved
+
+    def serve(self, **kwargs):
+        server = StripeStandIn(**kwargs).start()
+        self.addCleanup(server.stop)
+        return server
+
+
+class TestStripeClient(StandInTestCase):
+
+    def test_calls_reuse_one_connection(self):
+        print("\n[TEST] Виклики Stripe повторно використовують з'єднання")
+        server = self.serve()
+        with override_settings(STRIPE_API_BASE=server.url):
+            configure_stripe()
+
+        customer = stripe.Customer.create(email='a@example.com',
+                                          source='tok_visa')
+        stripe.Customer.create_source(customer['id'], source='tok_amex')
+        cards = stripe.Customer.list_sources(customer['id'], limit=3,
+                                             object='card')
+        charge = stripe.Charge.create(amount=1500, currency='usd',
+                                      customer=customer['id'])
+
+        print(f"  Запитів: {server.stats['requests']}, "
+              f"з'єднань: {server.stats['connections']}")
+        self.assertEqual(len(cards['data']), 2)
+        self.assertEqual(charge['amount'], 1500)
+        self.assertEqual(server.stats, {'connections': 1, 'requests': 4})
+
+    def test_declined_card(self):
+        print("\n[TEST] Відхилена картка -> CardError")
+        server = self.serve()
+        with override_settings(STRIPE_API_BASE=server.url):
+            configure_stripe()
+
+        with self.assertRaises(stripe.error.CardError):
+            stripe.Charge.create(amount=100, currency='usd',
+                                 source=DECLINED_TOKEN)
+
+    def test_read_timeout(self):
+        print("\n[TEST] Повільна відповідь обривається за таймаутом")
+        server = self.serve(latency=0.5)
+        with override_settings(STRIPE_API_BASE=server.url,
+                               STRIPE_READ_TIMEOUT=0.1,
+                               STRIPE_MAX_NETWORK_RETRIES=0):
+            configure_stripe()
+
+        with self.assertRaises(stripe.error.APIConnectionError):
+            stripe.Charge.create(amount=100, currency='usd',
+                                 source='tok_visa')
+
+
+class TestDefaultCardCache(StandInTestCase):
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.server = self.serve()
+        with override_settings(STRIPE_API_BASE=self.server.url):
+            configure_stripe()
+        self.customer = stripe.Customer.create(source='tok_visa')['id']
+
+    def requests_made(self, call):
+        before = self.server.stats['requests']
+        result = call()
+        return result, self.server.stats['requests'] - before
+
+    def test_payment_page_card_is_cached(self):
+        print("\n[TEST] Картка за замовчуванням береться з кешу")
+        card, calls = self.requests_made(
+            lambda: get_default_card(self.customer))
+        self.assertEqual(calls, 1)
+        self.assertEqual(card['last4'], '4242')
+
+        card, calls = self.requests_made(
+            lambda: get_default_card(self.customer))
+        print(f"  Повторний показ сторінки: {calls} викликів Stripe")
+        self.assertEqual(calls, 0)
+        self.assertEqual(set(card), {'brand', 'last4', 'exp_month',
+                                     'exp_year'})
+
+    def test_new_source_and_invalidation(self):
+        print("\n[TEST] Нова картка та інвалідація кешу")
+        get_default_card(self.customer)
+        card = stripe.Customer.create_source(self.customer,
+                                             source='tok_amex')
+        cache_default_card(self.customer, dict(card, last4='0005'))
+        self.assertEqual(get_default_card(self.customer)['last4'], '0005')
+
+        invalidate_default_card(self.customer)
+        card, calls = self.requests_made(
+            lambda: get_default_card(self.customer))
+        self.assertEqual((card['last4'], calls), ('4242', 1))
+
+    def test_stripe_error_is_not_cached(self):
+        print("\n[TEST] Помилка Stripe не кешується")
+        self.assertIsNone(get_default_card('cus_missing'))
+        self.assertIsNone(cache.get('stripe:card:cus_missing'))
+        self.assertIsNone(get_default_card(None))
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
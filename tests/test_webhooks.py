@@ -0,0 +1,262 @@
+import hashlib
+import hmac
+import json
+import time
+import unittest
+from unittest import mock
+
+from tests import db  # noqa: F401
+
+import stripe
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DatabaseError
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from core.cart import get_cart_version
+from core.checkout import finalize_order
+from core.models import (
+    Item, Job, Order, OrderItem, Payment, Refund, StripeEvent
+)
+from core.webhooks import (
+    MAX_ATTEMPTS, EventBatch, process_pending_events, receive_event
+)
+
+SECRET = 'whsec_test'
+
+
+def charge_event(event_id, event_type, charge_id, **charge):
+    return {
+        'id': event_id,
+        'object': 'event',
+        'type': event_type,
+        'data': {'object': dict(id=charge_id, object='charge', **charge)},
+    }
+
+
+def signed(payload, secret=SECRET):
+    timestamp = int(time.time())
+    signature = hmac.new(secret.encode(), f'{timestamp}.{payload}'.encode(),
+                         hashlib.sha256).hexdigest()
+    return f't={timestamp},v1={signature}'
+
+
+@override_settings(STRIPE_WEBHOOK_SECRET=SECRET)
+class TestReceiveEvent(TestCase):
+
+    def receive(self, event, signature=None):
+        payload = json.dumps(event).encode()
+        return receive_event(payload, signature or signed(payload.decode()))
+
+    def test_stores_each_event_once(self):
+        print("\n[TEST] Вебхук зберігає подію один раз")
+        event = charge_event('evt_1', 'charge.succeeded', 'ch_1')
+        with self.assertNumQueries(1):
+            started = time.perf_counter()
+            self.receive(event)
+            elapsed = (time.perf_counter() - started) * 1000
+        print(f"  Перевірка та запис за {elapsed:.2f} мс")
+
+        self.receive(event)
+        self.assertEqual(StripeEvent.objects.count(), 1)
+        stored = StripeEvent.objects.get()
+        self.assertEqual((stored.event_id, stored.type),
+                         ('evt_1', 'charge.succeeded'))
+        self.assertEqual(json.loads(stored.payload), event)
+
+    def test_bad_signature(self):
+        print("\n[TEST] Невірний підпис відхиляється")
+        event = charge_event('evt_1', 'charge.succeeded', 'ch_1')
+        with self.assertRaises(stripe.error.SignatureVerificationError):
+            self.receive(event, signed(json.dumps(event), 'whsec_other'))
+        with self.assertRaises(stripe.error.SignatureVerificationError):
+            self.receive(event, 'garbage')
+        self.assertFalse(StripeEvent.objects.exists())
+
+    @override_settings(STRIPE_WEBHOOK_SECRET='')
+    def test_no_secret_accepts_nothing(self):
+        print("\n[TEST] Без секрету вебхук нічого не приймає")
+        event = charge_event('evt_1', 'charge.succeeded', 'ch_1')
+        with self.assertRaises(ImproperlyConfigured):
+            self.receive(event, signed(json.dumps(event), ''))
+        self.assertFalse(StripeEvent.objects.exists())
+
+
+class TestEventWorker(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'buyer', 'buyer@example.com', 'pw')
+
+    def make_order(self, price=None):
+        order = Order.objects.create(user=self.user,
+                                     ordered_date=timezone.now())
+        if price is not None:
+            item = Item.objects.create(title='Shirt', slug=f'shirt-{order.pk}',
+                                       price=price, category='S', label='P',
+                                       description='')
+            order.items.add(OrderItem.objects.create(user=self.user,
+                                                     item=item))
+        return order
+
+    def store(self, *events):
+        StripeEvent.objects.bulk_create([
+            StripeEvent(event_id=event['id'], type=event['type'],
+                        payload=json.dumps(event))
+            for event in events
+        ])
+
+    def test_lost_checkout_is_finalized(self):
+        print("\n[TEST] Оплачене замовлення без Payment завершується")
+        order = self.make_order(25.5)
+        self.store(charge_event(
+            'evt_1', 'charge.succeeded', 'ch_1', amount=2550, paid=True,
+            currency='usd', metadata={'order_id': str(order.pk)}))
+        version = get_cart_version(self.user)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(process_pending_events(), 1)
+        order.refresh_from_db()
+        self.assertTrue(order.ordered)
+        self.assertEqual(order.payment.stripe_charge_id, 'ch_1')
+        self.assertEqual(order.payment.amount, 25.5)
+        self.assertIsNotNone(StripeEvent.objects.get().processed_at)
+        # як після звичайного оформлення: кошик скинуто, лист у черзі
+        self.assertNotEqual(get_cart_version(self.user), version)
+        job = Job.objects.get()
+        self.assertEqual(job.name, 'orders.send_confirmation')
+        self.assertEqual(json.loads(job.payload),
+                         {'order_id': order.pk,
+                          'recipient': 'buyer@example.com'})
+        self.assertEqual(process_pending_events(), 0)
+
+    def test_charge_must_match_order(self):
+        print("\n[TEST] Сума, валюта чи статус платежу не збігаються")
+        order = self.make_order(25.5)
+        self.store(
+            charge_event('evt_1', 'charge.succeeded', 'ch_1', amount=100,
+                         paid=True, currency='usd',
+                         metadata={'order_id': str(order.pk)}),
+            charge_event('evt_2', 'charge.succeeded', 'ch_2', amount=2550,
+                         paid=True, currency='eur',
+                         metadata={'order_id': str(order.pk)}),
+            charge_event('evt_3', 'charge.succeeded', 'ch_3', amount=2550,
+                         paid=False, currency='usd',
+                         metadata={'order_id': str(order.pk)}),
+        )
+
+        process_pending_events()
+        order.refresh_from_db()
+        self.assertFalse(order.ordered)
+        self.assertFalse(Payment.objects.exists())
+        errors = dict(StripeEvent.objects.values_list('event_id', 'error'))
+        self.assertIn('ChargeMismatch', errors['evt_1'])
+        self.assertIn('ChargeMismatch', errors['evt_2'])
+        # неоплачений платіж просто пропускається
+        self.assertEqual(errors['evt_3'], '')
+
+    def test_checkout_already_recorded(self):
+        print("\n[TEST] Подія для вже записаного платежу нічого не дублює")
+        order = self.make_order()
+        finalize_order(order, {'id': 'ch_1'}, 10.0)
+        self.store(charge_event(
+            'evt_1', 'charge.succeeded', 'ch_1', amount=1000,
+            metadata={'order_id': str(order.pk)}))
+
+        process_pending_events()
+        self.assertEqual(Payment.objects.count(), 1)
+        self.assertIsNone(finalize_order(order, {'id': 'ch_2'}, 10.0))
+        self.assertEqual(Payment.objects.count(), 1)
+
+    def test_refund_and_failure_in_one_batch(self):
+        print("\n[TEST] Повернення та відмова обробляються пакетом")
+        # у користувача лише один відкритий кошик, тож по черзі
+        refunded = self.make_order()
+        finalize_order(refunded, {'id': 'ch_r'}, 10.0)
+        for charge_id in ('ch_f', 'ch_p'):
+            finalize_order(self.make_order(), {'id': charge_id}, 10.0)
+        Order.objects.filter(pk=refunded.pk).update(refund_requested=True)
+        Refund.objects.create(order=refunded, reason='too big',
+                              email='buyer@example.com')
+        self.store(
+            charge_event('evt_1', 'charge.refunded', 'ch_r', refunded=True),
+            charge_event('evt_2', 'charge.failed', 'ch_f'),
+            charge_event('evt_3', 'charge.refunded', 'ch_p', refunded=False),
+            {'id': 'evt_4', 'type': 'invoice.paid',
+             'data': {'object': {'id': 'in_1'}}},
+        )
+
+        # SAVEPOINT/RELEASE навколо пакета, кожної з 4 подій і запису,
+        # SELECT подій і платежів, 2 UPDATE статусів, UPDATE замовлень,
+        # UPDATE повернень, UPDATE оброблених подій
+        with self.assertNumQueries(2 + 4 * 2 + 2 + 2 + 2 + 2 + 1):
+            self.assertEqual(process_pending_events(), 4)
+
+        statuses = dict(Payment.objects.values_list(
+            'stripe_charge_id', 'status'))
+        print(f"  Статуси: {statuses}")
+        self.assertEqual(statuses, {'ch_r': 'refunded', 'ch_f': 'failed',
+                                    'ch_p': 'succeeded'})
+        refunded.refresh_from_db()
+        self.assertEqual((refunded.refund_requested, refunded.refund_granted),
+                         (False, True))
+        self.assertTrue(Refund.objects.get().accepted)
+        self.assertFalse(StripeEvent.objects.filter(
+            processed_at__isnull=True).exists())
+
+    def test_failing_event_is_retried_then_parked(self):
+        print("\n[TEST] Подія з помилкою повторюється, потім відкладається")
+        order = self.make_order()
+        # без amount обробник падає
+        self.store(charge_event('evt_1', 'charge.succeeded', 'ch_1',
+                                metadata={'order_id': str(order.pk)}))
+
+        for _ in range(MAX_ATTEMPTS):
+            self.assertEqual(process_pending_events(), 1)
+        self.assertEqual(process_pending_events(), 0)
+
+        event = StripeEvent.objects.get()
+        self.assertIsNone(event.processed_at)
+        self.assertEqual(event.attempts, MAX_ATTEMPTS)
+        self.assertIn('KeyError', event.error)
+        self.assertFalse(Payment.objects.exists())
+
+    def test_failed_flush_counts_an_attempt(self):
+        print("\n[TEST] Помилка запису пакета рахується як спроба")
+        finalize_order(self.make_order(), {'id': 'ch_f'}, 10.0)
+        self.store(charge_event('evt_1', 'charge.failed', 'ch_f'))
+
+        with mock.patch.object(EventBatch, 'flush',
+                               side_effect=DatabaseError('disk full')):
+            for _ in range(MAX_ATTEMPTS):
+                self.assertEqual(process_pending_events(), 1)
+            self.assertEqual(process_pending_events(), 0)
+
+        event = StripeEvent.objects.get()
+        self.assertIsNone(event.processed_at)
+        self.assertIn('disk full', event.error)
+        self.assertEqual(Payment.objects.get().status, 'succeeded')
+
+    def test_failed_handler_leaves_no_status(self):
+        print("\n[TEST] Статус від обробника з помилкою не записується")
+        finalize_order(self.make_order(), {'id': 'ch_f'}, 10.0)
+        self.store(charge_event('evt_1', 'charge.failed', 'ch_f'))
+
+        def fail_after_status(batch, charge):
+            batch.set_status(charge, 'failed')
+            raise RuntimeError('boom')
+
+        with mock.patch.object(EventBatch, 'on_charge_failed',
+                               fail_after_status):
+            process_pending_events()
+        self.assertEqual(Payment.objects.get().status, 'succeeded')
+        self.assertEqual(StripeEvent.objects.get().attempts, 1)
+
+        # наступна спроба без помилки записує статус
+        process_pending_events()
+        self.assertEqual(Payment.objects.get().status, 'failed')
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)